@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Incremental low-wellbeing alerts.
+
+Every stored response, from the survey form and from SMS replies, is
+folded into its user's row in wellbeing_state, in the same transaction as
+the response itself. The row holds only running values: one low-score
+streak per dimension, the current week's score sum and count, and the
+previous week's average. Updating it, and evaluating every rule against
+it, is O(1): one primary-key read and one write, whatever the user's
+history. No rule ever reads past responses.
+
+Rules:
+- low_<dimension>_streak: the last ALERT_LOW_STREAK scores of a dimension
+  were all at or below ALERT_LOW_SCORE (raised when the streak reaches
+  that length, and again only after it is broken);
+- week_drop: this week's overall average (the mean of the three scores,
+  with at least ALERT_MIN_WEEK_RESPONSES replies) is ALERT_WEEK_DROP points
+  or more below the previous week's (at most once per user and week).
+
+Alerts go to the `alerts` table with status 'open' until acknowledged on
+/admin/alerts. State starts empty for users who answered before alerts
+existed. `python alerts.py rebuild` replays history into it once, in a
+single pass and without raising alerts.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from datetime import date, timedelta
+
+ALERTS_ENABLED = os.getenv('ALERTS_ENABLED', '1') != '0'
+ALERT_LOW_SCORE = int(os.getenv('ALERT_LOW_SCORE', '4'))
+ALERT_LOW_STREAK = int(os.getenv('ALERT_LOW_STREAK', '3'))
+ALERT_WEEK_DROP = float(os.getenv('ALERT_WEEK_DROP', '2.0'))
+ALERT_MIN_WEEK_RESPONSES = int(os.getenv('ALERT_MIN_WEEK_RESPONSES', '2'))
+
+DIMENSIONS = ('joy', 'achievement', 'meaning')
+
+STATE_COLUMNS = ('user_id', 'last_response_id', 'joy_streak', 'achievement_streak', 'meaning_streak',
+                 'week', 'week_total', 'week_count', 'prev_week_avg', 'drop_alerted_week')
+
+
+def init_alerts(cursor):
+    """Create the per-user rolling state and the alert queue (called from init_db)"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS wellbeing_state (
+        user_id INTEGER PRIMARY KEY,
+        last_response_id INTEGER NOT NULL DEFAULT 0,
+        joy_streak INTEGER NOT NULL DEFAULT 0,
+        achievement_streak INTEGER NOT NULL DEFAULT 0,
+        meaning_streak INTEGER NOT NULL DEFAULT 0,
+        week TEXT NULL,
+        week_total REAL NOT NULL DEFAULT 0,
+        week_count INTEGER NOT NULL DEFAULT 0,
+        prev_week_avg REAL NULL,
+        drop_alerted_week TEXT NULL
+    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        rule TEXT NOT NULL,
+        message TEXT NOT NULL,
+        detail TEXT NOT NULL,
+        response_id INTEGER NULL,
+        status TEXT NOT NULL DEFAULT 'open',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        acknowledged_at TIMESTAMP NULL
+    )''')
+    # The admin view lists open alerts newest first
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts (status, id)')
+
+
+def empty_state(user_id):
+    return {'user_id': user_id, 'last_response_id': 0, 'joy_streak': 0, 'achievement_streak': 0,
+            'meaning_streak': 0, 'week': None, 'week_total': 0.0, 'week_count': 0,
+            'prev_week_avg': None, 'drop_alerted_week': None}
+
+
+def week_of(day_text):
+    """Monday (YYYY-MM-DD) of the week a 'YYYY-MM-DD ...' timestamp falls in"""
+    day = date.fromisoformat(day_text[:10])
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def advance(state, response):
+    """Fold one response ({id, joy, achievement, meaning, date}) into the rolling state"""
+    for dimension in DIMENSIONS:
+        low = response[dimension] <= ALERT_LOW_SCORE
+        state[f'{dimension}_streak'] = state[f'{dimension}_streak'] + 1 if low else 0
+
+    week = week_of(response['date'])
+    if state['week'] is None or week > state['week']:
+        # The week that just ended only counts as "previous" if it is the one right before
+        follows = state['week'] is not None and week == (date.fromisoformat(state['week']) + timedelta(days=7)).isoformat()
+        enough = state['week_count'] >= ALERT_MIN_WEEK_RESPONSES
+        state['prev_week_avg'] = state['week_total'] / state['week_count'] if follows and enough else None
+        state.update(week=week, week_total=0.0, week_count=0)
+    if week == state['week']:  # A late reply for an earlier week only feeds the streaks
+        state['week_total'] += sum(response[dimension] for dimension in DIMENSIONS) / len(DIMENSIONS)
+        state['week_count'] += 1
+    state['last_response_id'] = max(state['last_response_id'], response['id'])
+    return state
+
+
+def low_streaks(state):
+    alerts = []
+    for dimension in DIMENSIONS:
+        if state[f'{dimension}_streak'] == ALERT_LOW_STREAK:
+            alerts.append((f'low_{dimension}_streak',
+                           f"{dimension.capitalize()} at or below {ALERT_LOW_SCORE} on {ALERT_LOW_STREAK} responses in a row",
+                           {'dimension': dimension, 'streak': ALERT_LOW_STREAK, 'low_score': ALERT_LOW_SCORE}))
+    return alerts
+
+
+def week_drop(state):
+    if (state['prev_week_avg'] is None or state['week_count'] < ALERT_MIN_WEEK_RESPONSES
+            or state['drop_alerted_week'] == state['week']):
+        return []
+    average = state['week_total'] / state['week_count']
+    drop = state['prev_week_avg'] - average
+    if drop < ALERT_WEEK_DROP:
+        return []
+    state['drop_alerted_week'] = state['week']
+    return [('week_drop', f"Average fell from {state['prev_week_avg']:.1f} to {average:.1f} week over week",
+             {'week': state['week'], 'previous': round(state['prev_week_avg'], 2),
+              'current': round(average, 2), 'drop': round(drop, 2)})]
+
+
+RULES = (low_streaks, week_drop)
+
+
+def load_state(conn, user_id):
+    row = conn.execute(f"SELECT {', '.join(STATE_COLUMNS)} FROM wellbeing_state WHERE user_id = ?",
+                       (user_id,)).fetchone()
+    return dict(zip(STATE_COLUMNS, row)) if row else empty_state(user_id)
+
+
+def save_state(conn, state):
+    conn.execute(f'''INSERT OR REPLACE INTO wellbeing_state ({', '.join(STATE_COLUMNS)})
+                     VALUES ({', '.join('?' * len(STATE_COLUMNS))})''',
+                 [state[column] for column in STATE_COLUMNS])
+
+
+def observe(conn, user_id, response):
+    """Update a user's state with a just-inserted response and queue any alerts (caller commits).
+
+    response is {id, joy, achievement, meaning, date}. Returns the alerts raised as dicts.
+    """
+    if not ALERTS_ENABLED:
+        return []
+    state = load_state(conn, user_id)
+    if response['id'] <= state['last_response_id']:
+        return []  # Already folded in
+    advance(state, response)
+    raised = [alert for rule in RULES for alert in rule(state)]
+    save_state(conn, state)
+
+    alerts = []
+    for rule, message, detail in raised:
+        alert_id = conn.execute('''INSERT INTO alerts (user_id, rule, message, detail, response_id)
+                                   VALUES (?, ?, ?, ?, ?)''',
+                                (user_id, rule, message, json.dumps(detail), response['id'])).lastrowid
+        alerts.append({'id': alert_id, 'user_id': user_id, 'rule': rule, 'message': message, 'detail': detail})
+    return alerts
+
+
+def list_alerts(conn, status='open', limit=200):
+    """Alerts with the user's phone, newest first (status None = any)"""
+    rows = conn.execute('''SELECT a.id, a.user_id, u.phone, a.rule, a.message, a.detail, a.response_id,
+                                  a.status, a.created_at, a.acknowledged_at
+                           FROM alerts a LEFT JOIN users u ON u.id = a.user_id
+                           WHERE ? IS NULL OR a.status = ?
+                           ORDER BY a.id DESC LIMIT ?''', (status, status, limit)).fetchall()
+    keys = ('id', 'user_id', 'phone', 'rule', 'message', 'detail', 'response_id', 'status',
+            'created_at', 'acknowledged_at')
+    alerts = [dict(zip(keys, row)) for row in rows]
+    for alert in alerts:
+        alert['detail'] = json.loads(alert['detail'])
+    return alerts
+
+
+def acknowledge(conn, alert_id):
+    """Mark an open alert acknowledged; returns False if there was none (caller commits)"""
+    return conn.execute('''UPDATE alerts SET status = 'acknowledged', acknowledged_at = CURRENT_TIMESTAMP
+                           WHERE id = ? AND status = 'open' ''', (alert_id,)).rowcount > 0
+
+
+def forget_user(conn, user_id):
+    conn.execute('DELETE FROM wellbeing_state WHERE user_id = ?', (user_id,))
+    conn.execute('DELETE FROM alerts WHERE user_id = ?', (user_id,))
+
+
+def rebuild(conn):
+    """Replay every live response into fresh state, without raising alerts; returns users rebuilt"""
+    conn.execute('DELETE FROM wellbeing_state')
+    states = {}
+    for response_id, user_id, joy, achievement, meaning, day in conn.execute(
+            '''SELECT id, user_id, joy, achievement, meaningfulness, date FROM responses
+               WHERE date IS NOT NULL ORDER BY date, id'''):
+        state = states.setdefault(user_id, empty_state(user_id))
+        advance(state, {'id': response_id, 'joy': joy, 'achievement': achievement,
+                        'meaning': meaning, 'date': day})
+        for rule in RULES:
+            rule(state)  # Marks the drops already seen, so they are not raised again
+    for state in states.values():
+        save_state(conn, state)
+    conn.commit()
+    return len(states)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'survey.db'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help='Rebuild rolling state from stored responses (no alerts)')
+    commands.add_parser('list', help='List open alerts')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.command == 'rebuild':
+            print(f"🔁 Rolling state rebuilt for {rebuild(conn)} users")
+        else:
+            for alert in list_alerts(conn):
+                print(f"#{alert['id']} {alert['created_at']} user {alert['user_id']}: {alert['message']}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
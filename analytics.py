@@ -0,0 +1,261 @@
+"""
+Cohort analytics: daily trends, week-over-week deltas, reply streaks and
+the share of users above the flourishing threshold.
+
+Scores are integers from 1 to 10, so the daily aggregates are per-day
+score histograms grouped in SQLite. They give exact means and medians
+without pulling individual responses into Python. Streaks and flourishing
+come from a single GROUP BY user_id pass. That pass folds each user's
+reply days into a bitmask and averages their last week of scores, which
+keeps 100k users in the low seconds.
+
+Completed days are read from daily_rollups (see rollups.py) where
+available, so only today's responses are grouped live.
+
+Snapshots are stored in the analytics_snapshots table, so every worker
+serves the same numbers and only the scheduled refresh pays for the scan.
+"""
+
+import json
+import time
+from datetime import date, datetime, timedelta
+
+from rollups import load_rollups
+
+# (label, responses column)
+DIMENSIONS = (('joy', 'joy'), ('achievement', 'achievement'), ('meaning', 'meaningfulness'))
+
+SNAPSHOT_NAME = 'cohort'
+
+# Streak bitmasks must fit in SQLite's 64-bit integers
+MAX_STREAK_DAYS = 62
+
+
+def init_analytics(cursor):
+    """Create the snapshot table and the date index (called from init_db)"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS analytics_snapshots (
+        name TEXT PRIMARY KEY,
+        computed_at TIMESTAMP NOT NULL,
+        data TEXT NOT NULL
+    )''')
+    # Covers the daily histogram scan so it never touches the table
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_responses_date_scores
+                      ON responses (date, joy, achievement, meaningfulness)''')
+
+
+def histogram_mean(counts):
+    total = sum(counts.values())
+    return sum(score * n for score, n in counts.items()) / total if total else None
+
+
+def histogram_median(counts):
+    """Median of a {score: count} histogram (mean of the two middle values when even)"""
+    total = sum(counts.values())
+    if not total:
+        return None
+    lower, upper = (total + 1) // 2, total // 2 + 1
+    seen, low_value = 0, None
+    for score in sorted(counts):
+        seen += counts[score]
+        if low_value is None and seen >= lower:
+            low_value = score
+        if seen >= upper:
+            return (low_value + score) / 2
+
+
+def daily_histograms(conn, since, today):
+    """{day: {dimension: {score: count}}} for responses from `since` through today.
+
+    Days already in daily_rollups are read from there; only the days after
+    the rollups (normally just today) are aggregated from responses.
+    """
+    days, covered = {}, set()
+    for day, *hists in conn.execute('''SELECT day, joy_hist, achievement_hist, meaning_hist
+                                     FROM daily_rollups WHERE day >= ? AND day < ?''',
+                                  (since.isoformat(), today.isoformat())):
+        covered.add(day)
+        if any(map(any, map(json.loads, hists))):
+            days[day] = {label: {score: n for score, n in enumerate(json.loads(hist), 1) if n}
+                         for (label, _), hist in zip(DIMENSIONS, hists)}
+
+    live_since = since
+    while live_since.isoformat() in covered:
+        live_since += timedelta(days=1)
+
+    rows = conn.execute('''
+        SELECT substr(date, 1, 10) AS day, joy, achievement, meaningfulness, COUNT(*)
+        FROM responses
+        WHERE date >= ?
+        GROUP BY day, joy, achievement, meaningfulness
+    ''', (live_since.isoformat(),))
+    for day, *scores, count in rows:
+        if day in covered:
+            continue
+        hists = days.setdefault(day, {label: {} for label, _ in DIMENSIONS})
+        for (label, _), score in zip(DIMENSIONS, scores):
+            if score is not None:
+                hists[label][score] = hists[label].get(score, 0) + count
+    return days
+
+
+def merge_histograms(hists):
+    merged = {}
+    for hist in hists:
+        for score, count in hist.items():
+            merged[score] = merged.get(score, 0) + count
+    return merged
+
+
+def daily_trends(histograms):
+    """Per-day response count and mean/median for each dimension, oldest first"""
+    trends = []
+    for day in sorted(histograms):
+        entry = {'day': day, 'responses': sum(histograms[day]['joy'].values())}
+        for label, _ in DIMENSIONS:
+            mean = histogram_mean(histograms[day][label])
+            entry[label] = {'mean': round(mean, 2) if mean is not None else None,
+                            'median': histogram_median(histograms[day][label])}
+        trends.append(entry)
+    return trends
+
+
+def week_over_week(histograms, today):
+    """Mean of the last 7 days against the 7 days before, per dimension"""
+    this_week = [(today - timedelta(days=i)).isoformat() for i in range(7)]
+    last_week = [(today - timedelta(days=i)).isoformat() for i in range(7, 14)]
+    result = {}
+    for label, _ in DIMENSIONS:
+        current = histogram_mean(merge_histograms(histograms[d][label] for d in this_week if d in histograms))
+        previous = histogram_mean(merge_histograms(histograms[d][label] for d in last_week if d in histograms))
+        result[label] = {
+            'this_week': round(current, 2) if current is not None else None,
+            'last_week': round(previous, 2) if previous is not None else None,
+            'delta': round(current - previous, 2) if current is not None and previous is not None else None,
+        }
+    return result
+
+
+def trailing_run(mask):
+    """Number of consecutive set bits starting at bit 0"""
+    length = 0
+    while mask >> length & 1:
+        length += 1
+    return length
+
+
+def longest_run(mask):
+    """Length of the longest run of consecutive set bits"""
+    length = 0
+    while mask:
+        mask &= mask << 1
+        length += 1
+    return length
+
+
+def user_activity(conn, today, days=30, threshold=7.0, window=7, min_responses=3):
+    """Reply streaks and flourishing shares from one grouped pass over the cohort.
+
+    Each user's reply days in the last `days` days (at most 62) are folded
+    into a bitmask, bit 0 being today, from which current and longest
+    streaks are read. A user is flourishing on a dimension when their
+    average over the last `window` days is at or above threshold; users
+    with fewer than min_responses replies in that window are not counted,
+    as on the /feedback page.
+    """
+    days = min(days, MAX_STREAK_DAYS)
+    rows = conn.execute('''
+        SELECT SUM(DISTINCT 1 << CAST(julianday(:today) - julianday(substr(date, 1, 10)) AS INTEGER)),
+               COUNT(CASE WHEN date >= :week THEN 1 END),
+               AVG(CASE WHEN date >= :week THEN joy END),
+               AVG(CASE WHEN date >= :week THEN achievement END),
+               AVG(CASE WHEN date >= :week THEN meaningfulness END)
+        FROM responses
+        WHERE date >= :since
+        GROUP BY user_id
+    ''', {'today': today.isoformat(),
+          'week': (today - timedelta(days=window - 1)).isoformat(),
+          'since': (today - timedelta(days=days - 1)).isoformat()}).fetchall()
+
+    buckets = {'1-2': 0, '3-6': 0, '7-13': 0, '14+': 0}
+    current, longest = [], 0
+    rated = [0, 0, 0, 0]
+    scored_users = 0
+    for mask, recent, *averages in rows:
+        mask = mask or 0
+        # A streak stays alive until a whole day is missed: today's survey may not be answered yet
+        streak = trailing_run(mask) if mask & 1 else trailing_run(mask >> 1)
+        longest = max(longest, longest_run(mask))
+        if streak:
+            current.append(streak)
+            key = '1-2' if streak < 3 else '3-6' if streak < 7 else '7-13' if streak < 14 else '14+'
+            buckets[key] += 1
+
+        if recent >= min_responses:
+            scored_users += 1
+            above = [avg >= threshold for avg in averages]
+            for i, flag in enumerate(above):
+                rated[i] += flag
+            rated[3] += all(above)
+
+    share = lambda n: round(n / scored_users, 4) if scored_users else None
+    return {
+        'streaks': {
+            'window_days': days,
+            'users_on_streak': len(current),
+            'average_current': round(sum(current) / len(current), 2) if current else 0,
+            'longest_current': max(current, default=0),
+            'longest_in_window': longest,
+            'current_buckets': buckets,
+        },
+        'flourishing': {
+            'threshold': threshold,
+            'window_days': window,
+            'users': scored_users,
+            'joy': share(rated[0]),
+            'achievement': share(rated[1]),
+            'meaning': share(rated[2]),
+            'all_three': share(rated[3]),
+        },
+    }
+
+
+def compute_snapshot(conn, days=30, threshold=7.0, today=None):
+    """Compute the full cohort snapshot"""
+    start = time.perf_counter()
+    today = today or date.today()
+    histograms = daily_histograms(conn, today - timedelta(days=max(days, 14) - 1), today)
+    trends = daily_trends(histograms)
+    activity = user_activity(conn, today, max(days, 14), threshold)
+    history = [{key: value for key, value in entry.items() if not key.endswith('_hist')}
+               for entry in load_rollups(conn, (today - timedelta(days=days)).isoformat())]
+
+    return {
+        'computed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'today': today.isoformat(),
+        'days': days,
+        'users': conn.execute('SELECT COUNT(*) FROM users').fetchone()[0],
+        'daily': trends[-days:],
+        'week_over_week': week_over_week(histograms, today),
+        'streaks': activity['streaks'],
+        'flourishing': activity['flourishing'],
+        'history': history,
+        'compute_ms': round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def save_snapshot(conn, snapshot, name=SNAPSHOT_NAME):
+    conn.execute('''INSERT INTO analytics_snapshots (name, computed_at, data) VALUES (?, ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET computed_at = excluded.computed_at, data = excluded.data''',
+                 (name, snapshot['computed_at'], json.dumps(snapshot)))
+    conn.commit()
+
+
+def snapshot_version(conn, name=SNAPSHOT_NAME):
+    """computed_at of the stored snapshot, or None"""
+    row = conn.execute('SELECT computed_at FROM analytics_snapshots WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else None
+
+
+def load_snapshot(conn, name=SNAPSHOT_NAME):
+    row = conn.execute('SELECT data FROM analytics_snapshots WHERE name = ?', (name,)).fetchone()
+    return json.loads(row[0]) if row else None
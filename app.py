@@ -1,125 +1,373 @@
+import csv
+import io
 import os
-import requests
-import secrets
 import uuid
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
-from apscheduler.schedulers.background import BackgroundScheduler
+from flask import (Flask, request, jsonify, render_template, redirect, url_for, flash, make_response, g, send_file,
+                   has_request_context)
 from datetime import datetime, timedelta
 import sqlite3
 import pytz
-import hmac
 import hashlib
 import time
+import threading
+from collections import OrderedDict, deque
+import json
+import logging
 from dotenv import load_dotenv
-
+from sms_providers import get_sms_provider
+from rate_limiter import get_sms_limiter
+from outbox import (init_outbox, enqueue_sms, enqueue_many, drain_outbox, requeue, outbox_stats, QuotaExhausted,
+                    connect as connect_outbox)
+from broadcast import init_broadcasts, validate_segment, resolve_segment, create_broadcast, broadcast_status
+from analytics import init_analytics, compute_snapshot, save_snapshot, load_snapshot, snapshot_version
+import rollups
+import funnel
+import campaigns
+import phones
+import webhook_dedup
+import metrics
+from metrics import TimedConnection
+from logging_config import configure_logging, SAMPLED
+import profiling
+from webhook_replay import WebhookRecorder
+from parsing import parse_survey_response
+import sms_templates
+import short_links
+import search
+import backups
+import archive
+import alerts
+from survey_utils import (generate_survey_token, verify_textbelt_webhook,
+                          convert_utc_to_eastern)
+
+# Settings below are read from the environment at import, so .env must be loaded first.
+# Everything with side effects (logging, schema, scheduler) waits for create_app().
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # For flash messages
 
-# TextBelt SMS config - Much simpler than Twilio!
-TEXTBELT_API_KEY = os.getenv('TEXTBELT_API_KEY', 'textbelt')  # 'textbelt' for free testing
-TEXTBELT_URL = 'https://textbelt.com/text'
-
-print("📱 Using TextBelt SMS API - Simple and reliable!")
+# Outbound SMS provider (SMS_PROVIDER=textbelt|fake)
+sms_provider = get_sms_provider()
+
+# Shared outbound rate limiter (SMS_RATE_PER_SEC=0 disables it)
+sms_limiter = get_sms_limiter()
+
+# Append /sms_webhook traffic to this file for webhook_replay.py (unset = off)
+WEBHOOK_CAPTURE_PATH = os.getenv('WEBHOOK_CAPTURE_PATH')
+webhook_recorder = WebhookRecorder(WEBHOOK_CAPTURE_PATH) if WEBHOOK_CAPTURE_PATH else None
+
+# Extra attempts when the provider reports a rate limit
+SMS_RATE_LIMIT_RETRIES = int(os.getenv('SMS_RATE_LIMIT_RETRIES', '2'))
+
+
+# Metrics exposed at /metrics
+HTTP_REQUEST_SECONDS = metrics.histogram('http_request_seconds', 'Request latency by route', ['route', 'method'])
+HTTP_REQUESTS_TOTAL = metrics.counter('http_requests_total', 'Requests by route and status', ['route', 'status'])
+SMS_SEND_SECONDS = metrics.histogram('sms_send_seconds', 'Provider send latency', ['provider'])
+SMS_SEND_TOTAL = metrics.counter('sms_send_total', 'SMS send attempts by outcome', ['provider', 'result'])
+TOKEN_CREATE_SECONDS = metrics.histogram('survey_token_create_seconds', 'Survey token creation latency')
+TOKEN_CREATE_TOTAL = metrics.counter('survey_token_create_total', 'Survey tokens created by outcome', ['result'])
+TOKEN_VALIDATE_SECONDS = metrics.histogram('survey_token_validate_seconds', 'Survey token validation latency')
+TOKEN_VALIDATE_TOTAL = metrics.counter('survey_token_validate_total', 'Survey token validations by outcome', ['result'])
+WEBHOOK_INGEST_SECONDS = metrics.histogram('webhook_ingest_seconds', 'SMS webhook processing latency')
+WEBHOOK_INGEST_TOTAL = metrics.counter('webhook_ingest_total', 'SMS webhook deliveries by outcome', ['result'])
+SMS_SEGMENTS_TOTAL = metrics.counter('sms_segments_total', 'SMS segments queued by template and encoding',
+                                     ['template', 'encoding'])
+REPORT_READS_TOTAL = metrics.counter('report_reads_total', 'Reporting connections by database', ['source'])
+WELLBEING_ALERTS_TOTAL = metrics.counter('wellbeing_alerts_total', 'Low-wellbeing alerts raised by rule', ['rule'])
+
+@app.before_request
+def ensure_schema():
+    ensure_db()
+
+@app.before_request
+def start_request_timer():
+    g.start_time = time.perf_counter()
+    if profiling.should_profile(request.endpoint, request.headers.get(profiling.PROFILE_HEADER)):
+        g.profile = profiling.RequestProfile(request.endpoint, request.method, request.full_path).start()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('start_time')
+    if start is not None:
+        route = request.endpoint or 'unknown'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, route=route, method=request.method)
+        HTTP_REQUESTS_TOTAL.inc(route=route, status=response.status_code)
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile_id = profile.stop(response.status_code)
+        if profile_id:
+            response.headers['X-Profile-Id'] = profile_id
+    return response
+
+@app.after_request
+def mark_snapshot_reads(response):
+    taken_at = g.pop('report_snapshot', None)
+    if taken_at:
+        response.headers['X-Report-Snapshot'] = taken_at
+    return response
+
+@app.teardown_request
+def stop_unfinished_profile(error=None):
+    # after_request is skipped when a view raises
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop(500)
+
+def is_rate_limit_error(error):
+    """Whether a provider error means we are sending too fast"""
+    error = (error or '').lower()
+    return 'rate limit' in error or 'too many' in error
 
 def send_sms(phone, message):
-    """Send SMS using TextBelt API (basic version)"""
-    try:
-        payload = {
-            'phone': phone,
-            'message': message,
-            'key': TEXTBELT_API_KEY,
-        }
+    """Send SMS through the configured provider, respecting the shared rate limiter.
+
+    Raises QuotaExhausted when the daily quota is used up, so the outbox
+    drain stops and keeps the remaining messages for later.
+    """
+    for attempt in range(SMS_RATE_LIMIT_RETRIES + 1):
+        if sms_limiter and not sms_limiter.acquire():
+            SMS_SEND_TOTAL.inc(provider=sms_provider.name, result='quota_exhausted')
+            logger.warning("SMS not sent, daily quota exhausted", extra={'phone': phone})
+            raise QuotaExhausted()
+
+        start = time.time()
+        try:
+            result = sms_provider.send(phone, message)
+        except Exception as e:
+            SMS_SEND_SECONDS.observe(time.time() - start, provider=sms_provider.name)
+            SMS_SEND_TOTAL.inc(provider=sms_provider.name, result='error')
+            if sms_limiter:
+                sms_limiter.record(False, time.time() - start)
+            logger.error("SMS error: %s", e, extra={'phone': phone})
+            return False
 
-        response = requests.post(TEXTBELT_URL, payload)
-        result = response.json()
+        rate_limited = is_rate_limit_error(result.get('error'))
+        SMS_SEND_SECONDS.observe(time.time() - start, provider=sms_provider.name)
+        SMS_SEND_TOTAL.inc(provider=sms_provider.name,
+                           result='success' if result.get('success') else 'rate_limited' if rate_limited else 'failure')
+        if sms_limiter:
+            sms_limiter.record(bool(result.get('success')), time.time() - start,
+                               quota_remaining=result.get('quotaRemaining'),
+                               rate_limited=rate_limited)
 
         if result.get('success'):
-            print(f"✅ SMS sent successfully to {phone} (Text ID: {result.get('textId')})")
+            logger.info("SMS sent", extra={'phone': phone, 'text_id': result.get('textId'), **SAMPLED})
             return result.get('textId')  # Return text ID for tracking
-        else:
-            print(f"❌ SMS failed to {phone}: {result.get('error', 'Unknown error')}")
-            return False
-    except Exception as e:
-        print(f"❌ SMS error to {phone}: {str(e)}")
-        return False
 
-def send_survey_sms(user_id, phone, name=None):
-    """Send SMS with survey link to a user, including weekly report if applicable"""
-    try:
-        # Check total responses and determine if this is a weekly report day
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM responses WHERE user_id = ?', (user_id,))
-        total_responses = cursor.fetchone()[0]
-        conn.close()
+        if rate_limited and attempt < SMS_RATE_LIMIT_RETRIES:
+            logger.warning("SMS rate limited, retrying", extra={'phone': phone, 'attempt': attempt + 2})
+            continue
 
-        # Weekly report is sent on days 8, 15, 22, etc. (right after each complete week)
-        is_weekly_report_day = total_responses > 0 and (total_responses % 7 == 0)
-
-        # Create survey token
-        token = create_survey_token(user_id, expires_hours=24)
-        if not token:
-            print(f"❌ Failed to create survey token for user {user_id}")
-            return False
-
-        # Get base URL from environment
-        base_url = os.getenv('BASE_URL', 'https://sms-survey-prototype-production.up.railway.app')
-        survey_url = f"{base_url}/survey/{token}"
+        logger.warning("SMS failed: %s", result.get('error', 'Unknown error'), extra={'phone': phone})
+        return False
 
-        # Create personalized message based on whether this is a weekly report day
-        greeting = f"Hi {name}!" if name else "Hi!"
+def count_segments(rendered):
+    """Record the billed segments of a rendered SMS template"""
+    SMS_SEGMENTS_TOTAL.inc(rendered['segments'], template=rendered['template'], encoding=rendered['encoding'])
+    if rendered['over_budget']:
+        logger.warning("SMS over segment budget", extra={'template': rendered['template'],
+                                                          'segments': rendered['segments']})
 
-        if is_weekly_report_day:
-            # Weekly report message (sent on days 8, 15, 22, etc.)
-            report_url = f"{base_url}/feedback/{user_id}"
-            message = f"""{greeting}
+def build_survey_message(user_id, name=None, run_id=None, conn=None):
+    """Create a survey token and the survey SMS text for a user, including weekly report if applicable.
 
-🎉 Week {(total_responses // 7) + 1} complete! Time for today's check-in + your weekly insights!
+    With conn, the token is written in the caller's transaction (caller commits).
+    """
+    # Check total responses and determine if this is a weekly report day
+    reader = conn or connect_db()
+    total_responses = archive.total_responses(reader, user_id)  # Archived responses still count
+    if conn is None:
+        reader.close()
 
-Today's survey: {survey_url}
+    # Weekly report is sent on days 8, 15, 22, etc. (right after each complete week)
+    is_weekly_report_day = total_responses > 0 and (total_responses % 7 == 0)
 
-📊 View your week's wellbeing report: {report_url}
+    # Create survey token
+    token = create_survey_token(user_id, run_id=run_id, conn=conn)
+    if not token:
+        logger.error("Failed to create survey token", extra={'user_id': user_id})
+        return None, None
 
-See your progress and insights! 💙"""
-        else:
-            # Regular daily message
-            message = f"""{greeting}
+    # Get base URL from environment
+    base_url = os.getenv('BASE_URL', 'https://sms-survey-prototype-production.up.railway.app')
+    survey_url = f"{base_url}{short_links.survey_path(token)}"
 
-Time for your daily wellbeing check-in! 🌟
+    # Create personalized message based on whether this is a weekly report day
+    greeting = f"Hi {name}!" if name else "Hi!"
 
-Please rate your day (1-10):
-• Joy & Happiness
-• Achievement & Progress
-• Meaning & Purpose
+    if is_weekly_report_day:
+        # Weekly report message (sent on days 8, 15, 22, etc.)
+        rendered = sms_templates.SURVEY_WEEKLY.render(greeting=greeting, week=(total_responses // 7) + 1,
+                                                      survey_url=survey_url,
+                                                      report_url=f"{base_url}/feedback/{user_id}")
+    else:
+        # Regular daily message
+        rendered = sms_templates.SURVEY_DAILY.render(greeting=greeting, survey_url=survey_url)
+    count_segments(rendered)
 
-Click here: {survey_url}
+    return token, rendered['text']
 
-Takes just 30 seconds. Thank you! 💙"""
+def send_survey_sms(user_id, phone, name=None, run_id=None, survey_day=None):
+    """Queue SMS with survey link to a user. Returns (token, outbox_id).
 
-        # Send SMS
-        text_id = send_sms(phone, message)
-        if text_id:
-            if is_weekly_report_day:
-                print(f"📱 Survey SMS + Weekly Report sent to {phone} with token {token[:8]}... (Week {(total_responses // 7) + 1} complete)")
-            else:
-                print(f"📱 Survey SMS sent to {phone} with token {token[:8]}... (Response #{total_responses + 1})")
-            return token
+    With a survey_day (scheduled runs), the user's daily_surveys row, token
+    and message are written in one transaction, and nothing at all if that
+    day's survey already was: then (None, None) is returned.
+    """
+    try:
+        # The token travels with the queued message, so retries reuse it
+        if survey_day is None:
+            token, message = build_survey_message(user_id, name, run_id)
+            if not token:
+                return None, None
+            outbox_id = enqueue_sms(DB_PATH, 'survey', user_id, phone, message,
+                                    payload={'token': token}, max_attempts=OUTBOX_MAX_ATTEMPTS)
         else:
-            print(f"❌ Failed to send survey SMS to {phone}")
-            return False
+            conn = connect_outbox(DB_PATH)
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                # Checked before the token is minted, so a skipped user leaves no token behind
+                if not campaigns.record_surveyed(conn, survey_day, user_id):
+                    conn.execute('ROLLBACK')
+                    return None, None
+                token, message = build_survey_message(user_id, name, run_id, conn=conn)
+                if not token:
+                    conn.execute('ROLLBACK')
+                    return None, None
+                outbox_id = enqueue_many(DB_PATH, [{'kind': 'survey', 'user_id': user_id, 'phone': phone,
+                                                    'message': message, 'payload': {'token': token}}],
+                                         max_attempts=OUTBOX_MAX_ATTEMPTS, conn=conn)[0]
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            finally:
+                conn.close()
+        logger.info("Survey SMS queued", extra={'user_id': user_id, 'outbox_id': outbox_id, **SAMPLED})
+        return token, outbox_id
+
+    except Exception:
+        logger.exception("Error queueing survey SMS", extra={'user_id': user_id})
+        return None, None
+
+# Outbox settings: messages are queued, then drained by process_outbox
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_RETRY_DELAY = int(os.getenv('OUTBOX_RETRY_DELAY', '30'))  # seconds before first retry
+OUTBOX_DRAIN_INTERVAL = int(os.getenv('OUTBOX_DRAIN_INTERVAL', '15'))
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '300'))
+OUTBOX_BATCH_SIZE = 100
+
+# One drain per worker at a time, whether kicked by a route or run by the scheduler
+outbox_drain_lock = threading.RLock()
+
+def outbox_batch_size():
+    """Claim no more than the limiter can send in half a lease"""
+    if not sms_limiter:
+        return OUTBOX_BATCH_SIZE
+    rate = sms_limiter.status()['current_rate']
+    return max(1, min(OUTBOX_BATCH_SIZE, int(rate * OUTBOX_LEASE_SECONDS / 2)))
+
+def process_outbox(max_workers=None):
+    """Send every due message in the outbox, rescheduling failures"""
+    summary = {'sent': 0, 'retry': 0, 'dead': 0, 'deferred': 0}
+    if not outbox_drain_lock.acquire(blocking=False):
+        return summary  # This worker is already draining
+    try:
+        if sms_limiter and sms_limiter.quota_exhausted():
+            logger.warning("SMS quota exhausted, leaving outbox for later")
+            return summary
+
+        summary = drain_outbox(DB_PATH, send_sms,
+                               batch_size=outbox_batch_size(),
+                               max_workers=max_workers or SMS_SEND_CONCURRENCY,
+                               base_delay=OUTBOX_RETRY_DELAY,
+                               on_sent=record_survey_sent,
+                               lease_seconds=OUTBOX_LEASE_SECONDS)
+    finally:
+        outbox_drain_lock.release()
+    if summary['deferred']:
+        logger.warning("SMS quota exhausted, outbox drain stopped", extra=summary)
+    elif any(summary.values()):
+        logger.info("Outbox drained", extra=summary)
+    return summary
+
+def record_survey_sent(item, text_id):
+    """Funnel 'sent' event for delivered survey SMS"""
+    token = item['payload'].get('token')
+    if item['kind'] != 'survey' or not token:
+        return
+    conn = connect_db()
+    try:
+        funnel.record_sent(conn, token)
+    finally:
+        conn.close()
 
-    except Exception as e:
-        print(f"❌ Error sending survey SMS to {phone}: {str(e)}")
-        return False
+def kick_outbox():
+    """Start draining the outbox in the background so the caller returns immediately"""
+    def run():
+        try:
+            process_outbox()  # Returns at once if this worker is already draining
+        except Exception:
+            logger.exception("Outbox drain error")
+
+    threading.Thread(target=run, daemon=True).start()
 
-# Database setup
+# Database setup: a file path, or a SQLite URI such as the simulator's shared in-memory database
 DB_PATH = 'survey.db'
+# Seconds a connection waits on another thread's or worker's write lock
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '15'))
+
+_initialized_dbs = set()
+_init_lock = threading.Lock()
+
+def connect_db():
+    """Open a connection to the survey database with per-route query timing.
+
+    Connections are never shared: every request, thread or greenlet opens
+    its own and closes it when done.
+    """
+    ensure_db()
+    return sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, factory=TimedConnection, uri=True)
+
+def connect_report_db():
+    """Read-only connection for heavy reports.
+
+    With REPORT_SOURCE=snapshot this is the newest backup, as long as it is
+    recent enough, so reports take no locks on the primary. Otherwise (or
+    without a recent backup) it is the primary. The connection's data_as_of
+    is the backup's taken_at, or None for the primary.
+    """
+    if backups.REPORT_SOURCE == 'snapshot':
+        latest = backups.latest_snapshot(backups.BACKUP_DIR, max_age=backups.REPORT_SNAPSHOT_MAX_AGE)
+        if latest:
+            taken_at, path = latest
+            REPORT_READS_TOTAL.inc(source='snapshot')
+            if has_request_context():
+                g.report_snapshot = taken_at.isoformat()
+            conn = backups.connect_snapshot(path, factory=TimedConnection)
+            conn.data_as_of = taken_at
+            return conn
+    REPORT_READS_TOTAL.inc(source='primary')
+    conn = connect_db()
+    conn.data_as_of = None
+    return conn
+
+def ensure_db():
+    """Create the schema on first use of DB_PATH in this process"""
+    if DB_PATH in _initialized_dbs:
+        return
+    with _init_lock:
+        if DB_PATH not in _initialized_dbs:
+            init_db()
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, factory=TimedConnection, uri=True)
     c = conn.cursor()
+    # WAL lets readers in other threads and workers proceed while one writes
+    c.execute('PRAGMA journal_mode=WAL')
     c.execute('''CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         phone TEXT NOT NULL
@@ -140,6 +388,9 @@ def init_db():
         end_date TEXT
     )''')
 
+    # Campaign schedules and enrollments
+    campaigns.init_campaigns(c)
+
     # Create survey tokens table for link-based surveys
     c.execute('''CREATE TABLE IF NOT EXISTS survey_tokens (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -152,24 +403,51 @@ def init_db():
         FOREIGN KEY(user_id) REFERENCES users(id)
     )''')
 
+    # Per-user lookups (feedback, weekly counts, segments) walk this index
+    c.execute('CREATE INDEX IF NOT EXISTS idx_responses_user_date ON responses (user_id, date)')
+
+    # Durable queue of outbound SMS and segment broadcasts
+    init_outbox(c)
+    init_broadcasts(c)
+
+    # Stored cohort analytics snapshots and per-day rollups
+    init_analytics(c)
+    rollups.init_rollups(c)
+
+    # Survey runs and token lifecycle tracking
+    funnel.init_funnel(c)
+
+    # Canonical phone keys for webhook lookups
+    phones.init_phones(c)
+
+    # Delivery keys for dropping retried webhooks
+    webhook_dedup.init_dedup(c)
+
+    # Full-text index over influence comments, synced by triggers
+    search.init_search(c)
+
+    # Cold-storage partitions of old responses
+    archive.init_archive(c)
+
+    # Per-user rolling state and the low-wellbeing alert queue
+    alerts.init_alerts(c)
+
     conn.commit()
     conn.close()
-
-init_db()
+    _initialized_dbs.add(DB_PATH)
 
 # Routes
 @app.route('/')
 def index():
     """Landing page with overview"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     c = conn.cursor()
 
     # Get stats
     c.execute('SELECT COUNT(*) FROM users')
     user_count = c.fetchone()[0]
 
-    c.execute('SELECT COUNT(*) FROM responses')
-    response_count = c.fetchone()[0]
+    response_count = archive.total_responses(conn)
 
     conn.close()
 
@@ -179,7 +457,7 @@ def index():
 
 @app.route('/admin', methods=['GET', 'POST'])
 def admin():
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     c = conn.cursor()
     if request.method == 'POST':
         phone = request.form.get('phone')
@@ -187,26 +465,22 @@ def admin():
         end_date = request.form.get('end_date')
 
         if phone:
-            # Validate phone number format (basic E.164 check)
-            if not phone.startswith('+') or len(phone) < 10:
-                flash("❌ Invalid phone format. Use E.164 format (e.g., +1234567890)", 'error')
-            else:
-                # Check if user already exists
-                c.execute('SELECT id FROM users WHERE phone = ?', (phone,))
-                existing_user = c.fetchone()
-
-                if existing_user:
+            # Stored in E.164 whatever format was typed; the unique index rejects duplicates
+            try:
+                user_id, error = phones.add_user(conn, phone)
+                if error == 'invalid':
+                    flash("❌ Invalid phone format. Use E.164 format (e.g., +1234567890)", 'error')
+                elif error == 'exists':
                     flash(f"❌ User {phone} already exists in the system", 'error')
                 else:
-                    try:
-                        c.execute('INSERT INTO users (phone) VALUES (?)', (phone,))
-                        flash(f"✅ Added user: {phone}", 'success')
-                    except Exception as e:
-                        flash(f"❌ Error adding user: {str(e)}", 'error')
+                    phone_directory.invalidate()
+                    flash(f"✅ Added user: {phones.normalize_phone(phone)}", 'success')
+            except Exception as e:
+                flash(f"❌ Error adding user: {str(e)}", 'error')
 
         if start_date and end_date:
             # Validate campaign dates
-            from datetime import datetime, date
+            from datetime import date
 
             try:
                 start_dt = datetime.strptime(start_date, '%Y-%m-%d').date()
@@ -223,8 +497,7 @@ def admin():
                 elif (end_dt - start_dt).days > 365:
                     flash("❌ Campaign duration cannot exceed 1 year", 'error')
                 else:
-                    c.execute('DELETE FROM campaign')
-                    c.execute('INSERT INTO campaign (id, start_date, end_date) VALUES (1, ?, ?)', (start_date, end_date))
+                    campaigns.set_window(conn, campaigns.DEFAULT_CAMPAIGN_ID, start_date, end_date)
                     flash(f"✅ Campaign dates set: {start_date} to {end_date}", 'success')
 
             except ValueError:
@@ -233,16 +506,16 @@ def admin():
         conn.commit()
     c.execute('SELECT * FROM users')
     users = c.fetchall()
-    c.execute('SELECT start_date, end_date FROM campaign WHERE id=1')
-    campaign = c.fetchone() or (None, None)
+    campaign_list = campaigns.list_campaigns(conn, datetime.now())
     conn.close()
-    campaign_start, campaign_end = campaign
-    return render_template('admin.html', users=users, campaign_start=campaign_start, campaign_end=campaign_end)
+    default = campaign_list[0]
+    return render_template('admin.html', users=users, campaign_start=default['start_date'],
+                           campaign_end=default['end_date'], campaigns=campaign_list)
 
 @app.route('/delete_user/<int:user_id>', methods=['POST'])
 def delete_user(user_id):
     """Delete a user and all their associated data"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     c = conn.cursor()
 
     try:
@@ -259,10 +532,15 @@ def delete_user(user_id):
         # Delete user's responses first (foreign key constraint)
         c.execute('DELETE FROM responses WHERE user_id = ?', (user_id,))
         responses_deleted = c.rowcount
+        c.execute('DELETE FROM archived_response_counts WHERE user_id = ?', (user_id,))
 
         # Delete user's survey tokens
         c.execute('DELETE FROM survey_tokens WHERE user_id = ?', (user_id,))
         tokens_deleted = c.rowcount
+        c.execute('DELETE FROM campaign_enrollments WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM daily_surveys WHERE user_id = ?', (user_id,))
+        search.forget_term_summaries(conn)
+        alerts.forget_user(conn, user_id)
 
         # Delete the user
         c.execute('DELETE FROM users WHERE id = ?', (user_id,))
@@ -270,6 +548,8 @@ def delete_user(user_id):
 
         if users_deleted > 0:
             conn.commit()
+            invalidate_feedback_cache(user_id)
+            phone_directory.invalidate()
             flash(f"✅ Deleted user {phone} and {responses_deleted} responses, {tokens_deleted} tokens", 'success')
         else:
             flash("❌ User not found or already deleted", 'error')
@@ -283,7 +563,7 @@ def delete_user(user_id):
 
 @app.route('/send_survey_sms', methods=['POST'])
 def send_survey_sms_route():
-    """Send daily survey SMS to a specific user"""
+    """Queue daily survey SMS to a specific user"""
     try:
         data = request.get_json()
         user_id = data.get('user_id')
@@ -292,20 +572,46 @@ def send_survey_sms_route():
         if not user_id or not phone:
             return jsonify({'success': False, 'error': 'Missing user_id or phone'}), 400
 
-        # Send survey SMS
-        token = send_survey_sms(user_id, phone)
+        # Queue survey SMS as part of today's manual run
+        conn = connect_db()
+        try:
+            run_id = funnel.manual_run(conn, datetime.now().strftime('%Y-%m-%d'))
+        finally:
+            conn.close()
+        token, outbox_id = send_survey_sms(user_id, phone, run_id=run_id)
 
         if token:
-            return jsonify({'success': True, 'message': f'Survey SMS sent to {phone}', 'token': token})
+            conn = connect_db()
+            try:
+                funnel.record_tokens(conn, run_id, 1)
+            finally:
+                conn.close()
+            kick_outbox()
+            return jsonify({'success': True, 'message': f'Survey SMS queued for {phone}',
+                            'token': token, 'outbox_id': outbox_id}), 202
         else:
-            return jsonify({'success': False, 'error': 'Failed to send SMS'}), 500
+            return jsonify({'success': False, 'error': 'Failed to queue SMS'}), 500
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def build_feedback_message(user_id, count=True):
+    """Create the SMS text linking a user to their feedback report.
+
+    count=False renders without recording segments, for text that is stored but not sent.
+    """
+    # Get base URL from environment
+    base_url = os.getenv('BASE_URL', 'https://sms-survey-prototype-production.up.railway.app')
+    report_url = f"{base_url}/feedback/{user_id}"
+
+    rendered = sms_templates.FEEDBACK_LINK.render(report_url=report_url)
+    if count:
+        count_segments(rendered)
+    return rendered['text']
+
 @app.route('/send_feedback_sms', methods=['POST'])
 def send_feedback_sms_route():
-    """Send feedback report link to a specific user"""
+    """Queue feedback report link to a specific user"""
     try:
         data = request.get_json()
         user_id = data.get('user_id')
@@ -314,32 +620,21 @@ def send_feedback_sms_route():
         if not user_id or not phone:
             return jsonify({'success': False, 'error': 'Missing user_id or phone'}), 400
 
-        # Get base URL from environment
-        base_url = os.getenv('BASE_URL', 'https://sms-survey-prototype-production.up.railway.app')
-        report_url = f"{base_url}/feedback/{user_id}"
-
-        # Create feedback message
-        message = f"""📊 Your Wellbeing Report is ready!
-
-View your personalized insights and progress:
-{report_url}
+        # Queue SMS
+        message = build_feedback_message(user_id)
+        outbox_id = enqueue_sms(DB_PATH, 'feedback', user_id, phone, message,
+                                max_attempts=OUTBOX_MAX_ATTEMPTS)
+        kick_outbox()
 
-See how you're doing across Joy, Achievement, and Meaning. 💙"""
-
-        # Send SMS
-        text_id = send_sms(phone, message)
-
-        if text_id:
-            return jsonify({'success': True, 'message': f'Feedback report SMS sent to {phone}'})
-        else:
-            return jsonify({'success': False, 'error': 'Failed to send SMS'}), 500
+        return jsonify({'success': True, 'message': f'Feedback report SMS queued for {phone}',
+                        'outbox_id': outbox_id}), 202
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/send_custom_sms', methods=['POST'])
 def send_custom_sms_route():
-    """Send custom message to a specific user"""
+    """Queue custom message to a specific user"""
     try:
         data = request.get_json()
         user_id = data.get('user_id')
@@ -349,114 +644,436 @@ def send_custom_sms_route():
         if not user_id or not phone or not message:
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
 
-        # Send custom SMS
-        text_id = send_sms(phone, message)
+        # Queue custom SMS
+        outbox_id = enqueue_sms(DB_PATH, 'custom', user_id, phone, message,
+                                max_attempts=OUTBOX_MAX_ATTEMPTS)
+        kick_outbox()
+
+        return jsonify({'success': True, 'message': f'Custom SMS queued for {phone}',
+                        'outbox_id': outbox_id}), 202
 
-        if text_id:
-            return jsonify({'success': True, 'message': f'Custom SMS sent to {phone}'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/broadcast_sms', methods=['POST'])
+def broadcast_sms_route():
+    """Queue a feedback or custom SMS for every user in a segment"""
+    try:
+        data = request.get_json() or {}
+        kind = data.get('kind', 'custom')
+        message = data.get('message')
+
+        if kind not in ('custom', 'feedback'):
+            return jsonify({'success': False, 'error': "kind must be 'custom' or 'feedback'"}), 400
+        if kind == 'custom' and not message:
+            return jsonify({'success': False, 'error': 'Missing message'}), 400
+
+        try:
+            segment = validate_segment(data.get('segment') or {'type': 'all'})
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        if data.get('dry_run'):
+            conn = connect_db()
+            recipients = resolve_segment(conn, segment)
+            conn.close()
+            return jsonify({'success': True, 'segment': segment, 'recipients': len(recipients)})
+
+        if kind == 'feedback':
+            broadcast_id, total = create_broadcast(
+                DB_PATH, segment, kind, build_feedback_message('{user_id}', count=False),
+                build_message=lambda user_id, phone: build_feedback_message(user_id),
+                max_attempts=OUTBOX_MAX_ATTEMPTS)
         else:
-            return jsonify({'success': False, 'error': 'Failed to send SMS'}), 500
+            broadcast_id, total = create_broadcast(DB_PATH, segment, kind, message,
+                                                   max_attempts=OUTBOX_MAX_ATTEMPTS)
+        kick_outbox()
+
+        logger.info("Broadcast queued", extra={'broadcast_id': broadcast_id, 'recipients': total, 'segment': segment['type']})
+        return jsonify({'success': True, 'broadcast_id': broadcast_id, 'recipients': total,
+                        'status_url': url_for('broadcast_status_route', broadcast_id=broadcast_id)}), 202
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/broadcast_sms/<int:broadcast_id>')
+def broadcast_status_route(broadcast_id):
+    """Progress and per-recipient results of a broadcast"""
+    include_recipients = request.args.get('recipients', '1') != '0'
+    status = broadcast_status(DB_PATH, broadcast_id, include_recipients=include_recipients)
+    if not status:
+        return jsonify({'success': False, 'error': 'Broadcast not found'}), 404
+    return jsonify({'success': True, **status})
+
+@app.route('/campaigns', methods=['GET', 'POST'])
+def campaigns_route():
+    """List campaigns, or create one and enroll users or a segment"""
+    if request.method == 'GET':
+        conn = connect_db()
+        try:
+            return jsonify({'success': True, 'campaigns': campaigns.list_campaigns(conn, datetime.now())})
+        finally:
+            conn.close()
+
+    data = request.get_json() or {}
+    try:
+        campaign = campaigns.validate_campaign(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    conn = connect_db()
+    try:
+        campaign_id = campaigns.create_campaign(conn, campaign)
+        enrolled = enroll_from_request(conn, campaign_id, data)
+        conn.commit()
+    except ValueError as e:
+        conn.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        conn.close()
+
+    logger.info("Campaign created", extra={'campaign_id': campaign_id, 'enrolled': enrolled})
+    return jsonify({'success': True, 'campaign_id': campaign_id, 'enrolled': enrolled, **campaign}), 201
+
+@app.route('/campaigns/<int:campaign_id>/<action>', methods=['POST'])
+def campaign_enrollment_route(campaign_id, action):
+    """Enroll or unenroll users (user_ids or a segment) in a campaign"""
+    if action not in ('enroll', 'unenroll'):
+        return jsonify({'success': False, 'error': 'Unknown action'}), 404
+    if campaign_id == campaigns.DEFAULT_CAMPAIGN_ID:
+        return jsonify({'success': False, 'error': 'The default campaign covers every unenrolled user'}), 400
+
+    data = request.get_json() or {}
+    conn = connect_db()
+    try:
+        if not conn.execute('SELECT 1 FROM campaign WHERE id = ?', (campaign_id,)).fetchone():
+            return jsonify({'success': False, 'error': 'Campaign not found'}), 404
+        if action == 'enroll':
+            changed = enroll_from_request(conn, campaign_id, data)
+        else:
+            changed = campaigns.unenroll(conn, campaign_id, user_ids_from_request(conn, data))
+            search.forget_term_summaries(conn, [campaign_id, campaigns.DEFAULT_CAMPAIGN_ID])
+        conn.commit()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        conn.close()
+    return jsonify({'success': True, 'campaign_id': campaign_id, action + 'ed': changed})
+
+def user_ids_from_request(conn, data):
+    """User ids from a request's user_ids list or segment filter"""
+    if 'segment' in data:
+        try:
+            segment = validate_segment(data['segment'])
+        except TypeError as e:
+            raise ValueError(str(e))
+        return [user_id for user_id, _ in resolve_segment(conn, segment)]
+    user_ids = data.get('user_ids') or []
+    if not isinstance(user_ids, list) or not all(isinstance(i, int) for i in user_ids):
+        raise ValueError('user_ids must be a list of integers')
+    return user_ids
+
+def enroll_from_request(conn, campaign_id, data):
+    enrolled = campaigns.enroll(conn, campaign_id, user_ids_from_request(conn, data))
+    # Enrolled users also leave the default cohort
+    search.forget_term_summaries(conn, [campaign_id, campaigns.DEFAULT_CAMPAIGN_ID])
+    return enrolled
+
 # Manual test SMS endpoint
 @app.route('/send_test_sms', methods=['POST'])
 def send_test_sms():
     try:
-        success_count, total_count = send_daily_sms()
-        if success_count == total_count:
-            flash(f'✅ Survey SMS sent successfully to all {total_count} users!', 'success')
-        elif success_count > 0:
-            flash(f'⚠️ Survey SMS sent to {success_count}/{total_count} users. Check logs for details.', 'warning')
+        conn = connect_db()
+        try:
+            active = campaigns.active_campaigns(conn, datetime.now())
+        finally:
+            conn.close()
+        queued_count, total_count = send_daily_sms(campaign_ids=active)
+        if total_count == 0:
+            flash('⚠️ No users are in a campaign running today.', 'warning')
+        elif queued_count == total_count:
+            flash(f'✅ Survey SMS queued for all {total_count} users!', 'success')
+        elif queued_count > 0:
+            flash(f'⚠️ Survey SMS queued for {queued_count}/{total_count} users. Check logs for details.', 'warning')
         else:
-            flash(f'❌ Failed to send survey SMS to any users. Check configuration.', 'error')
+            flash(f'❌ Failed to queue survey SMS for any users. Check configuration.', 'error')
     except Exception as e:
         flash(f'Error sending SMS: {str(e)}', 'error')
     return redirect(url_for('admin'))
 
-def send_daily_sms():
-    """Send daily survey SMS with links to all users"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT id, phone FROM users')
-    users = c.fetchall()
-    conn.close()
+# Number of SMS sent in parallel when draining the outbox
+SMS_SEND_CONCURRENCY = int(os.getenv('SMS_SEND_CONCURRENCY', '1'))
+
+def send_daily_sms(start_delivery=True, now=None, campaign_ids=None):
+    """Queue the daily survey for every campaign due now and start delivery.
+
+    The scheduler calls this every hour; each campaign runs once a day, at
+    or after its send hour, inside its window. Pass campaign_ids to send
+    right away for those campaigns (still only if active today). Returns
+    (queued, recipients).
+    """
+    now = now or datetime.now()
+    scheduled = campaign_ids is None
+    survey_day = now.date().isoformat() if scheduled else None
+    conn = connect_db()
+    try:
+        if scheduled:
+            campaign_ids = campaigns.claim_due(conn, now)
+        else:
+            campaign_ids = campaigns.active_campaigns(conn, now, campaign_ids)
+        # One recipient list for the whole tick: users in several due campaigns get one text
+        users = campaigns.recipients(conn, campaign_ids)
+        if scheduled:
+            # A run claimed again after a worker died resumes where it stopped
+            surveyed = campaigns.surveyed_on(conn, survey_day)
+            users = [(user_id, phone) for user_id, phone in users if user_id not in surveyed]
+        if not users:
+            if scheduled and campaign_ids:
+                campaigns.complete_run(conn, campaign_ids, now)
+            return 0, 0
+        run_id = funnel.start_run(conn, 'daily')
+    finally:
+        conn.close()
 
-    success_count = 0
     total_count = len(users)
+    queued_count = 0
+    started = time.perf_counter()
 
-    for user_id, phone in users:
-        try:
-            token = send_survey_sms(user_id, phone)
-            if token:
-                success_count += 1
-                print(f"✅ Survey SMS sent to {phone}")
-            else:
-                print(f"❌ Failed to send survey SMS to {phone}")
-        except Exception as e:
-            print(f"❌ Error sending survey SMS to {phone}: {e}")
+    for position, (user_id, phone) in enumerate(users, 1):
+        token, outbox_id = send_survey_sms(user_id, phone, run_id=run_id, survey_day=survey_day)
+        if token:
+            queued_count += 1
+        else:
+            logger.warning("Failed to queue survey SMS", extra={'user_id': user_id})
+        if scheduled and position % campaigns.CLAIM_RENEW_EVERY == 0:
+            # Keep the lease while a large cohort is still queuing, on the same clock as `now`
+            conn = connect_db()
+            try:
+                campaigns.renew_claim(conn, campaign_ids, now + timedelta(seconds=time.perf_counter() - started))
+            finally:
+                conn.close()
+
+    conn = connect_db()
+    try:
+        funnel.record_tokens(conn, run_id, queued_count)
+        if scheduled:
+            campaigns.complete_run(conn, campaign_ids, now)
+    finally:
+        conn.close()
+
+    logger.info("Daily SMS queued", extra={'queued': queued_count, 'total': total_count,
+                                           'campaigns': campaign_ids})
+    if start_delivery:
+        kick_outbox()
+    return queued_count, total_count
 
-    print(f"📊 Daily SMS Summary: {success_count}/{total_count} sent successfully")
-    return success_count, total_count
+# Cohort analytics snapshot, refreshed on a schedule and shared through the database
+ANALYTICS_REFRESH_MINUTES = int(os.getenv('ANALYTICS_REFRESH_MINUTES', '15'))
+ANALYTICS_DAYS = int(os.getenv('ANALYTICS_DAYS', '30'))
+analytics_cache = {'version': None, 'snapshot': None}
 
-scheduler = BackgroundScheduler()
-# Schedule for 7am ET (convert to UTC for server)
-scheduler.add_job(send_daily_sms, 'cron', hour=11, minute=0)  # 7am ET == 11am UTC
-scheduler.start()
+ROLLUP_INTERVAL_MINUTES = int(os.getenv('ROLLUP_INTERVAL_MINUTES', '60'))
 
-def verify_textbelt_webhook(api_key, timestamp, signature, payload):
-    """Verify TextBelt webhook signature"""
+def update_rollups():
+    """Roll up completed days since the watermark"""
+    days = rollups.update_rollups(DB_PATH)
+    if days:
+        logger.info("Daily rollups updated", extra={'days': days})
+    return days
+
+TOKEN_EXPIRY_SWEEP_MINUTES = int(os.getenv('TOKEN_EXPIRY_SWEEP_MINUTES', '15'))
+
+def expire_survey_tokens():
+    """Record the funnel 'expired' event for unused survey links past their expiry"""
+    conn = connect_db()
     try:
-        # Check timestamp is not more than 15 minutes old
-        current_time = int(time.time())
-        webhook_time = int(timestamp)
-        if abs(current_time - webhook_time) > 900:  # 15 minutes
-            print(f"⚠️ Webhook timestamp too old: {abs(current_time - webhook_time)} seconds")
-            return False
+        # expires_at is written from datetime.now(), so compare in the same clock
+        expired = funnel.expire_tokens(conn, datetime.now())
+    finally:
+        conn.close()
+    if expired:
+        logger.info("Survey tokens expired", extra={'expired': expired})
+    return expired
+
+def backup_database():
+    """Write an online backup of the survey database and prune old ones"""
+    ensure_db()
+    result = backups.make_backup(DB_PATH, backups.BACKUP_DIR, keep=backups.BACKUP_KEEP)
+    logger.info("Database backup written", extra=result)
+    return result
+
+def archive_old_responses():
+    """Move months older than ARCHIVE_RETENTION_DAYS to compressed archive files"""
+    ensure_db()
+    moved = archive.archive_responses(DB_PATH)
+    if moved:
+        logger.info("Responses archived", extra={'months': moved})
+    return moved
+
+def purge_webhook_deliveries():
+    """Drop webhook delivery keys older than WEBHOOK_DEDUP_TTL"""
+    conn = connect_db()
+    try:
+        return webhook_dedup.purge_deliveries(conn)
+    finally:
+        conn.close()
 
-        # Create signature
-        message = timestamp + payload
-        expected_signature = hmac.new(
-            api_key.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+def refresh_analytics():
+    """Recompute the cohort snapshot and store it for all workers"""
+    conn = connect_report_db()
+    try:
+        snapshot = compute_snapshot(conn, days=ANALYTICS_DAYS)
+        # Computed now, but from a backup the data may be up to REPORT_SNAPSHOT_MAX_AGE older
+        data_as_of = conn.data_as_of
+        snapshot['data_as_of'] = (data_as_of.strftime('%Y-%m-%d %H:%M:%S') if data_as_of
+                                  else snapshot['computed_at'])
+    finally:
+        conn.close()
+    conn = connect_db()
+    try:
+        save_snapshot(conn, snapshot)
+    finally:
+        conn.close()
+    logger.info("Analytics snapshot refreshed", extra={'compute_ms': snapshot['compute_ms']})
+    return snapshot
 
-        # Compare signatures
-        return hmac.compare_digest(signature, expected_signature)
-    except Exception as e:
-        print(f"❌ Signature verification error: {e}")
+def get_analytics_snapshot():
+    """Latest stored snapshot; each worker only parses a new version once"""
+    conn = connect_db()
+    try:
+        version = snapshot_version(conn)
+        if version is not None and version == analytics_cache['version']:
+            return analytics_cache['snapshot']
+        snapshot = load_snapshot(conn) if version else None
+    finally:
+        conn.close()
+
+    if snapshot is None:
+        snapshot = refresh_analytics()
+    analytics_cache.update(version=snapshot['computed_at'], snapshot=snapshot)
+    return snapshot
+
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', '1') != '0'
+# Only the worker holding this lock runs the jobs, so the daily SMS goes out once
+SCHEDULER_LOCK_PATH = os.getenv('SCHEDULER_LOCK_PATH', 'scheduler.lock')
+scheduler = None
+_scheduler_lock_file = None
+
+def acquire_scheduler_lock():
+    """Take the cross-process scheduler lock without blocking; held until this process exits"""
+    global _scheduler_lock_file
+    if _scheduler_lock_file is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:
+        return True  # No flock (Windows dev machines): single process assumed
+
+    lock_file = open(SCHEDULER_LOCK_PATH, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
         return False
+    _scheduler_lock_file = lock_file
+    return True
+
+def start_scheduler():
+    """Build and start the background jobs (once per deployment, in whichever worker gets the lock)"""
+    global scheduler
+    with _init_lock:
+        if scheduler is not None:
+            return scheduler
+        if not acquire_scheduler_lock():
+            logger.info("Background jobs are running in another worker")
+            return None
+        # APScheduler is only needed by processes that run jobs
+        from apscheduler.schedulers.background import BackgroundScheduler
+
+        scheduler = BackgroundScheduler()
+        # Hourly tick; each campaign sends at its own hour (default 7am ET == 11am UTC)
+        scheduler.add_job(metrics.timed_job('send_daily_sms', send_daily_sms), 'cron', minute=0)
+        # Deliver queued SMS and retry failures independently of the daily tick
+        scheduler.add_job(metrics.timed_job('process_outbox', process_outbox), 'interval',
+                          seconds=OUTBOX_DRAIN_INTERVAL, max_instances=1, coalesce=True)
+        # Materialize completed days for reports
+        scheduler.add_job(metrics.timed_job('update_rollups', update_rollups), 'interval',
+                          minutes=ROLLUP_INTERVAL_MINUTES, max_instances=1, coalesce=True)
+        # Count survey links that expired unused
+        scheduler.add_job(metrics.timed_job('expire_survey_tokens', expire_survey_tokens), 'interval',
+                          minutes=TOKEN_EXPIRY_SWEEP_MINUTES, max_instances=1, coalesce=True)
+        # Forget webhook delivery keys past their TTL
+        scheduler.add_job(metrics.timed_job('purge_webhook_deliveries', purge_webhook_deliveries), 'interval',
+                          minutes=60, max_instances=1, coalesce=True)
+        # Keep the cohort analytics snapshot fresh
+        scheduler.add_job(metrics.timed_job('refresh_analytics', refresh_analytics), 'interval',
+                          minutes=ANALYTICS_REFRESH_MINUTES, max_instances=1, coalesce=True)
+        # Online backups, which reports can also read from (REPORT_SOURCE=snapshot)
+        if backups.BACKUP_INTERVAL_MINUTES > 0:
+            scheduler.add_job(metrics.timed_job('backup_database', backup_database), 'interval',
+                              minutes=backups.BACKUP_INTERVAL_MINUTES, max_instances=1, coalesce=True)
+        # Nightly move of old months to cold storage, after the rollups they leave behind are final
+        if archive.ARCHIVE_RETENTION_DAYS > 0:
+            scheduler.add_job(metrics.timed_job('archive_old_responses', archive_old_responses), 'cron',
+                              hour=3, minute=30, max_instances=1, coalesce=True)
+        scheduler.start()
+        return scheduler
+
+def create_app(start_jobs=None):
+    """Application factory for serving processes: logging, schema, then background jobs.
+
+    Importing this module has no side effects; gunicorn runs 'app:create_app()'
+    once per worker. Pass start_jobs=False (or set SCHEDULER_ENABLED=0) for
+    processes that should only serve requests.
+    """
+    configure_logging()
+    logger.info("Using %s SMS provider", sms_provider.name)
+    ensure_db()
+    if start_jobs is None:
+        start_jobs = SCHEDULER_ENABLED
+    if start_jobs:
+        start_scheduler()
+    return app
 
 # TextBelt webhook to receive SMS replies
 @app.route('/sms_webhook', methods=['POST'])
 def sms_webhook():
     """Receive and process SMS replies from TextBelt"""
+    if not webhook_recorder:
+        with WEBHOOK_INGEST_SECONDS.time():
+            return handle_sms_webhook()
+
+    start = time.perf_counter()
+    with WEBHOOK_INGEST_SECONDS.time():
+        result = handle_sms_webhook()
+    webhook_recorder.record(request, result[1], time.perf_counter() - start)
+    return result
+
+def handle_sms_webhook():
+    """Verify, parse and store one webhook delivery"""
     try:
         # Log all incoming webhook data for debugging
         headers = dict(request.headers)
         raw_data = request.get_data().decode('utf-8')
 
-        print(f"🔍 Webhook received - Headers: {headers}")
-        print(f"🔍 Webhook received - Raw data: {raw_data}")
+        logger.debug("Webhook received", extra={'headers': json.dumps(headers), 'raw_data': raw_data})
 
         # Check for TextBelt signature verification
         textbelt_signature = headers.get('X-Textbelt-Signature')
         textbelt_timestamp = headers.get('X-Textbelt-Timestamp')
 
         if textbelt_signature and textbelt_timestamp:
-            print(f"🔐 TextBelt signature found, verifying...")
             api_key = os.getenv('TEXTBELT_API_KEY')
             if api_key and not verify_textbelt_webhook(api_key, textbelt_timestamp, textbelt_signature, raw_data):
-                print(f"❌ Invalid TextBelt signature")
+                logger.warning("Invalid TextBelt signature")
+                WEBHOOK_INGEST_TOTAL.inc(result='invalid_signature')
                 return 'Invalid signature', 401
-            print(f"✅ TextBelt signature verified")
+            logger.debug("TextBelt signature verified")
         else:
-            print(f"⚠️ No TextBelt signature headers found (testing mode)")
+            logger.debug("No TextBelt signature headers found (testing mode)")
 
         # Store for debugging endpoint
-        webhook_logs.append({
+        record_webhook_log({
             'timestamp': datetime.now().isoformat(),
             'headers': headers,
             'raw_data': raw_data,
@@ -470,10 +1087,10 @@ def sms_webhook():
         # Also try form data in case TextBelt sends form-encoded data
         if not data:
             data = request.form.to_dict()
-            print(f"🔍 Trying form data: {data}")
 
         if not data:
-            print("❌ No JSON or form data received")
+            logger.warning("Webhook had no JSON or form data")
+            WEBHOOK_INGEST_TOTAL.inc(result='no_data')
             return 'No data', 400
 
         # TextBelt webhook format: {"fromNumber": "+1555123456", "text": "reply"}
@@ -482,129 +1099,111 @@ def sms_webhook():
         from_number = data.get('fromNumber')
         reply_text = data.get('text', '').strip()
 
-        print(f"📱 Received SMS reply from {from_number}: {reply_text}")
-        print(f"🔍 Full webhook data: {data}")
+        logger.info("Received SMS reply", extra={'phone': from_number, 'text_id': text_id, **SAMPLED})
 
         # Validate required fields
         if not from_number or not reply_text:
-            print(f"⚠️ Missing required fields: fromNumber={from_number}, text='{reply_text}'")
+            logger.warning("Webhook missing required fields", extra={'has_from_number': bool(from_number), 'has_text': bool(reply_text)})
+            WEBHOOK_INGEST_TOTAL.inc(result='missing_fields')
             return 'Missing required fields', 400
 
+        # Provider retries of a delivery this worker already handled
+        key = webhook_dedup.delivery_key(data.get('textId'), from_number, reply_text)
+        if webhook_deduplicator.seen(key):
+            WEBHOOK_INGEST_TOTAL.inc(result='duplicate')
+            return 'OK', 200
+
         # Parse the survey response
         joy, achievement, meaning, influence = parse_survey_response(reply_text)
 
         if joy is not None:  # Valid response parsed
             # Store in database
-            store_survey_response(from_number, joy, achievement, meaning, influence, reply_text)
-            print(f"✅ Stored survey response from {from_number}")
+            outcome = store_survey_response(from_number, joy, achievement, meaning, influence, reply_text,
+                                            delivery_key=key)
+            WEBHOOK_INGEST_TOTAL.inc(result=outcome)
+            logger.debug("Stored survey response", extra={'phone': from_number, 'outcome': outcome})
         else:
-            print(f"⚠️ Could not parse survey response: {reply_text}")
+            WEBHOOK_INGEST_TOTAL.inc(result='unparsed')
+            logger.info("Could not parse survey response", extra={'phone': from_number})
 
         return 'OK', 200
 
-    except Exception as e:
-        print(f"❌ Webhook error: {str(e)}")
+    except Exception:
+        WEBHOOK_INGEST_TOTAL.inc(result='error')
+        logger.exception("Webhook error")
         return 'Error', 500
 
-def parse_survey_response(text):
-    """Parse survey response text to extract ratings and influence"""
-    import re
-
-    # Look for 3 numbers (joy, achievement, meaning ratings)
-    numbers = re.findall(r'\b([1-9]|10)\b', text)
+# Hours a survey link stays valid
+SURVEY_TOKEN_TTL_HOURS = float(os.getenv('SURVEY_TOKEN_TTL_HOURS', '24'))
 
-    if len(numbers) >= 3:
-        try:
-            joy = int(numbers[0])
-            achievement = int(numbers[1])
-            meaning = int(numbers[2])
-
-            # Extract influence text (everything after the numbers)
-            # Remove the numbers and clean up the remaining text
-            influence_text = text
-            for num in numbers[:3]:
-                influence_text = influence_text.replace(num, '', 1)
-            influence_text = re.sub(r'[^\w\s]', ' ', influence_text).strip()
-            influence_text = ' '.join(influence_text.split())  # Clean whitespace
-
-            return joy, achievement, meaning, influence_text
-        except ValueError:
-            pass
-
-    return None, None, None, None
-
-def convert_utc_to_eastern(utc_timestamp_str):
-    """Convert UTC timestamp string to Eastern Time"""
-    try:
-        # Parse the UTC timestamp
-        utc_dt = datetime.strptime(utc_timestamp_str, '%Y-%m-%d %H:%M:%S')
-
-        # Set UTC timezone
-        utc_dt = utc_dt.replace(tzinfo=pytz.UTC)
-
-        # Convert to Eastern Time
-        eastern = pytz.timezone('US/Eastern')
-        eastern_dt = utc_dt.astimezone(eastern)
-
-        # Return formatted string with 12-hour format
-        return eastern_dt.strftime('%Y-%m-%d %I:%M:%S %p %Z')
-    except Exception as e:
-        print(f"Error converting timestamp: {e}")
-        return utc_timestamp_str
+def create_survey_token(user_id, expires_hours=None, run_id=None, conn=None):
+    """Create a new survey token for a user, optionally as part of a survey run.
 
-def generate_survey_token():
-    """Generate a unique survey token"""
-    return secrets.token_urlsafe(32)
-
-def create_survey_token(user_id, expires_hours=24):
-    """Create a new survey token for a user"""
+    With conn, the token is written in the caller's transaction (caller commits).
+    """
     token = generate_survey_token()
-    expires_at = datetime.now() + timedelta(hours=expires_hours)
+    expires_at = datetime.now() + timedelta(hours=expires_hours or SURVEY_TOKEN_TTL_HOURS)
 
-    conn = sqlite3.connect(DB_PATH)
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db()
     cursor = conn.cursor()
 
     try:
-        cursor.execute('''
-            INSERT INTO survey_tokens (token, user_id, expires_at)
-            VALUES (?, ?, ?)
-        ''', (token, user_id, expires_at))
-        conn.commit()
+        with TOKEN_CREATE_SECONDS.time():
+            if short_links.SURVEY_LINK_STYLE == 'short':
+                token = short_links.insert_short_token(conn, user_id, expires_at, run_id)
+            else:
+                cursor.execute('''
+                    INSERT INTO survey_tokens (token, user_id, expires_at, run_id)
+                    VALUES (?, ?, ?, ?)
+                ''', (token, user_id, expires_at, run_id))
+            if own_conn:
+                conn.commit()
+        TOKEN_CREATE_TOTAL.inc(result='success')
         return token
-    except Exception as e:
-        print(f"Error creating survey token: {e}")
+    except Exception:
+        TOKEN_CREATE_TOTAL.inc(result='error')
+        logger.exception("Error creating survey token", extra={'user_id': user_id})
         return None
     finally:
-        conn.close()
+        if own_conn:
+            conn.close()
 
 def get_survey_token_info(token):
     """Get survey token information and validate it"""
-    conn = sqlite3.connect(DB_PATH)
+    start = time.perf_counter()
+    token_info, error = lookup_survey_token(token)
+    TOKEN_VALIDATE_SECONDS.observe(time.perf_counter() - start)
+    TOKEN_VALIDATE_TOTAL.inc(result=error or 'valid')
+    return token_info, error
+
+def lookup_survey_token(token):
+    """Look up a survey token and check it is unused and unexpired"""
+    conn = connect_db()
     cursor = conn.cursor()
 
     try:
-        print(f"🔍 Validating token: {token[:8]}...")
-
-        cursor.execute('''
-            SELECT st.id, st.user_id, st.expires_at, st.is_used, u.phone
+        # Short codes carry their row id: look up by primary key, then compare the code
+        short_id = short_links.parse_short_code(token)
+        cursor.execute(f'''
+            SELECT st.id, st.user_id, st.expires_at, st.is_used, u.phone, st.token
             FROM survey_tokens st
             JOIN users u ON st.user_id = u.id
-            WHERE st.token = ?
-        ''', (token,))
+            WHERE {'st.id' if short_id is not None else 'st.token'} = ?
+        ''', (short_id if short_id is not None else token,))
 
         result = cursor.fetchone()
-        print(f"🔍 Database query result: {result}")
 
-        if not result:
-            print(f"❌ Token not found in database: {token}")
+        if not result or (short_id is not None and not short_links.codes_match(result[5], token)):
+            logger.info("Survey token not found")
             return None, "Invalid token"
 
-        token_id, user_id, expires_at_str, is_used, phone = result
-        print(f"🔍 Token info: id={token_id}, user_id={user_id}, expires_at={expires_at_str}, is_used={is_used}")
+        token_id, user_id, expires_at_str, is_used, phone, _ = result
 
         # Check if token is already used
         if is_used:
-            print(f"❌ Token already used: {token}")
+            logger.info("Survey token already used", extra={'token_id': token_id})
             return None, "Token already used"
 
         # Check if token is expired
@@ -619,18 +1218,18 @@ def get_survey_token_info(token):
                     continue
 
             if expires_at is None:
-                print(f"❌ Could not parse expires_at: {expires_at_str}")
+                logger.error("Could not parse survey token expiry", extra={'token_id': token_id, 'expires_at': expires_at_str})
                 return None, "Token validation error"
 
             if datetime.now() > expires_at:
-                print(f"❌ Token expired: {expires_at} < {datetime.now()}")
+                logger.info("Survey token expired", extra={'token_id': token_id})
                 return None, "Token expired"
 
         except Exception as date_error:
-            print(f"❌ Date parsing error: {date_error}")
+            logger.error("Survey token date parsing error: %s", date_error, extra={'token_id': token_id})
             return None, "Token validation error"
 
-        print(f"✅ Token validation successful")
+        logger.debug("Survey token valid", extra={'token_id': token_id})
         return {
             'token_id': token_id,
             'user_id': user_id,
@@ -639,61 +1238,100 @@ def get_survey_token_info(token):
             'expires_at': expires_at
         }, None
 
-    except Exception as e:
-        print(f"❌ Error validating token: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error validating survey token")
         return None, "Token validation error"
     finally:
         conn.close()
 
 def mark_token_used(token):
-    """Mark a survey token as used"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    """Mark a survey token as used and record the funnel 'submitted' event"""
+    conn = connect_db()
 
     try:
-        cursor.execute('''
-            UPDATE survey_tokens
-            SET is_used = TRUE, used_at = CURRENT_TIMESTAMP
-            WHERE token = ?
-        ''', (token,))
-        conn.commit()
+        funnel.record_submitted(conn, token)
         return True
-    except Exception as e:
-        print(f"Error marking token as used: {e}")
+    except Exception:
+        logger.exception("Error marking survey token as used")
         return False
     finally:
         conn.close()  # Return original if conversion fails
 
-def store_survey_response(phone, joy, achievement, meaning, influence, raw_message):
-    """Store survey response in database"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
+# Phone -> user id for inbound replies, cached per worker
+phone_directory = phones.PhoneDirectory()
 
-        # Find user_id from phone number
-        c.execute('SELECT id FROM users WHERE phone = ?', (phone,))
-        user_result = c.fetchone()
+# Recently handled webhook deliveries, cached per worker
+webhook_deduplicator = webhook_dedup.WebhookDeduplicator()
 
-        if user_result:
-            user_id = user_result[0]
+# Invalid survey tokens per client, counted per worker
+guess_limiter = short_links.GuessLimiter()
 
-            # Insert response
-            c.execute('''INSERT INTO responses
-                        (user_id, joy, achievement, meaningfulness, influence, date)
-                        VALUES (?, ?, ?, ?, ?, datetime('now'))''',
-                     (user_id, joy, achievement, meaning, influence))
+def report_alerts(raised):
+    """Count and log alerts raised by a stored response"""
+    for alert in raised:
+        WELLBEING_ALERTS_TOTAL.inc(rule=alert['rule'])
+        logger.warning("Wellbeing alert: %s", alert['message'],
+                       extra={'user_id': alert['user_id'], 'rule': alert['rule'], 'alert_id': alert['id']})
 
-            conn.commit()
-            print(f"✅ Response stored for user {user_id}")
-        else:
-            print(f"⚠️ User not found for phone {phone}")
+def store_survey_response(phone, joy, achievement, meaning, influence, raw_message, delivery_key=None):
+    """Store survey response in database.
 
-        conn.close()
+    With a delivery_key, the key is claimed in the same transaction so a
+    retried webhook is stored once. Returns 'stored', 'duplicate',
+    'unknown_user' or 'error'.
+    """
+    conn = None
+    try:
+        conn = connect_db()
+        c = conn.cursor()
 
-    except Exception as e:
-        print(f"❌ Database error: {str(e)}")
+        # Find user_id from phone number, in whatever format the provider used
+        user_id = phone_directory.lookup(conn, DB_PATH, phone)
+
+        for attempt in range(2):
+            if not user_id:
+                logger.warning("User not found for reply", extra={'phone': phone})
+                return 'unknown_user'
+
+            if delivery_key and not webhook_deduplicator.claim(conn, delivery_key):
+                conn.rollback()
+                webhook_deduplicator.remember(delivery_key)
+                logger.info("Duplicate webhook delivery", extra={'user_id': user_id, **SAMPLED})
+                return 'duplicate'
+
+            # Insert response; the user may have been deleted by another worker
+            inserted = c.execute('''INSERT INTO responses
+                                    (user_id, joy, achievement, meaningfulness, influence, date)
+                                    SELECT ?, ?, ?, ?, ?, datetime('now')
+                                    WHERE EXISTS (SELECT 1 FROM users WHERE id = ?)
+                                    RETURNING id, date''',
+                                 (user_id, joy, achievement, meaning, influence, user_id)).fetchall()
+            if inserted:
+                break
+
+            # This worker's map is stale: the number may have been deleted and added again
+            conn.rollback()
+            phone_directory.invalidate()
+            user_id = phone_directory.refresh(conn, phone)
+        else:
+            logger.warning("User not found for reply", extra={'phone': phone})
+            return 'unknown_user'
+
+        response_id, stored_at = inserted[0]
+        raised = alerts.observe(conn, user_id, {'id': response_id, 'joy': joy, 'achievement': achievement,
+                                                'meaning': meaning, 'date': stored_at})
+        conn.commit()
+        report_alerts(raised)
+        if delivery_key:
+            webhook_deduplicator.remember(delivery_key)
+        invalidate_feedback_cache(user_id)
+        logger.info("Response stored", extra={'user_id': user_id, **SAMPLED})
+        return 'stored'
+
+    except Exception:
+        logger.exception("Database error storing response")
+        return 'error'
+    finally:
         if conn:
             conn.close()
 
@@ -720,7 +1358,7 @@ def add_response():
         return redirect(url_for('add_response'))
 
     # GET request - show form
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     c = conn.cursor()
     c.execute('SELECT phone FROM users')
     users = c.fetchall()
@@ -733,7 +1371,7 @@ def add_response():
 def view_responses():
     """Admin page to view all survey responses"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect_report_db()
         c = conn.cursor()
 
         # Get all responses with user phone numbers
@@ -755,28 +1393,275 @@ def view_responses():
                     response_list[6] = convert_utc_to_eastern(response[6])
                 responses.append(tuple(response_list))
             except Exception as e:
-                print(f"Error processing response {response}: {e}")
+                logger.warning("Error processing response: %s", e, extra={'response_id': response[0]})
                 # Keep original response if conversion fails
                 responses.append(response)
 
         return render_template('responses.html', responses=responses)
 
-    except Exception as e:
-        print(f"Error in view_responses: {e}")
+    except Exception:
+        logger.exception("Error in view_responses")
         # Return empty responses if there's an error
         return render_template('responses.html', responses=[])
 
-# Store webhook logs for debugging
-webhook_logs = []
+@app.route('/responses/search')
+def search_responses():
+    """Ranked full-text search over influence comments (?q=&user_id=&start=&end=&min_score=&max_score=)"""
+    args = request.args
+    try:
+        filters = {
+            'user_id': int(args['user_id']) if args.get('user_id') else None,
+            'start': datetime.strptime(args['start'], '%Y-%m-%d').date().isoformat() if args.get('start') else None,
+            'end': datetime.strptime(args['end'], '%Y-%m-%d').date().isoformat() if args.get('end') else None,
+            'min_score': float(args['min_score']) if args.get('min_score') else None,
+            'max_score': float(args['max_score']) if args.get('max_score') else None,
+        }
+        limit = min(int(args.get('limit', 50)), search.MAX_RESULTS)
+        offset = max(int(args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid filter: dates are YYYY-MM-DD, scores and ids are numbers'}), 400
+
+    conn = connect_report_db()
+    try:
+        if not search.search_available(conn):
+            return jsonify({'success': False, 'error': 'Full-text search is not available'}), 503
+        start = time.perf_counter()
+        results, has_more = search.search(conn, args.get('q', ''), limit=limit, offset=offset, **filters)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        conn.close()
+
+    return jsonify({'success': True, 'query': args.get('q', ''), 'results': results, 'has_more': has_more,
+                    'offset': offset, 'took_ms': round((time.perf_counter() - start) * 1000, 1)})
+
+@app.route('/responses/terms')
+def response_terms():
+    """Most used terms in influence comments per week (?week=YYYY-MM-DD&weeks=N&campaign_id=&limit=)"""
+    args = request.args
+    try:
+        week = datetime.strptime(args['week'], '%Y-%m-%d').date() if args.get('week') else datetime.now().date()
+        weeks = min(max(int(args.get('weeks', 1)), 1), search.MAX_WEEKS)
+        campaign_id = int(args['campaign_id']) if args.get('campaign_id') else None
+        limit = min(int(args.get('limit', 20)), search.MAX_RESULTS)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid parameters: week is YYYY-MM-DD, the rest are numbers'}), 400
+
+    conn = connect_db()
+    try:
+        if not search.search_available(conn):
+            return jsonify({'success': False, 'error': 'Full-text search is not available'}), 503
+        summaries = [search.term_summary(conn, week - timedelta(weeks=i), campaign_id, limit, today=datetime.now().date())
+                     for i in range(weeks)]
+    finally:
+        conn.close()
+    return jsonify({'success': True, 'weeks': summaries})
+
+def get_funnel_report(limit=14):
+    conn = connect_db()
+    try:
+        return funnel.funnel_report(conn, limit)
+    finally:
+        conn.close()
+
+@app.route('/admin/analytics')
+def analytics_dashboard():
+    """Cohort trends, streaks and flourishing share from the cached snapshot"""
+    return render_template('analytics.html', snapshot=get_analytics_snapshot(),
+                           funnel_runs=get_funnel_report(),
+                           refresh_minutes=ANALYTICS_REFRESH_MINUTES)
+
+@app.route('/admin/funnel.json')
+def funnel_json():
+    """Sent/opened/submitted/expired counts and submit delays per survey run"""
+    try:
+        limit = int(request.args.get('limit', 30))
+        if limit < 1:
+            raise ValueError(limit)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be a positive whole number'}), 400
+    return jsonify({'runs': get_funnel_report(limit)})
+
+@app.route('/admin/analytics.json')
+def analytics_json():
+    """Cohort analytics snapshot as JSON (?refresh=1 recomputes it)"""
+    if request.args.get('refresh') == '1':
+        snapshot = refresh_analytics()
+        analytics_cache.update(version=snapshot['computed_at'], snapshot=snapshot)
+        return jsonify(snapshot)
+    return jsonify(get_analytics_snapshot())
+
+@app.route('/admin/rollups.<fmt>')
+def export_rollups(fmt):
+    """Daily rollups as CSV or JSON (?start=YYYY-MM-DD&end=YYYY-MM-DD)"""
+    if fmt not in ('csv', 'json'):
+        return jsonify({'success': False, 'error': 'Format must be csv or json'}), 404
+    conn = connect_report_db()
+    try:
+        days = rollups.load_rollups(conn, request.args.get('start'), request.args.get('end'))
+    finally:
+        conn.close()
+
+    if fmt == 'json':
+        return jsonify({'days': days})
+    out = io.StringIO()
+    rollups.write_csv(days, out)
+    return out.getvalue(), 200, {'Content-Type': 'text/csv; charset=utf-8',
+                                 'Content-Disposition': 'attachment; filename=daily_rollups.csv'}
+
+@app.route('/admin/alerts')
+def alerts_dashboard():
+    """Open low-wellbeing alerts, newest first"""
+    conn = connect_db()
+    try:
+        open_alerts = alerts.list_alerts(conn)
+    finally:
+        conn.close()
+    return render_template('alerts.html', alerts=open_alerts, low_score=alerts.ALERT_LOW_SCORE,
+                           low_streak=alerts.ALERT_LOW_STREAK, week_drop=alerts.ALERT_WEEK_DROP)
+
+@app.route('/admin/alerts.json')
+def alerts_json():
+    """Alerts as JSON (?status=open|acknowledged|all&limit=)"""
+    status = request.args.get('status', 'open')
+    if status not in ('open', 'acknowledged', 'all'):
+        return jsonify({'success': False, 'error': 'status must be open, acknowledged or all'}), 400
+    try:
+        limit = min(int(request.args.get('limit', 200)), 1000)
+        if limit < 1:
+            raise ValueError(limit)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be a positive whole number'}), 400
+    conn = connect_db()
+    try:
+        return jsonify({'success': True, 'alerts': alerts.list_alerts(conn, None if status == 'all' else status,
+                                                                      limit)})
+    finally:
+        conn.close()
+
+@app.route('/admin/alerts/<int:alert_id>/ack', methods=['POST'])
+def acknowledge_alert(alert_id):
+    """Mark an open alert as handled"""
+    conn = connect_db()
+    try:
+        if not alerts.acknowledge(conn, alert_id):
+            return jsonify({'success': False, 'error': 'No open alert with that id'}), 404
+        conn.commit()
+    finally:
+        conn.close()
+    return jsonify({'success': True, 'alert_id': alert_id})
+
+RESPONSE_EXPORT_COLUMNS = ['id', 'phone', 'user_id', 'date', 'joy', 'achievement', 'meaningfulness', 'influence']
+
+@app.route('/admin/responses.<fmt>')
+def export_responses(fmt):
+    """Responses as CSV or JSON, archived months included (?start=YYYY-MM-DD&end=YYYY-MM-DD)"""
+    if fmt not in ('csv', 'json'):
+        return jsonify({'success': False, 'error': 'Format must be csv or json'}), 404
+    try:
+        start, end = (datetime.strptime(request.args[key], '%Y-%m-%d').date().isoformat()
+                      if request.args.get(key) else None for key in ('start', 'end'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    # Always the primary: a backup taken before an archive run would repeat the archived rows
+    conn = connect_db()
+    if fmt == 'json':
+        try:
+            return jsonify({'responses': list(archive.read_responses(conn, start, end))})
+        finally:
+            conn.close()
+
+    def rows():
+        try:
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(RESPONSE_EXPORT_COLUMNS)
+            for row in archive.read_responses(conn, start, end):
+                writer.writerow([row[column] for column in RESPONSE_EXPORT_COLUMNS])
+                if out.tell() > 1 << 16:
+                    yield out.getvalue()
+                    out.seek(0)
+                    out.truncate()
+            yield out.getvalue()
+        finally:
+            conn.close()
+
+    return app.response_class(rows(), mimetype='text/csv',
+                              headers={'Content-Disposition': 'attachment; filename=responses.csv'})
+
+# Recent webhook deliveries for /debug/webhooks, bounded and shared by the worker's threads
+WEBHOOK_LOG_SIZE = int(os.getenv('WEBHOOK_LOG_SIZE', '100'))
+webhook_logs = deque(maxlen=WEBHOOK_LOG_SIZE)
+webhook_log_lock = threading.Lock()
+webhook_log_total = 0
+
+def record_webhook_log(entry):
+    global webhook_log_total
+    with webhook_log_lock:
+        webhook_logs.append(entry)
+        webhook_log_total += 1
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics collected across all workers"""
+    return metrics.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 @app.route('/debug/webhooks')
 def debug_webhooks():
     """Show recent webhook calls for debugging"""
+    with webhook_log_lock:
+        recent = list(webhook_logs)[-10:]  # Last 10 webhooks
+        total = webhook_log_total
     return {
-        'recent_webhooks': webhook_logs[-10:],  # Last 10 webhooks
-        'total_received': len(webhook_logs)
+        'recent_webhooks': recent,
+        'total_received': total
     }
 
+@app.route('/debug/profiles')
+def debug_profiles():
+    """List captured request profiles and recent slow queries"""
+    return jsonify({
+        'profiles': profiling.list_profiles(),
+        'slow_queries': profiling.recent_slow_queries(),
+        'slow_query_ms': profiling.SLOW_QUERY_MS,
+        'sample_rate': profiling.PROFILE_SAMPLE_RATE
+    })
+
+@app.route('/debug/profiles/<profile_id>')
+def debug_profile(profile_id):
+    """Show one profile's top functions, or download it with ?format=pstats"""
+    if request.args.get('format') == 'pstats':
+        path = profiling.profile_path(profile_id, '.prof')
+        if not path:
+            return jsonify({'success': False, 'error': 'Profile not found'}), 404
+        return send_file(path, as_attachment=True, download_name=f'{profile_id}.prof')
+
+    profile = profiling.load_profile(profile_id)
+    if not profile:
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+    return jsonify(profile)
+
+@app.route('/debug/rate_limit')
+def debug_rate_limit():
+    """Show the shared outbound SMS limiter state"""
+    if not sms_limiter:
+        return {'enabled': False}
+    return {'enabled': True, **sms_limiter.status()}
+
+@app.route('/debug/outbox')
+def debug_outbox():
+    """Show outbox counts by status and recent dead letters"""
+    return jsonify(outbox_stats(DB_PATH))
+
+@app.route('/outbox/<int:outbox_id>/retry', methods=['POST'])
+def retry_outbox_message(outbox_id):
+    """Move a dead-lettered SMS back into the queue"""
+    if not requeue(DB_PATH, outbox_id):
+        return jsonify({'success': False, 'error': 'Message not found or not dead-lettered'}), 404
+    kick_outbox()
+    return jsonify({'success': True, 'message': f'Outbox message {outbox_id} requeued'})
+
 # Debug endpoint to check environment variables
 @app.route('/debug/env')
 def debug_env():
@@ -792,10 +1677,23 @@ def debug_env():
     }
 
 @app.route('/survey/<token>', methods=['GET', 'POST'])
+@app.route('/s/<token>', methods=['GET', 'POST'])
 def survey(token):
     """Handle survey display and submission"""
+    # Clients that keep presenting invalid tokens are guessing
+    client = request.access_route[-1] if request.access_route else request.remote_addr
+    if guess_limiter.blocked(client):
+        TOKEN_VALIDATE_TOTAL.inc(result='rate_limited')
+        logger.warning("Survey token guessing blocked", extra={'client': client})
+        return render_template('error.html',
+                             title="Too Many Attempts",
+                             message="Too many invalid survey links. Please try again later.",
+                             icon="fas fa-exclamation-triangle"), 429
+
     # Validate token
     token_info, error = get_survey_token_info(token)
+    if error == "Invalid token":
+        guess_limiter.record_failure(client)
     if error:
         return render_template('error.html',
                              title="Survey Not Available",
@@ -803,6 +1701,12 @@ def survey(token):
                              icon="fas fa-exclamation-triangle"), 400
 
     if request.method == 'GET':
+        conn = connect_db()
+        try:
+            funnel.record_opened(conn, token)
+        finally:
+            conn.close()
+
         # Display survey form
         return render_template('survey.html',
                              user_name=token_info.get('name'),
@@ -825,21 +1729,27 @@ def survey(token):
                                      icon="fas fa-exclamation-triangle"), 400
 
             # Store response in database
-            conn = sqlite3.connect(DB_PATH)
+            conn = connect_db()
             cursor = conn.cursor()
 
+            submitted_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             cursor.execute('''
                 INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
                 VALUES (?, ?, ?, ?, ?, ?)
-            ''', (token_info['user_id'], joy, achievement, meaning, influence, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            ''', (token_info['user_id'], joy, achievement, meaning, influence, submitted_at))
+            raised = alerts.observe(conn, token_info['user_id'], {'id': cursor.lastrowid, 'joy': joy,
+                                                                  'achievement': achievement, 'meaning': meaning,
+                                                                  'date': submitted_at})
 
             conn.commit()
             conn.close()
+            report_alerts(raised)
+            invalidate_feedback_cache(token_info['user_id'])
 
             # Mark token as used
             mark_token_used(token)
 
-            print(f"✅ Survey response stored for user {token_info['user_id']}: Joy={joy}, Achievement={achievement}, Meaning={meaning}")
+            logger.info("Survey response stored", extra={'user_id': token_info['user_id'], **SAMPLED})
 
             # Redirect to thank you page (feedback comes later via SMS)
             return redirect(url_for('survey_thanks', token=token,
@@ -850,8 +1760,8 @@ def survey(token):
                                  title="Invalid Data",
                                  message="Please provide valid ratings.",
                                  icon="fas fa-exclamation-triangle"), 400
-        except Exception as e:
-            print(f"❌ Error storing survey response: {e}")
+        except Exception:
+            logger.exception("Error storing survey response")
             return render_template('error.html',
                                  title="Submission Error",
                                  message="There was an error saving your response. Please try again.",
@@ -881,7 +1791,7 @@ def survey_thanks(token):
 @app.route('/debug/database')
 def debug_database():
     """Debug endpoint to check database schema"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     cursor = conn.cursor()
 
     try:
@@ -944,7 +1854,7 @@ def debug_token(token):
 @app.route('/debug/responses/<int:user_id>')
 def debug_responses(user_id):
     """Debug responses for a specific user"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     cursor = conn.cursor()
 
     try:
@@ -969,7 +1879,7 @@ def debug_responses(user_id):
 def test_survey_link():
     """Generate a test survey link for testing purposes"""
     # Get or create a test user
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     cursor = conn.cursor()
 
     # Check if test user exists
@@ -990,7 +1900,7 @@ def test_survey_link():
     token = create_survey_token(user_id, expires_hours=24)
     if token:
         base_url = os.getenv('BASE_URL', 'https://sms-survey-prototype-production.up.railway.app')
-        survey_url = f"{base_url}/survey/{token}"
+        survey_url = f"{base_url}{short_links.survey_path(token)}"
         return jsonify({
             'success': True,
             'survey_url': survey_url,
@@ -1004,6 +1914,17 @@ def test_survey_link():
             'error': 'Failed to create survey token'
         }), 500
 
+def preview_survey_token():
+    """A token shaped like the next one create_survey_token would issue, without storing it"""
+    if short_links.SURVEY_LINK_STYLE != 'short':
+        return generate_survey_token()
+    conn = connect_db()
+    try:
+        next_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM survey_tokens').fetchone()[0]
+    finally:
+        conn.close()
+    return short_links.make_short_code(next_id)
+
 @app.route('/test_weekly_sms')
 def test_weekly_sms():
     """Test the weekly SMS with report link for user with existing data"""
@@ -1012,49 +1933,28 @@ def test_weekly_sms():
     phone = "+16172900797"  # From the database
 
     # Get total responses and determine if this would be a weekly report day
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM responses WHERE user_id = ?', (user_id,))
-    total_responses = cursor.fetchone()[0]
+    conn = connect_db()
+    total_responses = archive.total_responses(conn, user_id)
     conn.close()
 
     # Weekly report is sent on days 8, 15, 22, etc. (right after each complete week)
     is_weekly_report_day = total_responses > 0 and (total_responses % 7 == 0)
 
-    # Create survey token
-    token = create_survey_token(user_id, expires_hours=24)
-    if not token:
-        return jsonify({'error': 'Failed to create token'}), 500
+    # Same length as a real token, but nothing is written
+    token = preview_survey_token()
 
     base_url = os.getenv('BASE_URL', 'https://sms-survey-prototype-production.up.railway.app')
-    survey_url = f"{base_url}/survey/{token}"
+    survey_url = f"{base_url}{short_links.survey_path(token)}"
     report_url = f"{base_url}/feedback/{user_id}"
 
     if is_weekly_report_day:
         message_type = f"Weekly Report SMS (Week {(total_responses // 7) + 1} complete)"
-        message = f"""Hi!
-
-🎉 Week {(total_responses // 7) + 1} complete! Time for today's check-in + your weekly insights!
-
-Today's survey: {survey_url}
-
-📊 View your week's wellbeing report: {report_url}
-
-See your progress and insights! 💙"""
+        rendered = sms_templates.SURVEY_WEEKLY.render(greeting="Hi!", week=(total_responses // 7) + 1,
+                                                      survey_url=survey_url, report_url=report_url)
     else:
         message_type = f"Regular Daily SMS (Response #{total_responses + 1})"
-        message = f"""Hi!
-
-Time for your daily wellbeing check-in! 🌟
-
-Please rate your day (1-10):
-• Joy & Happiness
-• Achievement & Progress
-• Meaning & Purpose
-
-Click here: {survey_url}
-
-Takes just 30 seconds. Thank you! 💙"""
+        rendered = sms_templates.SURVEY_DAILY.render(greeting="Hi!", survey_url=survey_url)
+    message = rendered['text']
 
     return jsonify({
         'user_id': user_id,
@@ -1066,7 +1966,9 @@ Takes just 30 seconds. Thank you! 💙"""
         'survey_url': survey_url,
         'report_url': report_url if is_weekly_report_day else None,
         'message_preview': message,
-        'note': 'This is a preview - no actual SMS was sent'
+        'encoding': rendered['encoding'],
+        'segments': rendered['segments'],
+        'note': 'This is a preview - no SMS was sent and no token was created'
     })
 
 @app.route('/test_weekly_sms/<int:simulated_responses>')
@@ -1081,41 +1983,22 @@ def test_weekly_sms_simulation(simulated_responses):
     # Weekly report is sent on days 8, 15, 22, etc. (right after each complete week)
     is_weekly_report_day = total_responses > 0 and (total_responses % 7 == 0)
 
-    # Create survey token
-    token = create_survey_token(user_id, expires_hours=24)
-    if not token:
-        return jsonify({'error': 'Failed to create token'}), 500
+    # Same length as a real token, but nothing is written
+    token = preview_survey_token()
 
     base_url = os.getenv('BASE_URL', 'https://sms-survey-prototype-production.up.railway.app')
-    survey_url = f"{base_url}/survey/{token}"
+    survey_url = f"{base_url}{short_links.survey_path(token)}"
     report_url = f"{base_url}/feedback/{user_id}"
 
     if is_weekly_report_day:
         week_number = total_responses // 7
         message_type = f"Weekly Report SMS (Week {week_number} complete)"
-        message = f"""Hi!
-
-🎉 Week {week_number} complete! Time for today's check-in + your weekly insights!
-
-Today's survey: {survey_url}
-
-📊 View your week's wellbeing report: {report_url}
-
-See your progress and insights! 💙"""
+        rendered = sms_templates.SURVEY_WEEKLY.render(greeting="Hi!", week=week_number,
+                                                      survey_url=survey_url, report_url=report_url)
     else:
         message_type = f"Regular Daily SMS (Response #{total_responses + 1})"
-        message = f"""Hi!
-
-Time for your daily wellbeing check-in! 🌟
-
-Please rate your day (1-10):
-• Joy & Happiness
-• Achievement & Progress
-• Meaning & Purpose
-
-Click here: {survey_url}
-
-Takes just 30 seconds. Thank you! 💙"""
+        rendered = sms_templates.SURVEY_DAILY.render(greeting="Hi!", survey_url=survey_url)
+    message = rendered['text']
 
     return jsonify({
         'simulated_responses': total_responses,
@@ -1126,6 +2009,8 @@ Takes just 30 seconds. Thank you! 💙"""
         'survey_url': survey_url,
         'report_url': report_url if is_weekly_report_day else None,
         'message_preview': message,
+        'encoding': rendered['encoding'],
+        'segments': rendered['segments'],
         'examples': {
             'day_7': 'Regular SMS (completing week 1)',
             'day_8': 'Weekly Report SMS (week 1 complete)',
@@ -1152,15 +2037,10 @@ def test_textbelt_webhook():
 
     for phone_format in formats_to_test:
         try:
-            payload = {
-                'phone': phone_format,
-                'message': f'Webhook test to {phone_format}',
-                'key': TEXTBELT_API_KEY + '_test',  # Use test mode
-                'replyWebhookUrl': webhook_url
-            }
-
-            response = requests.post(TEXTBELT_URL, payload)
-            result = response.json()
+            result = sms_provider.send(phone_format,
+                                       f'Webhook test to {phone_format}',
+                                       reply_webhook_url=webhook_url,
+                                       test_mode=True)  # Use test mode
 
             results.append({
                 'phone_format': phone_format,
@@ -1181,13 +2061,110 @@ def test_textbelt_webhook():
         'webhook_url': webhook_url,
         'recommendation': 'Use the format that shows success=true for real SMS sending'
     })
+
+
+# Rendered feedback pages, keyed by user_id. Each worker keeps its own copy,
+# tagged with the version of the user's responses it was rendered from.
+# Writes in this worker drop the entry. Within FEEDBACK_CACHE_VERIFY_SECONDS
+# of its last check, an entry is served without touching SQLite; after that
+# the version is read again (one range scan of idx_responses_user_date), so
+# a write in another worker shows up within that window.
+FEEDBACK_CACHE_TTL = int(os.getenv('FEEDBACK_CACHE_TTL', '300'))
+FEEDBACK_CACHE_SIZE = int(os.getenv('FEEDBACK_CACHE_SIZE', '1000'))
+FEEDBACK_CACHE_VERIFY_SECONDS = float(os.getenv('FEEDBACK_CACHE_VERIFY_SECONDS', '10'))
+feedback_cache = OrderedDict()
+# The LRU reorders on every hit, so threads in a gthread worker take turns
+feedback_cache_lock = threading.Lock()
+
+def invalidate_feedback_cache(user_id):
+    """Drop the cached feedback page for a user after their responses change"""
+    with feedback_cache_lock:
+        feedback_cache.pop(int(user_id), None)
+
+def feedback_version(conn, user_id):
+    """(count, max id) of a user's live responses, or None if the user is gone.
+
+    New responses, deleted users and archived or restored months all change it.
+    """
+    row = conn.execute('''SELECT COUNT(r.id), MAX(r.id) FROM users u
+                           LEFT JOIN responses r ON r.user_id = u.id
+                           WHERE u.id = ? GROUP BY u.id''', (user_id,)).fetchone()
+    return tuple(row) if row else None
+
+def get_cached_feedback(user_id):
+    """Return the cached feedback entry for a user, or None if missing/expired"""
+    with feedback_cache_lock:
+        entry = feedback_cache.get(user_id)
+        if entry is None:
+            return None
+        if time.time() - entry['cached_at'] > FEEDBACK_CACHE_TTL:
+            feedback_cache.pop(user_id, None)
+            return None
+        feedback_cache.move_to_end(user_id)
+        return entry
+
+def verify_cached_feedback(entry, user_id, version):
+    """Keep an entry whose version still matches the database; drop it otherwise"""
+    with feedback_cache_lock:
+        if entry['version'] == version:
+            entry['verified_at'] = time.time()
+            return entry
+        if feedback_cache.get(user_id) is entry:
+            del feedback_cache[user_id]
+        return None
+
+def cache_feedback(user_id, body, latest_date, version):
+    """Store a rendered feedback page along with its validators"""
+    last_modified = None
+    for fmt in ['%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S']:
+        try:
+            last_modified = datetime.strptime(latest_date, fmt).replace(tzinfo=pytz.UTC)
+            break
+        except (TypeError, ValueError):
+            continue
+
+    entry = {
+        'body': body,
+        'etag': hashlib.sha1(body.encode('utf-8')).hexdigest(),
+        'last_modified': last_modified,
+        'version': version,
+        'cached_at': time.time(),
+        'verified_at': time.time()
+    }
+    with feedback_cache_lock:
+        feedback_cache[user_id] = entry
+        feedback_cache.move_to_end(user_id)
+        while len(feedback_cache) > FEEDBACK_CACHE_SIZE:
+            feedback_cache.popitem(last=False)
+    return entry
+
+def feedback_response(entry):
+    """Build a conditional response (200 or 304) from a cached feedback entry"""
+    response = make_response(entry['body'])
+    response.set_etag(entry['etag'])
+    if entry['last_modified']:
+        response.last_modified = entry['last_modified']
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @app.route('/feedback/<int:user_id>')
 def feedback(user_id):
     """Show user feedback with cumulative scores and threshold analysis"""
-    conn = sqlite3.connect(DB_PATH)
+    # Serve repeat views from the rendered-page cache without touching the DB
+    cached = get_cached_feedback(user_id)
+    if cached and time.time() - cached['verified_at'] <= FEEDBACK_CACHE_VERIFY_SECONDS:
+        return feedback_response(cached)
+
+    conn = connect_db()
     cursor = conn.cursor()
 
     try:
+        # Past the verify window: still valid if the user's responses are unchanged
+        version = feedback_version(conn, user_id)
+        if cached and verify_cached_feedback(cached, user_id, version):
+            return feedback_response(cached)
+
         # Get user info
         cursor.execute('SELECT phone FROM users WHERE id = ?', (user_id,))
         user_result = cursor.fetchone()
@@ -1253,7 +2230,7 @@ def feedback(user_id):
         # Get latest response for context
         latest_response = responses[0]
 
-        return render_template('feedback.html',
+        body = render_template('feedback.html',
                              user_id=user_id,
                              phone=phone,
                              num_responses=num_responses,
@@ -1282,10 +2259,10 @@ def feedback(user_id):
                              latest_meaning=latest_response[2],
                              latest_date=latest_response[3])
 
+        return feedback_response(cache_feedback(user_id, body, latest_response[3], version))
+
     except Exception as e:
-        print(f"❌ Error generating feedback: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error generating feedback", extra={'user_id': user_id})
         return render_template('error.html',
                              title="Feedback Error",
                              message=f"Unable to generate your feedback. Error: {str(e)}",
@@ -1294,7 +2271,6 @@ def feedback(user_id):
         conn.close()
 
 if __name__ == '__main__':
-    import os
     port = int(os.environ.get('PORT', 5001))
     debug = os.environ.get('FLASK_ENV') != 'production'
-    app.run(debug=debug, host='0.0.0.0', port=port)
+    create_app().run(debug=debug, host='0.0.0.0', port=port)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Cold-storage archival of old survey responses.
+
+Responses older than ARCHIVE_RETENTION_DAYS move out of the live database
+into one gzip-compressed JSON-lines file per calendar month:
+
+    ARCHIVE_DIR/responses-2024-03.jsonl.gz
+
+Only whole months are archived, and only months whose daily rollups are
+already final (at or before the daily_rollups watermark). Archived days
+are then frozen in rollups.py: the rollups keep reporting them and are
+never recomputed from the now-empty responses. archived_response_counts
+keeps each user's archived total, so per-user counts (the weekly report
+cadence) do not restart.
+
+A month is archived in three steps. Its rows are read, merged with an
+existing partition, written to a temp file and renamed into place. The
+partition is then recorded with its checksum, and finally the rows are
+deleted in batches of DELETE_BATCH, each in its own short transaction
+with a pause after it (every delete also updates the search index; a
+whole month in one transaction held the write lock for 0.7s, and
+back-to-back batches starved writers). A crash between the steps
+leaves some rows in both places, and the next run merges them by id.
+
+read_responses() reads archived months back, together with the live
+rows, for exports. restore_month() puts a month back into the live
+database (re-indexing it for search). Restored months are pinned live
+and skipped by scheduled runs until archived again explicitly.
+
+Archive files are not rewritten when a user is deleted: exports and
+restores skip rows of users that no longer exist.
+
+    python archive.py run [--retention-days 365]   # archive old months now
+    python archive.py run --month 2024-03          # archive one month, even if pinned
+    python archive.py list
+    python archive.py restore 2024-03
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import rollups
+import search
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+ARCHIVE_RETENTION_DAYS = int(os.getenv('ARCHIVE_RETENTION_DAYS', '0'))  # 0 disables scheduled archival
+MIN_RETENTION_DAYS = 90  # Analytics streaks look back 62 days
+DELETE_BATCH = 2000
+BATCH_PAUSE = 0.05  # Seconds between delete batches, so waiting writers get the lock
+
+COLUMNS = ('id', 'user_id', 'joy', 'achievement', 'meaningfulness', 'influence', 'date')
+
+
+def init_archive(cursor):
+    """Create the partition catalog and per-user archived counts (called from init_db)"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS archive_partitions (
+        month TEXT PRIMARY KEY,
+        path TEXT NULL,
+        rows INTEGER NOT NULL DEFAULT 0,
+        bytes INTEGER NOT NULL DEFAULT 0,
+        sha256 TEXT NULL,
+        archived_at TIMESTAMP NULL,
+        restored_at TIMESTAMP NULL
+    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS archived_response_counts (
+        user_id INTEGER PRIMARY KEY,
+        responses INTEGER NOT NULL DEFAULT 0
+    )''')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    """'YYYY-MM' of the month after `month`"""
+    first = date.fromisoformat(month + '-01')
+    return month_start(first + timedelta(days=31)).isoformat()[:7]
+
+
+def partition_path(archive_dir, month):
+    return os.path.join(archive_dir, f'responses-{month}.jsonl.gz')
+
+
+def archive_cutoff(conn, retention_days, today=None):
+    """First day (YYYY-MM-DD) that stays live: the retention horizon, held back to final rollups"""
+    if retention_days < MIN_RETENTION_DAYS:
+        raise ValueError(f'Retention must be at least {MIN_RETENTION_DAYS} days')
+    cutoff = month_start((today or date.today()) - timedelta(days=retention_days))
+    watermark = rollups.get_watermark(conn)
+    if not watermark:
+        return None
+    # A month can only go once every one of its days is rolled up
+    return min(cutoff, month_start(date.fromisoformat(watermark) + timedelta(days=1))).isoformat()
+
+
+@contextmanager
+def _immediate(conn):
+    """Write transaction on an autocommit connection"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_partition(path):
+    """Rows of one partition file as dicts"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def _write_partition(path, rows):
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=9) as f:
+        for row in rows:
+            f.write(json.dumps(row, separators=(',', ':')) + '\n')
+    with open(tmp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def archive_month(conn, archive_dir, month):
+    """Move one month's responses into its partition; returns the rows moved (conn: autocommit)"""
+    start, end = month + '-01', next_month(month) + '-01'
+    live = [dict(zip(COLUMNS, row)) for row in conn.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM responses WHERE date >= ? AND date < ? ORDER BY date, id", (start, end))]
+    if not live:
+        return 0
+
+    os.makedirs(archive_dir, exist_ok=True)
+    path = partition_path(archive_dir, month)
+    merged = {row['id']: row for row in (read_partition(path) if os.path.exists(path) else [])}
+    merged.update((row['id'], row) for row in live)
+    rows = sorted(merged.values(), key=lambda row: (row['date'], row['id']))
+    _write_partition(path, rows)
+
+    with _immediate(conn):
+        conn.execute('''INSERT INTO archive_partitions (month, path, rows, bytes, sha256, archived_at, restored_at)
+                        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, NULL)
+                        ON CONFLICT(month) DO UPDATE SET path = excluded.path, rows = excluded.rows,
+                            bytes = excluded.bytes, sha256 = excluded.sha256,
+                            archived_at = excluded.archived_at, restored_at = NULL''',
+                     (month, path, len(rows), os.path.getsize(path), _sha256(path)))
+        last_day = (date.fromisoformat(end) - timedelta(days=1)).isoformat()
+        if last_day > (rollups.get_watermark(conn, rollups.ARCHIVE_WATERMARK) or ''):
+            rollups.set_watermark(conn, last_day, rollups.ARCHIVE_WATERMARK)
+
+    # Each row delete also updates the search index, so the month goes in short transactions
+    for i in range(0, len(live), DELETE_BATCH):
+        batch = live[i:i + DELETE_BATCH]
+        with _immediate(conn):
+            conn.executemany('''INSERT INTO archived_response_counts (user_id, responses) VALUES (?, ?)
+                                ON CONFLICT(user_id) DO UPDATE SET responses = responses + excluded.responses''',
+                             Counter(row['user_id'] for row in batch).items())
+            conn.executemany('DELETE FROM responses WHERE id = ?', ((row['id'],) for row in batch))
+        time.sleep(BATCH_PAUSE)
+    return len(live)
+
+
+def archive_responses(db_path, archive_dir=None, retention_days=None, today=None):
+    """Archive every unpinned month before the cutoff; returns {month: rows moved}"""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    conn = rollups.connect(db_path)
+    try:
+        cutoff = archive_cutoff(conn, retention_days or ARCHIVE_RETENTION_DAYS, today)
+        if not cutoff:
+            return {}
+        months = [row[0] for row in conn.execute('''
+            SELECT DISTINCT substr(date, 1, 7) FROM responses WHERE date < ?
+            EXCEPT SELECT month FROM archive_partitions WHERE restored_at IS NOT NULL
+            ORDER BY 1''', (cutoff,))]
+        return {month: archive_month(conn, archive_dir, month) for month in months}
+    finally:
+        conn.close()
+
+
+def restore_month(db_path, month):
+    """Put an archived month back into responses and pin it live; returns the rows restored"""
+    conn = rollups.connect(db_path)
+    try:
+        partition = conn.execute('SELECT path, sha256 FROM archive_partitions WHERE month = ? AND path IS NOT NULL',
+                                 (month,)).fetchone()
+        if not partition:
+            raise ValueError(f'Month {month} is not archived')
+        path, sha256 = partition
+        if _sha256(path) != sha256:
+            raise ValueError(f'{path} does not match its recorded checksum')
+        rows = read_partition(path)
+
+        with _immediate(conn):
+            users = {row[0] for row in conn.execute('SELECT id FROM users')}
+            rows = [row for row in rows if row['user_id'] in users]
+            restored = conn.executemany(f'''INSERT OR IGNORE INTO responses ({', '.join(COLUMNS)})
+                                            VALUES ({', '.join('?' * len(COLUMNS))})''',
+                                        ([row[column] for column in COLUMNS] for row in rows)).rowcount
+            conn.executemany('UPDATE archived_response_counts SET responses = MAX(responses - ?, 0) WHERE user_id = ?',
+                             ((n, user_id) for user_id, n in Counter(row['user_id'] for row in rows).items()))
+            conn.execute('''UPDATE archive_partitions SET path = NULL, rows = 0, bytes = 0, sha256 = NULL,
+                                                          restored_at = CURRENT_TIMESTAMP
+                            WHERE month = ?''', (month,))
+            search.forget_term_summaries(conn)
+        os.remove(path)
+        return restored
+    finally:
+        conn.close()
+
+
+def list_partitions(conn):
+    rows = conn.execute('''SELECT month, path, rows, bytes, archived_at, restored_at
+                           FROM archive_partitions ORDER BY month''').fetchall()
+    return [dict(zip(('month', 'path', 'rows', 'bytes', 'archived_at', 'restored_at'), row)) for row in rows]
+
+
+def read_responses(conn, start=None, end=None):
+    """Responses in a date range (inclusive), archived months first, then live rows, with phones.
+
+    Yields dicts with COLUMNS plus 'phone'. Rows of deleted users are skipped.
+    """
+    start = start or '0000-00-00'
+    end_exclusive = (date.fromisoformat(end) + timedelta(days=1)).isoformat() if end else '9999-99-99'
+    phones = dict(conn.execute('SELECT id, phone FROM users'))
+
+    for month, path in conn.execute('''SELECT month, path FROM archive_partitions
+                                       WHERE path IS NOT NULL AND month >= ? AND month <= ?
+                                       ORDER BY month''', (start[:7], end_exclusive[:7])).fetchall():
+        for row in read_partition(path):
+            if row['user_id'] in phones and start <= row['date'] < end_exclusive:
+                yield dict(row, phone=phones[row['user_id']])
+
+    for row in conn.execute(f'''SELECT {', '.join(COLUMNS)} FROM responses
+                                WHERE date >= ? AND date < ? ORDER BY date, id''', (start, end_exclusive)):
+        row = dict(zip(COLUMNS, row))
+        if row['user_id'] in phones:
+            yield dict(row, phone=phones[row['user_id']])
+
+
+def total_responses(conn, user_id=None):
+    """Responses ever received (live plus archived), for one user or everyone"""
+    if user_id is None:
+        return conn.execute('''SELECT (SELECT COUNT(*) FROM responses)
+                                    + (SELECT COALESCE(SUM(responses), 0) FROM archived_response_counts)''').fetchone()[0]
+    return conn.execute('''SELECT (SELECT COUNT(*) FROM responses WHERE user_id = ?)
+                                + COALESCE((SELECT responses FROM archived_response_counts WHERE user_id = ?), 0)''',
+                        (user_id, user_id)).fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'survey.db'))
+    parser.add_argument('--dir', default=ARCHIVE_DIR, help='Partition directory (ARCHIVE_DIR)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='Archive months older than the retention horizon')
+    run.add_argument('--retention-days', type=int, default=ARCHIVE_RETENTION_DAYS or 365)
+    run.add_argument('--month', help='Archive this month (YYYY-MM) only, even if it was restored')
+    commands.add_parser('list', help='List archived and restored months')
+    restore = commands.add_parser('restore', help='Move an archived month back into the live database')
+    restore.add_argument('month')
+    args = parser.parse_args()
+
+    if args.command == 'run' and args.month:
+        conn = rollups.connect(args.db)
+        try:
+            cutoff = archive_cutoff(conn, args.retention_days)
+            if not cutoff or next_month(args.month) + '-01' > cutoff:
+                parser.error(f'{args.month} is inside the retention horizon or not rolled up yet')
+            moved = {args.month: archive_month(conn, args.dir, args.month)}
+        finally:
+            conn.close()
+    elif args.command == 'run':
+        moved = archive_responses(args.db, args.dir, args.retention_days)
+    elif args.command == 'restore':
+        print(f"♻️  {restore_month(args.db, args.month)} responses restored from {args.month}")
+        return
+    else:
+        conn = sqlite3.connect(args.db)
+        try:
+            for partition in list_partitions(conn):
+                status = f"restored {partition['restored_at']}" if partition['restored_at'] else \
+                    f"{partition['rows']:>8} rows {partition['bytes'] / 1e6:7.2f} MB"
+                print(f"{partition['month']}  {status}")
+        finally:
+            conn.close()
+        return
+
+    for month, rows in moved.items():
+        print(f"📦 {month}: {rows} responses archived")
+    if not moved:
+        print("Nothing to archive")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Online backups of the survey database, and read-only snapshots for reports.
+
+make_backup() copies the live database with SQLite's online backup API in
+a single step, which is one read transaction. In WAL mode that never
+blocks writers: webhooks and survey submissions keep committing to the
+WAL while the copy runs, and the copy is the database exactly as of the
+moment it started. (The WAL cannot be checkpointed past that moment
+until the copy ends, so it grows a little during long backups.) The copy
+is written under a .tmp name, switched to a self-contained rollback
+journal and renamed into place, so a snapshot file is always complete.
+
+Snapshots are never modified once published, so reports open them with
+immutable=1: no locks, no -wal or -shm files, and no contention with the
+primary at all. With REPORT_SOURCE=snapshot the heavy reporting routes
+read from the newest snapshot that is at most REPORT_SNAPSHOT_MAX_AGE
+minutes old, and fall back to the primary otherwise.
+
+    python backups.py backup             # write a snapshot now
+    python backups.py list               # snapshots, newest first
+
+To restore, stop the app and copy a snapshot over survey.db (removing
+survey.db-wal and survey.db-shm).
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_INTERVAL_MINUTES = int(os.getenv('BACKUP_INTERVAL_MINUTES', '60'))  # 0 disables scheduled backups
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '24'))
+REPORT_SOURCE = os.getenv('REPORT_SOURCE', 'primary')  # 'primary' or 'snapshot'
+REPORT_SNAPSHOT_MAX_AGE = int(os.getenv('REPORT_SNAPSHOT_MAX_AGE', str(2 * (BACKUP_INTERVAL_MINUTES or 60))))
+
+PREFIX, SUFFIX = 'survey-', '.db'
+STAMP_FORMAT = '%Y%m%dT%H%M%S'
+STALE_TMP_SECONDS = 3600
+
+
+def snapshot_path(backup_dir, taken_at):
+    return os.path.join(backup_dir, f'{PREFIX}{taken_at.strftime(STAMP_FORMAT)}{SUFFIX}')
+
+
+def snapshot_time(path):
+    """When the snapshot's data was read, from its file name (None if not a snapshot)"""
+    name = os.path.basename(path)
+    if not (name.startswith(PREFIX) and name.endswith(SUFFIX)):
+        return None
+    try:
+        return datetime.strptime(name[len(PREFIX):-len(SUFFIX)], STAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def list_snapshots(backup_dir):
+    """[(taken_at, path)] of published snapshots, newest first"""
+    try:
+        entries = list(os.scandir(backup_dir))
+    except FileNotFoundError:
+        return []
+    snapshots = [(snapshot_time(entry.path), entry.path) for entry in entries]
+    return sorted((s for s in snapshots if s[0]), reverse=True)
+
+
+def latest_snapshot(backup_dir, max_age=None, now=None):
+    """(taken_at, path) of the newest snapshot, or None if there is none recent enough (max_age minutes)"""
+    snapshots = list_snapshots(backup_dir)
+    if not snapshots:
+        return None
+    taken_at, path = snapshots[0]
+    if max_age is not None and (now or datetime.now()) - taken_at > timedelta(minutes=max_age):
+        return None
+    return taken_at, path
+
+
+def connect_snapshot(path, **kwargs):
+    """Read-only connection to a published snapshot; takes no locks"""
+    return sqlite3.connect(f'file:{path}?mode=ro&immutable=1', uri=True, **kwargs)
+
+
+def make_backup(db_path, backup_dir, keep=BACKUP_KEEP, now=None, timeout=15):
+    """Copy the live database into a new snapshot and prune old ones; returns what was written"""
+    os.makedirs(backup_dir, exist_ok=True)
+    taken_at = (now or datetime.now()).replace(microsecond=0)
+    path = snapshot_path(backup_dir, taken_at)
+    tmp_path = path + '.tmp'
+
+    start = time.perf_counter()
+    source = sqlite3.connect(db_path, timeout=timeout, uri=True)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target)  # All pages in one step: one read transaction, writers unaffected in WAL mode
+        # The copy inherits WAL mode from the header; snapshots are single files opened immutable
+        target.execute('PRAGMA journal_mode=DELETE')
+        pages = target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, path)
+
+    removed = prune(backup_dir, keep)
+    return {'path': path, 'taken_at': taken_at.isoformat(), 'pages': pages, 'bytes': os.path.getsize(path),
+            'seconds': round(time.perf_counter() - start, 3), 'pruned': removed}
+
+
+def prune(backup_dir, keep):
+    """Delete all but the newest `keep` snapshots, and temp files left by interrupted backups"""
+    removed = 0
+    for _, path in list_snapshots(backup_dir)[keep:]:
+        os.remove(path)
+        removed += 1
+    for entry in os.scandir(backup_dir):
+        if entry.name.endswith('.tmp') and time.time() - entry.stat().st_mtime > STALE_TMP_SECONDS:
+            os.remove(entry.path)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default='survey.db', help='Database to back up')
+    parser.add_argument('--dir', default=BACKUP_DIR, help='Snapshot directory (BACKUP_DIR)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    backup = commands.add_parser('backup', help='Write a snapshot now')
+    backup.add_argument('--keep', type=int, default=BACKUP_KEEP, help='Snapshots to keep (BACKUP_KEEP)')
+    commands.add_parser('list', help='List snapshots, newest first')
+    args = parser.parse_args()
+
+    if args.command == 'backup':
+        result = make_backup(args.db, args.dir, keep=args.keep)
+        print(f"💾 {result['path']}: {result['bytes'] / 1e6:.1f} MB in {result['seconds']}s "
+              f"({result['pruned']} old snapshots removed)")
+    else:
+        for taken_at, path in list_snapshots(args.dir):
+            print(f"{taken_at.isoformat()}  {os.path.getsize(path) / 1e6:8.1f} MB  {path}")
+
+
+if __name__ == "__main__":
+    main()
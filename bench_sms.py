@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for send_daily_sms using the fake SMS provider.
+
+Builds a throwaway database with N users, then for each concurrency level
+queues the daily survey with send_daily_sms and drains the outbox against
+FakeSMSProvider. No network access is needed.
+
+    python bench_sms.py --users 100000 --workers 8,32,128
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from campaigns import DEFAULT_CAMPAIGN_ID
+from rate_limiter import SMSRateLimiter
+from sms_providers import FakeSMSProvider
+
+
+def build_database(db_path, num_users):
+    """Create the app schema with num_users synthetic users"""
+    app.DB_PATH = db_path
+    app.init_db()
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT INTO users (phone) VALUES (?)',
+                     ((f'+1555{i:07d}',) for i in range(num_users)))
+    conn.commit()
+    conn.close()
+
+
+def run_strategy(db_path, num_users, workers, latency_ms, failure_rate, seed, rate=0, burst=10):
+    """Run one send_daily_sms pass and return its timing summary"""
+    build_database(db_path, num_users)
+    provider = FakeSMSProvider(latency_ms=latency_ms, failure_rate=failure_rate, seed=seed)
+    app.sms_provider = provider
+    app.sms_limiter = SMSRateLimiter(db_path + '.limiter', rate=rate, burst=burst) if rate else None
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        queued_count, total_count = app.send_daily_sms(start_delivery=False, campaign_ids=[DEFAULT_CAMPAIGN_ID])
+        queued_at = time.perf_counter()
+        summary = app.process_outbox(max_workers=workers)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'workers': workers,
+        'users': total_count,
+        'queued': queued_count,
+        'sent': summary['sent'],
+        'failed': summary['retry'] + summary['dead'],
+        'enqueue_seconds': round(queued_at - start, 3),
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(total_count / elapsed, 1) if elapsed else None,
+        'provider_stats': dict(provider.stats)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--workers', default='8,32,128',
+                        help='Comma-separated concurrency levels to compare')
+    parser.add_argument('--min-latency', type=float, default=20, help='Fake provider latency (ms)')
+    parser.add_argument('--max-latency', type=float, default=80, help='Fake provider latency (ms)')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Shared limiter messages/second (0 = no limiter)')
+    parser.add_argument('--burst', type=float, default=10)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    print(f"🧪 Benchmarking send_daily_sms with {args.users} users")
+    print("=" * 60)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in [int(w) for w in args.workers.split(',')]:
+            db_path = os.path.join(tmp, f'bench_{workers}.db')
+            result = run_strategy(db_path, args.users, workers,
+                                  (args.min_latency, args.max_latency),
+                                  args.failure_rate, args.seed, args.rate, args.burst)
+            results.append(result)
+            print(f"workers={workers:<4} sent={result['sent']:<7} "
+                  f"time={result['seconds']:>8}s  rate={result['messages_per_second']} msg/s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'users': args.users, 'results': results}, f, indent=2)
+        print(f"\n📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
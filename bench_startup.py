@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: how long a fresh interpreter takes to import the app.
+
+Each stage runs in a new Python process, so nothing is cached between runs:
+
+    parsing      import parsing (what test_parsing.py needs)
+    import_app   import app (what tests and CLI tools pay)
+    create_app   import app + create_app(start_jobs=False) (a gunicorn worker)
+    first_request  ... plus one GET / (schema creation on a new database)
+
+    python bench_startup.py --runs 10 --budget-ms 300
+
+With --budget-ms the script exits non-zero if import_app is slower.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Each snippet prints its own wall time, excluding interpreter startup
+STAGES = {
+    'parsing': 'import parsing',
+    'import_app': 'import app',
+    'create_app': 'import app; app.create_app(start_jobs=False)',
+    'first_request': 'import app; app.create_app(start_jobs=False).test_client().get("/")',
+}
+
+TEMPLATE = '''
+import sys, time
+sys.path.insert(0, {here!r})
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+modules = len(sys.modules)
+print(elapsed, modules, 'apscheduler' in sys.modules, 'requests' in sys.modules)
+'''
+
+
+def run_stage(code, db_dir):
+    """Run one stage in a fresh interpreter; returns (seconds, modules, scheduler_loaded, requests_loaded)"""
+    env = dict(os.environ, LOG_LEVEL='WARNING', SMS_RATE_PER_SEC='0')
+    result = subprocess.run([sys.executable, '-c', TEMPLATE.format(here=HERE, code=code)],
+                            cwd=db_dir, env=env, capture_output=True, text=True, check=True)
+    seconds, modules, scheduler, requests = result.stdout.split()[-4:]
+    return float(seconds), int(modules), scheduler == 'True', requests == 'True'
+
+
+def bench_stage(code, runs):
+    timings = []
+    for _ in range(runs):
+        # A new directory per run: survey.db does not exist yet, as on a fresh deploy
+        with tempfile.TemporaryDirectory() as db_dir:
+            seconds, modules, scheduler, requests = run_stage(code, db_dir)
+        timings.append(seconds)
+    timings.sort()
+    return {
+        'runs': runs,
+        'min_ms': round(timings[0] * 1000, 1),
+        'p50_ms': round(statistics.median(timings) * 1000, 1),
+        'max_ms': round(timings[-1] * 1000, 1),
+        'modules': modules,
+        'apscheduler_loaded': scheduler,
+        'requests_loaded': requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--budget-ms', type=float, help='Fail if the median import_app time exceeds this')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    print(f"⏱️  Startup benchmark: {args.runs} fresh interpreters per stage")
+    print("=" * 60)
+    results = {}
+    for name in filter(None, args.stages.split(',')):
+        results[name] = bench_stage(STAGES[name], args.runs)
+        result = results[name]
+        print(f"{name:<14} p50={result['p50_ms']:>7}ms  min={result['min_ms']:>7}ms  "
+              f"modules={result['modules']:<5} scheduler={'yes' if result['apscheduler_loaded'] else 'no'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'stages': results}, f, indent=2)
+        print(f"\n📊 Results written to {args.output}")
+
+    if args.budget_ms and 'import_app' in results and results['import_app']['p50_ms'] > args.budget_ms:
+        print(f"\n❌ import app took {results['import_app']['p50_ms']}ms (budget {args.budget_ms}ms)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
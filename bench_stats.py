@@ -0,0 +1,29 @@
+"""
+Latency statistics shared by the benchmark, load-test and replay tools.
+
+Kept free of app imports so tools that only talk HTTP to a running app
+can summarize their runs without loading it.
+"""
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not samples:
+        return None
+    index = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples))) - 1))
+    return samples[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Count, throughput and p50/p95/p99/max latency in milliseconds"""
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'ops_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+    }
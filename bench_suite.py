@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark suite for the SMS survey app.
+
+Generates a synthetic cohort (see cohort.py), then measures throughput and
+p50/p95/p99 latency of the hot paths in-process through Flask's test
+client, with the fake SMS provider standing in for TextBelt. Results are
+written as JSON. Pass --baseline to compare against an earlier run and exit
+non-zero on regressions, e.g. in CI:
+
+    python bench_suite.py --users 2000 --days 30 --output bench.json
+    python bench_suite.py --users 2000 --days 30 --baseline bench.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from bench_stats import summarize
+from campaigns import DEFAULT_CAMPAIGN_ID
+from cohort import generate_cohort, parse_mix
+from sms_providers import FakeSMSProvider
+
+SCENARIOS = ('send_daily_sms', 'sms_webhook', 'survey_get', 'survey_post',
+             'feedback', 'feedback_cached', 'responses', 'admin')
+
+# Lower is better for latencies, higher for throughput
+COMPARED = {'p50_ms': -1, 'p99_ms': -1, 'ops_per_second': 1}
+
+
+def measure(calls, expected_status=(200,)):
+    """Run each zero-argument call, timing it and counting unexpected statuses"""
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for call in calls:
+        t0 = time.perf_counter()
+        response = call()
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code not in expected_status:
+            errors += 1
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def bench_send_daily_sms(cohort, workers):
+    """Queue and deliver one daily survey to every user through the fake provider"""
+    app.sms_provider = FakeSMSProvider(latency_ms=(0, 0), seed=cohort['seed'])
+    app.sms_limiter = None
+    start = time.perf_counter()
+    queued, total = app.send_daily_sms(start_delivery=False, campaign_ids=[DEFAULT_CAMPAIGN_ID])
+    delivered = app.process_outbox(max_workers=workers)
+    elapsed = time.perf_counter() - start
+    result = summarize([], elapsed)
+    result.update(count=total, errors=total - delivered['sent'],
+                  ops_per_second=round(total / elapsed, 1) if elapsed else None)
+    return result
+
+
+def run_suite(cohort, requests_per_scenario, workers=8, scenarios=SCENARIOS):
+    """Run the selected scenarios against a generated cohort"""
+    client = app.app.test_client()
+    n = requests_per_scenario
+    users = cohort['users']
+    phones, tokens, replies = cohort['phones'], cohort['tokens'], cohort['replies']
+    results = {}
+
+    def user_ids():
+        return [(i * 7919) % users + 1 for i in range(n)]  # Spread across the cohort
+
+    if 'survey_get' in scenarios:
+        results['survey_get'] = measure(
+            lambda token=tokens[i % len(tokens)]: client.get(f'/survey/{token}') for i in range(n))
+    if 'survey_post' in scenarios:
+        form = {'joy': '7', 'achievement': '6', 'meaning': '8', 'influence': 'benchmark'}
+        results['survey_post'] = measure(
+            (lambda token=token: client.post(f'/survey/{token}', data=form)
+             for token in tokens[:n]), expected_status=(302,))
+    if 'sms_webhook' in scenarios:
+        results['sms_webhook'] = measure(
+            lambda i=i: client.post('/sms_webhook', json={'fromNumber': phones[i % users],
+                                                          'text': replies[i % len(replies)]})
+            for i in range(n))
+    if 'feedback' in scenarios:
+        def uncached(user_id):
+            app.feedback_cache.clear()
+            return client.get(f'/feedback/{user_id}')
+        # Users with fewer than 3 responses get the 404 "More Data Needed" page
+        results['feedback'] = measure((lambda u=u: uncached(u) for u in user_ids()), expected_status=(200, 404))
+    if 'feedback_cached' in scenarios:
+        ids = user_ids()
+        app.feedback_cache.clear()
+        for user_id in ids[:min(len(ids), app.FEEDBACK_CACHE_SIZE)]:
+            client.get(f'/feedback/{user_id}')  # Warm up
+        results['feedback_cached'] = measure((lambda u=u: client.get(f'/feedback/{u}') for u in ids),
+                                             expected_status=(200, 404))
+    if 'responses' in scenarios:
+        results['responses'] = measure(lambda: client.get('/responses') for _ in range(max(1, n // 10)))
+    if 'admin' in scenarios:
+        results['admin'] = measure(lambda: client.get('/admin') for _ in range(max(1, n // 10)))
+    if 'send_daily_sms' in scenarios:
+        results['send_daily_sms'] = bench_send_daily_sms(cohort, workers)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'commit': commit or None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions beyond tolerance against a baseline run"""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for metric, direction in COMPARED.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * direction < -tolerance:
+                regressions.append({'scenario': name, 'metric': metric, 'baseline': old,
+                                    'current': new, 'change': round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--reply-rate', type=float, default=0.7)
+    parser.add_argument('--mix', default='clean=0.7,noisy=0.2,invalid=0.1')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per HTTP scenario')
+    parser.add_argument('--workers', type=int, default=8, help='Outbox send concurrency')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative slowdown before a metric counts as a regression')
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"🧪 Benchmark suite: {args.users} users x {args.days} days, {args.requests} requests per scenario")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cohort = generate_cohort(os.path.join(tmp, 'bench.db'), args.users, args.days,
+                                 args.reply_rate, parse_mix(args.mix), args.seed,
+                                 open_tokens=min(args.users, args.requests))
+        scenario_results = run_suite(cohort, args.requests, args.workers, scenarios)
+
+    for name, result in scenario_results.items():
+        latency = f"p50={result['p50_ms']}ms  p99={result['p99_ms']}ms" if result['p50_ms'] is not None else ''
+        print(f"{name:<16} {result['ops_per_second']!s:>9} ops/s  {latency:<32} errors={result['errors']}")
+
+    results = {
+        'params': {key: getattr(args, key) for key in ('users', 'days', 'reply_rate', 'mix',
+                                                       'seed', 'requests', 'workers')},
+        'cohort': {'responses': cohort['responses']},
+        'environment': environment(),
+        'scenarios': scenario_results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📊 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"❌ {r['scenario']} {r['metric']}: {r['baseline']} -> {r['current']} ({r['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
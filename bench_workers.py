@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Load-test matrix for the gunicorn worker profiles in gunicorn.conf.py.
+
+For each profile, starts gunicorn on a synthetic cohort (SMS_PROVIDER=fake
+with TextBelt-like latency, no scheduler) and drives it over HTTP with
+concurrent clients:
+
+    survey_get    GET /survey/<token>
+    sms_webhook   POST /sms_webhook (one SQLite write per request)
+    slow_send     GET /test_textbelt_webhook (four provider calls inline)
+
+    python bench_workers.py --profiles sync,gthread --workers 2 --clients 32 --output workers.json
+
+The gevent profile is skipped when gevent is not installed.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from bench_stats import summarize
+from bench_suite import environment
+from cohort import generate_cohort, parse_mix
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROFILES = ('sync', 'gthread', 'gevent')
+SCENARIOS = ('survey_get', 'sms_webhook', 'slow_send')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(profile, workers, threads, db_dir, latency_ms):
+    """Start gunicorn with a profile from gunicorn.conf.py; returns (process, base_url)"""
+    port = free_port()
+    env = dict(os.environ, GUNICORN_PROFILE=profile, WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads), PORT=str(port), SCHEDULER_ENABLED='0',
+               SMS_PROVIDER='fake', FAKE_SMS_MIN_LATENCY_MS=str(latency_ms),
+               FAKE_SMS_MAX_LATENCY_MS=str(latency_ms), SMS_RATE_PER_SEC='0',
+               LOG_LEVEL='WARNING', TEXTBELT_API_KEY='')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', os.path.join(HERE, 'gunicorn.conf.py'),
+                                '--pythonpath', HERE, 'app:create_app()'],
+                               cwd=db_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn ({profile}) exited: {process.stderr.read().decode()[-2000:]}")
+        try:
+            requests.get(base_url + '/', timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"gunicorn ({profile}) did not start within 30s")
+
+
+def load(calls, clients):
+    """Run (method, url, kwargs) calls from `clients` concurrent sessions"""
+    local = threading.local()
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def run(call):
+        nonlocal errors
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        method, url, kwargs = call
+        t0 = time.perf_counter()
+        try:
+            ok = session.request(method, url, timeout=60, **kwargs).status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - t0
+        with lock:
+            latencies.append(elapsed)
+            errors += not ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(run, calls))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def run_profile(profile, cohort, args):
+    process, base_url = start_server(profile, args.workers, args.threads,
+                                     os.path.dirname(cohort['db_path']), args.latency_ms)
+    try:
+        n, tokens, phones, replies = args.requests, cohort['tokens'], cohort['phones'], cohort['replies']
+        calls = {
+            'survey_get': [('GET', f'{base_url}/survey/{tokens[i % len(tokens)]}', {}) for i in range(n)],
+            'sms_webhook': [('POST', f'{base_url}/sms_webhook',
+                             {'json': {'fromNumber': phones[i % len(phones)], 'text': replies[i % len(replies)]}})
+                            for i in range(n)],
+            'slow_send': [('GET', f'{base_url}/test_textbelt_webhook', {}) for _ in range(max(1, n // 10))],
+        }
+        return {name: load(calls[name], args.clients) for name in args.scenarios}
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--workers', type=int, default=2, help='Processes per profile (WEB_CONCURRENCY)')
+    parser.add_argument('--threads', type=int, default=8, help='Threads per worker for gthread')
+    parser.add_argument('--clients', type=int, default=32, help='Concurrent HTTP clients')
+    parser.add_argument('--requests', type=int, default=400, help='Requests per scenario')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=150, help='Fake provider latency per send')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(',') if s]
+
+    profiles = []
+    for profile in filter(None, args.profiles.split(',')):
+        if profile == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print("⚠️  Skipping gevent: not installed (pip install gevent)")
+            continue
+        profiles.append(profile)
+
+    print(f"🧪 Worker matrix: {args.workers} workers, {args.clients} clients, "
+          f"{args.requests} requests per scenario, {args.latency_ms:g}ms provider latency")
+    print("=" * 72)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        cohort = generate_cohort(os.path.join(tmp, 'survey.db'), args.users, 14, 0.7,
+                                 parse_mix('clean=0.8,noisy=0.2'), open_tokens=args.users)
+        for profile in profiles:
+            results[profile] = run_profile(profile, cohort, args)
+            for name, result in results[profile].items():
+                print(f"{profile:<8} {name:<12} {result['ops_per_second']!s:>8} req/s  "
+                      f"p50={result['p50_ms']}ms  p99={result['p99_ms']}ms  errors={result['errors']}")
+
+    if args.output:
+        params = {key: getattr(args, key) for key in ('workers', 'threads', 'clients', 'requests',
+                                                      'users', 'latency_ms')}
+        with open(args.output, 'w') as f:
+            json.dump({'params': params, 'environment': environment(), 'profiles': results}, f, indent=2)
+        print(f"\n📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
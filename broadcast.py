@@ -0,0 +1,152 @@
+"""
+Segment broadcasts: message every user matching a filter in one request.
+
+A segment is resolved to recipients with a single query, the whole batch is
+written to the outbox in one transaction tagged with a broadcast id, and the
+outbox workers dispatch it concurrently. Progress and per-recipient results
+are read back from the outbox rows of that broadcast.
+"""
+
+import json
+
+from outbox import connect, enqueue_many, PENDING, SENDING, SENT, DEAD
+
+SEGMENT_TYPES = ('all', 'low_average', 'inactive')
+
+
+def init_broadcasts(cursor):
+    """Create the broadcast table (called from init_db)"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS sms_broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        segment TEXT NOT NULL,
+        message TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+
+def validate_segment(segment):
+    """Normalize a segment filter, raising ValueError when it is malformed"""
+    if not isinstance(segment, dict) or segment.get('type') not in SEGMENT_TYPES:
+        raise ValueError(f"Segment type must be one of: {', '.join(SEGMENT_TYPES)}")
+
+    segment_type = segment['type']
+    if segment_type == 'low_average':
+        threshold = float(segment.get('threshold', 7.0))
+        window = int(segment.get('window', 7))
+        if not 1 <= threshold <= 10 or window < 1:
+            raise ValueError('threshold must be between 1 and 10 and window at least 1')
+        return {'type': segment_type, 'threshold': threshold, 'window': window}
+    if segment_type == 'inactive':
+        days = int(segment.get('days', 3))
+        if days < 1:
+            raise ValueError('days must be at least 1')
+        return {'type': segment_type, 'days': days}
+    return {'type': segment_type}
+
+
+def resolve_segment(conn, segment):
+    """Return [(user_id, phone)] for a validated segment using one query"""
+    segment_type = segment['type']
+
+    if segment_type == 'low_average':
+        # Rolling average of each user's last `window` responses across all
+        # three dimensions; walks idx_responses_user_date per user
+        return conn.execute('''
+            SELECT u.id, u.phone
+            FROM users u
+            JOIN (
+                SELECT user_id, joy, achievement, meaningfulness,
+                       ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date DESC) AS rn
+                FROM responses
+            ) r ON r.user_id = u.id AND r.rn <= ?
+            GROUP BY u.id, u.phone
+            HAVING AVG((r.joy + r.achievement + r.meaningfulness) / 3.0) < ?
+            ORDER BY u.id
+        ''', (segment['window'], segment['threshold'])).fetchall()
+
+    if segment_type == 'inactive':
+        # Users whose latest response is older than N days (or who never replied)
+        return conn.execute('''
+            SELECT u.id, u.phone
+            FROM users u
+            LEFT JOIN (
+                SELECT user_id, MAX(date) AS last_date FROM responses GROUP BY user_id
+            ) r ON r.user_id = u.id
+            WHERE r.last_date IS NULL OR r.last_date < datetime('now', ?)
+            ORDER BY u.id
+        ''', (f"-{segment['days']} days",)).fetchall()
+
+    return conn.execute('SELECT id, phone FROM users ORDER BY id').fetchall()
+
+
+def create_broadcast(db_path, segment, kind, message, build_message=None, max_attempts=5):
+    """Resolve a segment and queue one message per recipient.
+
+    message is recorded on the broadcast and sent as-is, unless
+    build_message(user_id, phone) is given to personalize each text.
+    Returns (broadcast_id, recipient_count).
+    """
+    build_message = build_message or (lambda user_id, phone: message)
+    conn = connect(db_path)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        recipients = resolve_segment(conn, segment)
+        cursor = conn.execute('''INSERT INTO sms_broadcasts (kind, segment, message, total)
+                                 VALUES (?, ?, ?, ?)''',
+                              (kind, json.dumps(segment), message, len(recipients)))
+        broadcast_id = cursor.lastrowid
+        enqueue_many(db_path, [{
+            'kind': kind,
+            'user_id': user_id,
+            'phone': phone,
+            'message': build_message(user_id, phone),
+        } for user_id, phone in recipients], max_attempts=max_attempts,
+            broadcast_id=broadcast_id, conn=conn)
+        conn.execute('COMMIT')
+        return broadcast_id, len(recipients)
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+
+def broadcast_status(db_path, broadcast_id, include_recipients=True):
+    """Progress counts and per-recipient results for a broadcast, or None"""
+    conn = connect(db_path)
+    try:
+        broadcast = conn.execute('''SELECT id, kind, segment, message, total, created_at
+                                    FROM sms_broadcasts WHERE id = ?''', (broadcast_id,)).fetchone()
+        if not broadcast:
+            return None
+
+        counts = dict(conn.execute('''SELECT status, COUNT(*) FROM sms_outbox
+                                      WHERE broadcast_id = ? GROUP BY status''',
+                                   (broadcast_id,)).fetchall())
+        recipients = []
+        if include_recipients:
+            recipients = [dict(zip(('outbox_id', 'user_id', 'phone', 'status', 'attempts',
+                                    'text_id', 'last_error'), row))
+                          for row in conn.execute('''SELECT id, user_id, phone, status, attempts,
+                                                            text_id, last_error
+                                                     FROM sms_outbox WHERE broadcast_id = ?
+                                                     ORDER BY id''', (broadcast_id,))]
+    finally:
+        conn.close()
+
+    total = broadcast[4]
+    finished = counts.get(SENT, 0) + counts.get(DEAD, 0)
+    return {
+        'broadcast_id': broadcast[0],
+        'kind': broadcast[1],
+        'segment': json.loads(broadcast[2]),
+        'message': broadcast[3],
+        'created_at': broadcast[5],
+        'total': total,
+        'counts': {status: counts.get(status, 0) for status in (PENDING, SENDING, SENT, DEAD)},
+        'progress': round(finished / total, 3) if total else 1.0,
+        'complete': finished == total,
+        'recipients': recipients
+    }
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Campaign simulator for capacity planning.
+
+Runs a full survey campaign of N virtual days for M synthetic users
+against a shared in-memory copy of the schema, with the fake SMS provider
+standing in for TextBelt. The real code paths do the work: the daily send
+job, the outbox drain, survey page views and submissions, SMS webhooks,
+feedback page views and the token expiry sweep. Only the clock is virtual.
+app.datetime is swapped for one that reads the simulated time, so token
+expiry follows the campaign calendar.
+
+Users reply with a per-user propensity around --reply-rate, after a
+log-normal delay (median --reply-median-minutes). A share of them use the
+survey link and the rest reply by SMS. Link users who open the page
+sometimes leave without submitting. Outbound SMS leave at --send-rate per
+second, the rate the shared limiter would allow.
+
+The report covers:
+  - peak send rate and daily drain time;
+  - per-route request counts, peak per second and minute, and service time;
+  - peak worker-seconds of request handling needed per second;
+  - database, survey_tokens and responses growth per day.
+
+    python campaign_sim.py --users 2000 --days 14
+    python campaign_sim.py --users 20000 --days 28 --send-rate 10 --output sim.json
+
+Timestamps the database fills in itself (CURRENT_TIMESTAMP defaults and
+datetime('now') in the webhook insert) stay on the wall clock.
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import math
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import short_links
+import sms_templates
+from bench_stats import percentile
+from cohort import DEFAULT_MIX, parse_mix, reply_text
+from sms_providers import FakeSMSProvider
+
+# First daily send: a Monday at 11:00 UTC, when the scheduler job runs
+SIM_START = datetime(2025, 1, 6, 11, 0)
+
+SURVEY_LINK = re.compile(r'/(?:survey|s)/([A-Za-z0-9_-]+)')
+FEEDBACK_LINK = re.compile(r'/feedback/(\d+)')
+
+
+class VirtualClock:
+    """Simulated wall clock, exposed to the app as a datetime subclass"""
+
+    def __init__(self, start):
+        self.now = start
+
+    def datetime_class(self):
+        clock = self
+
+        class VirtualDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                if tz is None:
+                    return clock.now
+                return clock.now.replace(tzinfo=timezone.utc).astimezone(tz)
+
+        return VirtualDatetime
+
+
+class RouteLoad:
+    """Requests per route, bucketed by virtual second and minute, with real service times"""
+
+    def __init__(self):
+        self.service = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.per_second = defaultdict(Counter)
+        self.per_minute = defaultdict(Counter)
+        self.busy_per_second = Counter()  # virtual second -> seconds of handling
+
+    def record(self, route, when, seconds, status):
+        second = int(when.timestamp())
+        self.service[route].append(seconds)
+        self.statuses[route][status] += 1
+        self.per_second[route][second] += 1
+        self.per_minute[route][second // 60] += 1
+        self.busy_per_second[second] += seconds
+
+    def summary(self):
+        routes = {}
+        for route, samples in sorted(self.service.items()):
+            samples = sorted(samples)
+            routes[route] = {
+                'requests': len(samples),
+                'statuses': dict(self.statuses[route]),
+                'peak_per_second': max(self.per_second[route].values()),
+                'peak_per_minute': max(self.per_minute[route].values()),
+                'p50_ms': round(percentile(samples, 50) * 1000, 3),
+                'p95_ms': round(percentile(samples, 95) * 1000, 3),
+            }
+        return routes
+
+
+def database_stats(conn):
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    stats = {'db_bytes': page_count * page_size}
+    for table in ('survey_tokens', 'responses', 'sms_outbox'):
+        stats[table] = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    return stats
+
+
+def simulate(users=1000, days=7, reply_rate=0.6, link_share=0.6, abandon_rate=0.1,
+             feedback_rate=0.3, reply_median_minutes=45, send_rate=5.0, failure_rate=0.0,
+             mix=None, seed=42):
+    """Run the campaign and return the capacity report"""
+    rng = random.Random(seed)
+    kinds, weights = zip(*(mix or DEFAULT_MIX).items())
+    db_uri = f'file:campaign_sim_{uuid.uuid4().hex}?mode=memory&cache=shared'
+    clock = VirtualClock(SIM_START)
+    provider = FakeSMSProvider(latency_ms=(0, 0), failure_rate=failure_rate, seed=seed, keep_messages=users)
+    saved = {name: getattr(app, name) for name in ('DB_PATH', 'datetime', 'sms_provider', 'sms_limiter',
+                                                     'OUTBOX_RETRY_DELAY')}
+
+    # The in-memory database lives as long as one connection to it is open
+    anchor = sqlite3.connect(db_uri, uri=True)
+    try:
+        app.DB_PATH = db_uri
+        app.datetime = clock.datetime_class()
+        app.sms_provider = provider
+        app.sms_limiter = None  # Pacing is modelled by --send-rate on the virtual clock
+        app.OUTBOX_RETRY_DELAY = 0
+        app.init_db()
+        anchor.executemany('INSERT INTO users (phone, phone_e164) VALUES (?, ?)',
+                           ((phone, phone) for phone in (f'+1555{i:07d}' for i in range(users))))
+        anchor.commit()
+        app.phone_directory.invalidate()
+
+        client = app.app.test_client()
+        propensity = [min(max(rng.gauss(reply_rate, 0.2), 0.0), 1.0) for _ in range(users)]
+        load = RouteLoad()
+        sends_per_minute = Counter()
+        daily, jobs = [], []
+        events, seq = [], 0
+
+        def schedule(when, kind, *args):
+            nonlocal seq
+            seq += 1
+            heapq.heappush(events, (when, seq, kind, args))
+
+        def request(route, call):
+            start = time.perf_counter()
+            response = call()
+            load.record(route, clock.now, time.perf_counter() - start, response.status_code)
+
+        def daily_send(day):
+            provider.sent.clear()
+            start = time.perf_counter()
+            queued, _ = app.send_daily_sms(start_delivery=False)
+            summary = app.process_outbox()
+            jobs.append(time.perf_counter() - start)
+
+            for i, message in enumerate(provider.sent):
+                sent_at = clock.now + timedelta(seconds=i / send_rate)
+                sends_per_minute[int(sent_at.timestamp()) // 60] += 1
+                user = int(message['phone'][-7:])
+                feedback = FEEDBACK_LINK.search(message['message'])
+                if feedback and rng.random() < feedback_rate:
+                    delay = timedelta(minutes=rng.lognormvariate(math.log(reply_median_minutes), 1.0))
+                    schedule(sent_at + delay, 'feedback', int(feedback.group(1)))
+                if rng.random() >= propensity[user]:
+                    continue
+                replied_at = sent_at + timedelta(minutes=rng.lognormvariate(math.log(reply_median_minutes), 1.0))
+                if rng.random() < link_share:
+                    token = SURVEY_LINK.search(message['message']).group(1)
+                    schedule(replied_at, 'survey_get', token)
+                    if rng.random() >= abandon_rate:
+                        schedule(replied_at + timedelta(seconds=rng.uniform(20, 90)), 'survey_post', token)
+                else:
+                    text, _ = reply_text(rng, rng.choices(kinds, weights)[0])
+                    schedule(replied_at, 'sms_webhook', message['phone'], message['textId'], text)
+
+            daily.append({'day': day + 1, 'queued': queued, 'sent': summary['sent'], 'dead': summary['dead'],
+                          'drain_minutes': round(len(provider.sent) / send_rate / 60, 1)})
+
+        form = {'joy': '7', 'achievement': '6', 'meaning': '8', 'influence': 'simulated'}
+        handlers = {
+            'survey_get': lambda token: request('survey_get', lambda: client.get(short_links.survey_path(token))),
+            'survey_post': lambda token: request('survey_post', lambda: client.post(
+                short_links.survey_path(token), data=form)),
+            'sms_webhook': lambda phone, text_id, text: request('sms_webhook', lambda: client.post(
+                '/sms_webhook', json={'fromNumber': phone, 'textId': text_id, 'text': text})),
+            'feedback': lambda user_id: request('feedback', lambda: client.get(f'/feedback/{user_id}')),
+            'expire': app.expire_survey_tokens,
+        }
+
+        for day in range(days):
+            schedule(SIM_START + timedelta(days=day), 'daily_send', day)
+        end = SIM_START + timedelta(days=days)
+        when = SIM_START
+        while when < end + timedelta(days=1):
+            when += timedelta(minutes=app.TOKEN_EXPIRY_SWEEP_MINUTES)
+            schedule(when, 'expire')
+
+        while events:
+            when, _, kind, args = heapq.heappop(events)
+            # Each daily send closes the previous day's growth figures
+            if kind == 'daily_send' and daily:
+                daily[-1].update(database_stats(anchor))
+            clock.now = when
+            if kind == 'daily_send':
+                daily_send(*args)
+            else:
+                handlers[kind](*args)
+        daily[-1].update(database_stats(anchor))
+
+        total_sent = sum(day['sent'] for day in daily)
+        first, last = daily[0], daily[-1]
+        return {
+            'params': {'users': users, 'days': days, 'reply_rate': reply_rate, 'link_share': link_share,
+                       'abandon_rate': abandon_rate, 'feedback_rate': feedback_rate,
+                       'reply_median_minutes': reply_median_minutes, 'send_rate': send_rate,
+                       'failure_rate': failure_rate, 'seed': seed,
+                       'link_style': short_links.SURVEY_LINK_STYLE,
+                       'template_style': sms_templates.SMS_TEMPLATE_STYLE},
+            'sends': {
+                'total': total_sent,
+                'peak_per_minute': max(sends_per_minute.values(), default=0),
+                'peak_per_second': round(max(sends_per_minute.values(), default=0) / 60, 2),
+                'max_drain_minutes': max(day['drain_minutes'] for day in daily),
+                'max_job_seconds': round(max(jobs), 3),
+            },
+            'routes': load.summary(),
+            'peak_worker_seconds_per_second': round(max(load.busy_per_second.values(), default=0), 4),
+            'growth': {
+                'db_bytes': last['db_bytes'],
+                'db_bytes_per_user_day': round(last['db_bytes'] / (users * days)),
+                'survey_tokens_per_day': round((last['survey_tokens'] - first['survey_tokens']) / max(days - 1, 1)),
+                'survey_tokens_total': last['survey_tokens'],
+                'responses_total': last['responses'],
+            },
+            'days': daily,
+        }
+    finally:
+        for name, value in saved.items():
+            setattr(app, name, value)
+        anchor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--reply-rate', type=float, default=0.6, help='Mean share of surveys answered')
+    parser.add_argument('--link-share', type=float, default=0.6, help='Share of answers given through the link')
+    parser.add_argument('--abandon-rate', type=float, default=0.1, help='Share of opened links not submitted')
+    parser.add_argument('--feedback-rate', type=float, default=0.3, help='Share of weekly report links opened')
+    parser.add_argument('--reply-median-minutes', type=float, default=45)
+    parser.add_argument('--send-rate', type=float, default=float(os.getenv('SMS_RATE_PER_SEC', '5')),
+                        help='Outbound SMS per second (SMS_RATE_PER_SEC)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Provider failure probability')
+    parser.add_argument('--mix', default='clean=0.7,noisy=0.2,invalid=0.1', help='SMS reply kinds')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+    if args.send_rate <= 0:
+        parser.error('--send-rate must be positive')
+
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"🧪 Campaign simulation: {args.users} users x {args.days} days at {args.send_rate} SMS/s")
+    print("=" * 60)
+    start = time.perf_counter()
+    report = simulate(args.users, args.days, args.reply_rate, args.link_share, args.abandon_rate,
+                      args.feedback_rate, args.reply_median_minutes, args.send_rate, args.failure_rate,
+                      parse_mix(args.mix), args.seed)
+
+    sends = report['sends']
+    print(f"📤 {sends['total']} SMS, peak {sends['peak_per_second']}/s, "
+          f"longest daily drain {sends['max_drain_minutes']} min")
+    for route, stats in report['routes'].items():
+        print(f"{route:<12} {stats['requests']:>8} req  peak {stats['peak_per_second']:>3}/s "
+              f"{stats['peak_per_minute']:>5}/min  p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms")
+    print(f"⚙️  Peak request handling: {report['peak_worker_seconds_per_second']} worker-seconds per second")
+    growth = report['growth']
+    print(f"💾 {growth['db_bytes'] / 1e6:.1f} MB after {args.days} days "
+          f"({growth['db_bytes_per_user_day']} bytes per user-day), "
+          f"{growth['survey_tokens_per_day']} tokens/day, {growth['responses_total']} responses")
+    print(f"\nSimulated in {time.perf_counter() - start:.1f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📊 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Survey campaigns: who gets the daily survey, on which days and at what hour.
+
+Each row of `campaign` has a date window (start_date/end_date, inclusive,
+NULL = open), a send hour and the weekdays it runs on ('0123456', Monday
+= 0). Users join a campaign through campaign_enrollments. Campaign 1 is
+the default campaign: it covers every user who is not enrolled anywhere
+else, so a deployment without explicit cohorts keeps texting everyone.
+Its window is the one set on the admin page.
+
+The scheduler ticks every hour. claim_due() leases each campaign that is
+due today, at or past its send hour and not yet run today, in one UPDATE,
+so only one worker sends it. recipients() then resolves every claimed
+campaign to a single de-duplicated recipient list with one indexed query.
+Each queued survey is recorded in daily_surveys in the same transaction as
+its outbox row, and complete_run() marks the campaigns as run today once
+the whole list is queued. A worker that dies partway through leaves its
+lease to expire; the next tick claims the campaign again and only queues
+the users who are not in daily_surveys yet. A user gets at most one
+scheduled survey a day. Nothing is sent outside a campaign's window.
+"""
+
+from datetime import datetime, timedelta
+
+DEFAULT_CAMPAIGN_ID = 1
+DEFAULT_SEND_HOUR = 11  # 7am ET == 11am UTC
+ALL_WEEKDAYS = '0123456'
+MAX_CAMPAIGN_DAYS = 365
+CLAIM_LEASE_MINUTES = 30  # A claimed run not completed by then is claimed again on a later tick
+CLAIM_RENEW_EVERY = 200  # Users queued between lease renewals
+DAILY_SURVEYS_KEEP_DAYS = 7
+
+
+def init_campaigns(cursor):
+    """Extend the campaign table, create enrollments and the default campaign (called from init_db)"""
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(campaign)').fetchall()]
+    for column, definition in (('name', 'TEXT NULL'),
+                               ('send_hour', f'INTEGER NOT NULL DEFAULT {DEFAULT_SEND_HOUR}'),
+                               ('weekdays', f"TEXT NOT NULL DEFAULT '{ALL_WEEKDAYS}'"),
+                               ('last_run_on', 'TEXT NULL'),
+                               ('claimed_until', 'TEXT NULL')):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE campaign ADD COLUMN {column} {definition}')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS campaign_enrollments (
+        campaign_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        enrolled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (campaign_id, user_id)
+    ) WITHOUT ROWID''')
+    # "Enrolled anywhere?" for the default campaign, and user deletion
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_campaign_enrollments_user ON campaign_enrollments (user_id)')
+    # Scheduled surveys already queued, so a re-claimed run resumes instead of starting over
+    cursor.execute('''CREATE TABLE IF NOT EXISTS daily_surveys (
+        day TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (day, user_id)
+    ) WITHOUT ROWID''')
+
+    cursor.execute('INSERT OR IGNORE INTO campaign (id, name) VALUES (?, ?)', (DEFAULT_CAMPAIGN_ID, 'Default'))
+    cursor.execute('UPDATE campaign SET name = ? WHERE id = ? AND name IS NULL', ('Default', DEFAULT_CAMPAIGN_ID))
+
+
+def validate_campaign(data, today=None):
+    """Normalize campaign fields from a request, raising ValueError when they are malformed"""
+    today = today or datetime.now().date()
+    name = (data.get('name') or '').strip()
+    if not name:
+        raise ValueError('Missing name')
+    try:
+        start = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+        end = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('start_date and end_date must be YYYY-MM-DD')
+    if end < start:
+        raise ValueError('end_date cannot be before start_date')
+    if end < today:
+        raise ValueError('end_date cannot be in the past')
+    if (end - start).days > MAX_CAMPAIGN_DAYS:
+        raise ValueError('Campaign duration cannot exceed 1 year')
+
+    send_hour = int(data.get('send_hour', DEFAULT_SEND_HOUR))
+    if not 0 <= send_hour <= 23:
+        raise ValueError('send_hour must be between 0 and 23')
+    weekdays = ''.join(sorted(set(str(data.get('weekdays', ALL_WEEKDAYS)))))
+    if not weekdays or not set(weekdays) <= set(ALL_WEEKDAYS):
+        raise ValueError('weekdays must be digits 0-6 (Monday = 0)')
+    return {'name': name, 'start_date': start.isoformat(), 'end_date': end.isoformat(),
+            'send_hour': send_hour, 'weekdays': weekdays}
+
+
+def create_campaign(conn, campaign):
+    """Insert a validated campaign and return its id (caller commits)"""
+    return conn.execute('''INSERT INTO campaign (name, start_date, end_date, send_hour, weekdays)
+                           VALUES (:name, :start_date, :end_date, :send_hour, :weekdays)''', campaign).lastrowid
+
+
+def set_window(conn, campaign_id, start_date, end_date):
+    conn.execute('UPDATE campaign SET start_date = ?, end_date = ? WHERE id = ?', (start_date, end_date, campaign_id))
+
+
+def enroll(conn, campaign_id, user_ids):
+    """Enroll existing users; returns how many were newly enrolled (caller commits)"""
+    cursor = conn.executemany('''INSERT OR IGNORE INTO campaign_enrollments (campaign_id, user_id)
+                                 SELECT ?, id FROM users WHERE id = ?''',
+                              ((campaign_id, user_id) for user_id in user_ids))
+    return cursor.rowcount
+
+
+def unenroll(conn, campaign_id, user_ids):
+    cursor = conn.executemany('DELETE FROM campaign_enrollments WHERE campaign_id = ? AND user_id = ?',
+                              ((campaign_id, user_id) for user_id in user_ids))
+    return cursor.rowcount
+
+
+_WINDOW = '''(start_date IS NULL OR start_date <= :today)
+             AND (end_date IS NULL OR end_date >= :today)
+             AND instr(weekdays, :weekday) > 0'''
+
+
+def active_campaigns(conn, now, campaign_ids=None):
+    """Ids of campaigns whose window and weekdays include now's date"""
+    params = {'today': now.date().isoformat(), 'weekday': str(now.weekday())}
+    ids = [row[0] for row in conn.execute(f'SELECT id FROM campaign WHERE {_WINDOW} ORDER BY id', params)]
+    return ids if campaign_ids is None else [i for i in ids if i in set(campaign_ids)]
+
+
+def _timestamp(dt):
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def claim_due(conn, now):
+    """Lease campaigns due at `now` and not yet run today; returns their ids (commits)"""
+    params = {'today': now.date().isoformat(), 'weekday': str(now.weekday()), 'hour': now.hour,
+              'now': _timestamp(now), 'lease_end': _timestamp(now + timedelta(minutes=CLAIM_LEASE_MINUTES))}
+    rows = conn.execute(f'''UPDATE campaign SET claimed_until = :lease_end
+                            WHERE {_WINDOW} AND send_hour <= :hour
+                              AND (last_run_on IS NULL OR last_run_on < :today)
+                              AND (claimed_until IS NULL OR claimed_until <= :now)
+                            RETURNING id''', params).fetchall()
+    conn.commit()
+    return sorted(row[0] for row in rows)
+
+
+def renew_claim(conn, campaign_ids, now):
+    """Extend the lease on campaigns whose run is still queuing (commits)"""
+    lease_end = _timestamp(now + timedelta(minutes=CLAIM_LEASE_MINUTES))
+    conn.executemany('UPDATE campaign SET claimed_until = ? WHERE id = ? AND claimed_until IS NOT NULL',
+                     ((lease_end, campaign_id) for campaign_id in campaign_ids))
+    conn.commit()
+
+
+def complete_run(conn, campaign_ids, now):
+    """Mark claimed campaigns as run today and forget old daily_surveys rows (commits)"""
+    today = now.date().isoformat()
+    conn.executemany('UPDATE campaign SET last_run_on = ?, claimed_until = NULL WHERE id = ?',
+                     ((today, campaign_id) for campaign_id in campaign_ids))
+    conn.execute('DELETE FROM daily_surveys WHERE day < ?',
+                 ((now.date() - timedelta(days=DAILY_SURVEYS_KEEP_DAYS)).isoformat(),))
+    conn.commit()
+
+
+def surveyed_on(conn, day):
+    """Ids of users whose scheduled survey for `day` is already queued"""
+    return {row[0] for row in conn.execute('SELECT user_id FROM daily_surveys WHERE day = ?', (day,))}
+
+
+def record_surveyed(conn, day, user_id):
+    """Record a user's scheduled survey for `day`; False if it was already queued (caller commits)"""
+    return conn.execute('INSERT OR IGNORE INTO daily_surveys (day, user_id) VALUES (?, ?)',
+                        (day, user_id)).rowcount > 0
+
+
+def recipients(conn, campaign_ids):
+    """[(user_id, phone)] across the given campaigns, each user once, using one query"""
+    if not campaign_ids:
+        return []
+    enrolled = [i for i in campaign_ids if i != DEFAULT_CAMPAIGN_ID]
+    placeholders = ','.join('?' * len(enrolled)) or 'NULL'
+    return conn.execute(f'''
+        SELECT u.id, u.phone
+        FROM campaign_enrollments e JOIN users u ON u.id = e.user_id
+        WHERE e.campaign_id IN ({placeholders})
+        UNION
+        SELECT u.id, u.phone
+        FROM users u
+        WHERE ? AND NOT EXISTS (SELECT 1 FROM campaign_enrollments e WHERE e.user_id = u.id)
+        ORDER BY 1
+    ''', (*enrolled, DEFAULT_CAMPAIGN_ID in campaign_ids)).fetchall()
+
+
+def list_campaigns(conn, now):
+    """Campaigns with their schedule, status and recipient count"""
+    today = now.date().isoformat()
+    rows = conn.execute('''
+        SELECT c.id, c.name, c.start_date, c.end_date, c.send_hour, c.weekdays, c.last_run_on,
+               CASE WHEN c.id = ? THEN (SELECT COUNT(*) FROM users u WHERE NOT EXISTS
+                                        (SELECT 1 FROM campaign_enrollments e WHERE e.user_id = u.id))
+                    ELSE (SELECT COUNT(*) FROM campaign_enrollments e WHERE e.campaign_id = c.id) END
+        FROM campaign c ORDER BY c.id
+    ''', (DEFAULT_CAMPAIGN_ID,)).fetchall()
+    campaigns = []
+    for campaign_id, name, start, end, hour, weekdays, last_run_on, enrolled in rows:
+        if end and end < today:
+            status = 'ended'
+        elif start and start > today:
+            status = 'scheduled'
+        else:
+            status = 'active'
+        campaigns.append({'id': campaign_id, 'name': name, 'start_date': start, 'end_date': end,
+                          'send_hour': hour, 'weekdays': weekdays, 'last_run_on': last_run_on,
+                          'recipients': enrolled, 'status': status})
+    return campaigns
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Synthetic cohort generator for benchmarks and load tests.
+
+Writes a survey.db-compatible database with a configurable number of
+users, days of history and mix of reply texts. The same seed always
+produces the same database, so benchmark runs are comparable.
+
+    python cohort.py bench.db --users 5000 --days 60 --reply-rate 0.7 --mix clean=0.7,noisy=0.2,invalid=0.1
+"""
+
+import argparse
+import os
+import random
+import string
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from parsing import parse_survey_response
+
+DEFAULT_MIX = {'clean': 0.7, 'noisy': 0.2, 'invalid': 0.1}
+
+TOKEN_ALPHABET = string.ascii_letters + string.digits + '-_'
+
+INFLUENCES = ['shipped a feature', 'long meetings', 'helped a teammate', 'slept badly',
+              'great workout', 'code review backlog', 'family dinner', 'nothing much']
+
+
+def parse_mix(text):
+    """Parse 'clean=0.7,noisy=0.2,invalid=0.1' into a weight dict"""
+    mix = {}
+    for part in filter(None, text.split(',')):
+        kind, _, weight = part.partition('=')
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown reply kind '{kind}' (expected one of {', '.join(DEFAULT_MIX)})")
+        mix[kind] = float(weight)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('Reply mix needs at least one positive weight')
+    return mix
+
+
+def reply_text(rng, kind):
+    """Return (text, scores) for one synthetic SMS reply; scores is None if unparseable"""
+    scores = (rng.randint(1, 10), rng.randint(1, 10), rng.randint(1, 10))
+    influence = rng.choice(INFLUENCES)
+    if kind == 'clean':
+        return f'{scores[0]} {scores[1]} {scores[2]} {influence}', scores
+    if kind == 'noisy':
+        template = rng.choice(['Joy: {0}, achievement {1}, meaning={2}. {3}',
+                               '{0}/{1}/{2} - {3}!!',
+                               'today was a {0}, {1} and {2} tbh ({3})'])
+        return template.format(*scores, influence), scores
+    return rng.choice(['thanks!', 'STOP', 'call me later', 'what is this?', '👍']), None
+
+
+def generate_cohort(db_path, users=1000, days=30, reply_rate=0.7, mix=None, seed=42,
+                    open_tokens=None, now=None):
+    """Create db_path with a synthetic cohort and return a summary.
+
+    Each user gets `days` days of history where they replied with probability
+    reply_rate, plus one unused survey token (up to open_tokens users) so
+    survey pages can be exercised. The summary includes the sample replies,
+    tokens and phone numbers the benchmarks replay.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds, weights = zip(*mix.items())
+    now = now or datetime.now()
+    open_tokens = users if open_tokens is None else open_tokens
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    app.DB_PATH = db_path
+    app.init_db()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        phones = [f'+1555{i:07d}' for i in range(users)]
+        conn.executemany('INSERT INTO users (phone) VALUES (?)', ((phone,) for phone in phones))
+
+        def history():
+            for user_id in range(1, users + 1):
+                for day in range(days, 0, -1):
+                    if rng.random() >= reply_rate:
+                        continue
+                    text, _ = reply_text(rng, rng.choices(kinds, weights)[0])
+                    joy, achievement, meaning, influence = parse_survey_response(text)
+                    if joy is None:
+                        continue  # Unparseable replies are never stored
+                    sent_at = now - timedelta(days=day, minutes=rng.randint(0, 600))
+                    yield (user_id, joy, achievement, meaning, influence, sent_at.strftime('%Y-%m-%d %H:%M:%S'))
+        conn.executemany('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                            VALUES (?, ?, ?, ?, ?, ?)''', history())
+
+        expires_at = now + timedelta(hours=24)
+        tokens = [(''.join(rng.choices(TOKEN_ALPHABET, k=43)), user_id)
+                  for user_id in range(1, open_tokens + 1)]
+        conn.executemany('INSERT INTO survey_tokens (token, user_id, expires_at) VALUES (?, ?, ?)',
+                         ((token, user_id, expires_at) for token, user_id in tokens))
+        conn.commit()
+        response_count = conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+    finally:
+        conn.close()
+
+    return {
+        'db_path': db_path,
+        'users': users,
+        'days': days,
+        'reply_rate': reply_rate,
+        'mix': dict(mix),
+        'seed': seed,
+        'responses': response_count,
+        'phones': phones,
+        'tokens': [token for token, _ in tokens],
+        'replies': [reply_text(rng, rng.choices(kinds, weights)[0])[0] for _ in range(1000)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('db_path')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--reply-rate', type=float, default=0.7)
+    parser.add_argument('--mix', default='clean=0.7,noisy=0.2,invalid=0.1',
+                        help='Reply text distribution as kind=weight pairs')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    summary = generate_cohort(args.db_path, args.users, args.days, args.reply_rate,
+                              parse_mix(args.mix), args.seed)
+    print(f"✅ Wrote {summary['users']} users and {summary['responses']} responses to {args.db_path}")
+
+
+if __name__ == "__main__":
+    main()
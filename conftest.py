@@ -0,0 +1,50 @@
+"""
+Shared pytest setup: module globals that tests repoint at temporary
+directories or fakes are restored after every test, and seed_survey_db
+creates the fresh database most tests start from.
+"""
+
+import os
+import sqlite3
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import app
+import archive
+import backups
+import metrics
+import profiling
+import short_links
+
+# Settings tests may reassign freely; each is put back when the test ends
+ISOLATED_GLOBALS = (
+    (app, ('DB_PATH', 'sms_provider', 'sms_limiter', 'webhook_recorder')),
+    (profiling, ('PROFILE_DIR', 'PROFILE_TOKEN', 'SLOW_QUERY_MS')),
+    (metrics, ('METRICS_DIR',)),
+    (archive, ('ARCHIVE_DIR',)),
+    (backups, ('REPORT_SOURCE', 'BACKUP_DIR')),
+    (short_links, ('SURVEY_LINK_STYLE',)),
+)
+
+
+def seed_survey_db(db_path, phones=()):
+    """Point the app at a new database at db_path with one user per phone.
+    Returns an open connection for adding the rows a test needs."""
+    app.DB_PATH = db_path
+    app.init_db()
+    app.feedback_cache.clear()
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT INTO users (phone) VALUES (?)', [(phone,) for phone in phones])
+    conn.commit()
+    return conn
+
+
+@pytest.fixture(autouse=True)
+def isolated_globals(monkeypatch):
+    """Snapshot ISOLATED_GLOBALS so whatever a test assigns is undone afterwards"""
+    for module, names in ISOLATED_GLOBALS:
+        for name in names:
+            monkeypatch.setattr(module, name, getattr(module, name))
+    return monkeypatch
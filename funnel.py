@@ -0,0 +1,163 @@
+"""
+Survey funnel: sent -> opened -> submitted (or expired), per campaign run.
+
+Every survey token belongs to a run: one per send_daily_sms invocation,
+plus one 'manual' run per day for surveys sent from the admin page. Token
+lifecycle events update the run's counters as they happen:
+
+    sent       the outbox delivered the survey SMS
+    opened     first GET of /survey/<token>
+    submitted  the survey form was stored, with the send-to-submit delay bucketed
+    expired    the token passed expires_at unused (found by expire_tokens)
+
+Each event flips a timestamp column on the token with a guarded UPDATE,
+so an event is counted once even across workers, and reports never
+re-join survey_tokens with responses.
+"""
+
+from collections import Counter
+
+from rollups import DELAY_LABELS, delay_label
+
+STAGES = ('sent', 'opened', 'submitted', 'expired')
+
+
+def init_funnel(cursor):
+    """Create funnel tables and token lifecycle columns (called from init_db)"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS survey_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        run_key TEXT UNIQUE,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        tokens INTEGER NOT NULL DEFAULT 0,
+        sent INTEGER NOT NULL DEFAULT 0,
+        opened INTEGER NOT NULL DEFAULT 0,
+        submitted INTEGER NOT NULL DEFAULT 0,
+        expired INTEGER NOT NULL DEFAULT 0
+    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS survey_run_latency (
+        run_id INTEGER NOT NULL,
+        bucket TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (run_id, bucket)
+    )''')
+
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(survey_tokens)').fetchall()]
+    for column in ('run_id INTEGER NULL', 'sent_at TIMESTAMP NULL', 'opened_at TIMESTAMP NULL',
+                   'expired_at TIMESTAMP NULL'):
+        if column.split()[0] not in columns:
+            cursor.execute(f'ALTER TABLE survey_tokens ADD COLUMN {column}')
+
+    # Only tokens that can still expire are indexed, so the sweep stays small
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_survey_tokens_expiring
+                      ON survey_tokens (expires_at) WHERE is_used = 0 AND expired_at IS NULL''')
+
+
+def start_run(conn, kind, run_key=None):
+    """Create a run (or return the existing one with the same key) and return its id"""
+    if run_key:
+        conn.execute('INSERT OR IGNORE INTO survey_runs (kind, run_key) VALUES (?, ?)', (kind, run_key))
+        run_id = conn.execute('SELECT id FROM survey_runs WHERE run_key = ?', (run_key,)).fetchone()[0]
+    else:
+        run_id = conn.execute('INSERT INTO survey_runs (kind) VALUES (?)', (kind,)).lastrowid
+    conn.commit()
+    return run_id
+
+
+def manual_run(conn, day):
+    """The shared run for surveys sent by hand on a given day"""
+    return start_run(conn, 'manual', f'manual:{day}')
+
+
+def _bump(conn, run_id, stage, amount=1):
+    conn.execute(f'UPDATE survey_runs SET {stage} = {stage} + ? WHERE id = ?', (amount, run_id))
+
+
+def record_tokens(conn, run_id, count):
+    """Count tokens minted for a run"""
+    _bump(conn, run_id, 'tokens', count)
+    conn.commit()
+
+
+def _first_event(conn, token, column):
+    """Stamp a lifecycle column once; returns the token's run id the first time, else None"""
+    row = conn.execute(f'''UPDATE survey_tokens SET {column} = CURRENT_TIMESTAMP
+                           WHERE token = ? AND {column} IS NULL
+                           RETURNING run_id''', (token,)).fetchone()
+    return row[0] if row else None
+
+
+def record_sent(conn, token):
+    run_id = _first_event(conn, token, 'sent_at')
+    if run_id:
+        _bump(conn, run_id, 'sent')
+    conn.commit()
+
+
+def record_opened(conn, token):
+    run_id = _first_event(conn, token, 'opened_at')
+    if run_id:
+        _bump(conn, run_id, 'opened')
+    conn.commit()
+
+
+def record_submitted(conn, token):
+    """Mark a token used; returns False if it was already used"""
+    row = conn.execute('''UPDATE survey_tokens SET is_used = TRUE, used_at = CURRENT_TIMESTAMP
+                          WHERE token = ? AND NOT is_used
+                          RETURNING run_id,
+                                    (julianday(used_at) - julianday(COALESCE(sent_at, created_at))) * 1440''',
+                       (token,)).fetchone()
+    if row and row[0]:
+        run_id, delay_minutes = row
+        _bump(conn, run_id, 'submitted')
+        conn.execute('''INSERT INTO survey_run_latency (run_id, bucket, count) VALUES (?, ?, 1)
+                        ON CONFLICT(run_id, bucket) DO UPDATE SET count = count + 1''',
+                     (run_id, delay_label(delay_minutes)))
+    conn.commit()
+    return row is not None
+
+
+def expire_tokens(conn, now):
+    """Stamp unused tokens past expires_at as expired and count them per run"""
+    rows = conn.execute('''UPDATE survey_tokens SET expired_at = CURRENT_TIMESTAMP
+                           WHERE is_used = 0 AND expired_at IS NULL AND expires_at < ?
+                           RETURNING run_id''', (now,)).fetchall()
+    per_run = Counter(run_id for run_id, in rows if run_id)
+    for run_id, count in per_run.items():
+        _bump(conn, run_id, 'expired', count)
+    conn.commit()
+    return len(rows)
+
+
+def funnel_report(conn, limit=30):
+    """Most recent runs with stage counts, conversion rates and send-to-submit delays"""
+    runs = conn.execute('''SELECT id, kind, started_at, tokens, sent, opened, submitted, expired
+                           FROM survey_runs ORDER BY id DESC LIMIT ?''', (limit,)).fetchall()
+    latency = {}
+    if runs:
+        placeholders = ','.join('?' * len(runs))
+        for run_id, bucket, count in conn.execute(
+                f'SELECT run_id, bucket, count FROM survey_run_latency WHERE run_id IN ({placeholders})',
+                [run[0] for run in runs]):
+            latency.setdefault(run_id, {})[bucket] = count
+
+    report = []
+    for run_id, kind, started_at, tokens, sent, opened, submitted, expired in runs:
+        delays = {label: latency.get(run_id, {}).get(label, 0) for label in DELAY_LABELS if label != 'unknown'}
+        rate = lambda n: round(n / sent, 4) if sent else None
+        report.append({
+            'run_id': run_id,
+            'kind': kind,
+            'started_at': started_at,
+            'tokens': tokens,
+            'sent': sent,
+            'opened': opened,
+            'submitted': submitted,
+            'expired': expired,
+            'open_rate': rate(opened),
+            'submit_rate': rate(submitted),
+            'expire_rate': rate(expired),
+            'submit_delay': delays,
+        })
+    return report
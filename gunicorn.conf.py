@@ -0,0 +1,39 @@
+"""
+Gunicorn settings. GUNICORN_PROFILE picks the worker model:
+
+    gthread  WEB_CONCURRENCY processes x GUNICORN_THREADS threads (default).
+             A request blocked on TextBelt or on a SQLite lock holds one
+             thread, not a whole worker.
+    gevent   cooperative greenlets, GUNICORN_WORKER_CONNECTIONS per worker.
+             Needs `pip install gevent`. Outbound HTTP yields to other
+             requests, but SQLite calls still block the worker's hub.
+    sync     one request at a time per process (gunicorn's own default).
+
+Measured numbers for each profile: python bench_workers.py
+"""
+
+import multiprocessing
+import os
+
+PROFILES = {
+    'sync': {'worker_class': 'sync', 'threads': 1},
+    'gthread': {'worker_class': 'gthread', 'threads': int(os.getenv('GUNICORN_THREADS', '8'))},
+    'gevent': {'worker_class': 'gevent', 'threads': 1},
+}
+
+profile = os.getenv('GUNICORN_PROFILE', 'gthread')
+if profile not in PROFILES:
+    raise ValueError(f"GUNICORN_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 4)))
+worker_class = PROFILES[profile]['worker_class']
+threads = PROFILES[profile]['threads']
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '200'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks cannot build up
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
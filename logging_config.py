@@ -0,0 +1,141 @@
+"""
+Structured, leveled logging for the app.
+
+Request threads only put records on an in-memory queue; a background
+listener thread redacts, formats (JSON or text) and writes them to stdout.
+Records logged with extra=SAMPLED are high-volume events that are kept
+with probability LOG_SAMPLE_RATE; warnings and errors are never sampled.
+
+    LOG_LEVEL=INFO          DEBUG, INFO, WARNING, ERROR
+    LOG_FORMAT=json         json or text
+    LOG_SAMPLE_RATE=1.0     fraction of sampled events to keep
+    LOG_REDACT=1            mask phone numbers and survey tokens
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+
+# Pass as extra= on high-volume, low-value events
+SAMPLED = {'sampled': True}
+
+# Phone numbers in any of the formats providers send (+1 prefix, dashes, parentheses, spaces)
+PHONE_PATTERN = re.compile(r'(?<![\w+])\+?(?:\d[\s\-.()]*){9,14}\d\b')
+# Survey tokens and similar secrets: long URL-safe strings containing a digit, '_' or '-'
+TOKEN_PATTERN = re.compile(r'\b(?=[A-Za-z0-9_-]*[0-9_-])[A-Za-z0-9_-]{20,}\b')
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sampled'}
+
+_listener = None
+
+
+def redact(text):
+    """Mask phone numbers (keeping the last 4 digits) and survey tokens"""
+    text = PHONE_PATTERN.sub(lambda m: '***' + re.sub(r'\D', '', m.group())[-4:], text)
+    return TOKEN_PATTERN.sub(lambda m: m.group()[:4] + '…', text)
+
+
+class SamplingFilter(logging.Filter):
+    """Drop a share of records marked with extra=SAMPLED"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno >= logging.WARNING or not getattr(record, 'sampled', False):
+            return True
+        return random.random() < self.rate
+
+
+class RedactionFilter(logging.Filter):
+    """Redact PII from the rendered message, extra fields and tracebacks"""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for key, value in list(vars(record).items()):
+            if key not in _RECORD_ATTRS and isinstance(value, str):
+                setattr(record, key, redact(value))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields as top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers formatting to the listener thread"""
+
+    def prepare(self, record):
+        # The stock handler renders the message here, on the request thread;
+        # only materialise exception info, which cannot cross threads lazily
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(stream=None):
+    """Install the queue handler on the root logger (safe to call more than once)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    level = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+    output = logging.StreamHandler(stream or sys.stdout)
+    if os.getenv('LOG_FORMAT', 'json').lower() == 'json':
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    if os.getenv('LOG_REDACT', '1') != '0':
+        output.addFilter(RedactionFilter())
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(float(os.getenv('LOG_SAMPLE_RATE', '1.0'))))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,302 @@
+"""
+Prometheus-style metrics: counters and latency histograms.
+
+Each process keeps its own registry and periodically writes a snapshot to
+METRICS_DIR. The /metrics endpoint merges the snapshots of every gunicorn
+worker, so whichever worker serves the scrape reports totals for all of
+them. Clear METRICS_DIR on deploy, as with prometheus_client's
+multiprocess mode.
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import profiling
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'sms_survey_metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()  # Serialises snapshot writes
+_metrics = {}
+_last_flush = 0.0
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self, labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        _maybe_flush()
+
+    def snapshot(self):
+        return {'|'.join(key): value for key, value in self.values.items()}
+
+
+class Histogram:
+    """Cumulative latency histogram with optional labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(self, labels)
+        with _lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+        _maybe_flush()
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        return {'|'.join(key): dict(series, buckets=list(series['buckets']))
+                for key, series in self.values.items()}
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _label_key(metric, labels):
+    return tuple(str(labels.get(name, '')) for name in metric.labels)
+
+
+def counter(name, help_text, labels=()):
+    """Register (or fetch) a counter"""
+    with _lock:
+        if name not in _metrics:
+            _metrics[name] = Counter(name, help_text, labels)
+        return _metrics[name]
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    """Register (or fetch) a histogram"""
+    with _lock:
+        if name not in _metrics:
+            _metrics[name] = Histogram(name, help_text, labels, buckets)
+        return _metrics[name]
+
+
+def timed_job(name, func):
+    """Wrap a scheduler job so its duration and outcome are recorded"""
+    def run(*args, **kwargs):
+        start = time.perf_counter()
+        result = 'success'
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            result = 'error'
+            raise
+        finally:
+            SCHEDULER_JOB_SECONDS.observe(time.perf_counter() - start, job=name)
+            SCHEDULER_JOB_TOTAL.inc(job=name, result=result)
+    run.__name__ = getattr(func, '__name__', name)
+    return run
+
+
+# Process snapshots
+
+def flush():
+    """Write this process's metrics to METRICS_DIR"""
+    with _flush_lock:
+        _write_snapshot()
+
+
+def _write_snapshot():
+    global _last_flush
+    with _lock:
+        data = {name: {'kind': metric.kind, 'help': metric.help, 'labels': list(metric.labels),
+                       'buckets': list(getattr(metric, 'buckets', ())), 'values': metric.snapshot()}
+                for name, metric in _metrics.items()}
+        _last_flush = time.time()
+
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+        # Unique per flush so a stray writer can never interleave with this one
+        fd, tmp_path = tempfile.mkstemp(prefix=f'{os.getpid()}.', suffix='.tmp', dir=METRICS_DIR)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        pass  # Metrics must never break a request
+
+
+def _maybe_flush():
+    """Flush from the request path at most once per interval, and never
+    make a request wait on another thread's flush"""
+    global _last_flush
+    with _lock:
+        now = time.time()
+        if now - _last_flush < METRICS_FLUSH_INTERVAL:
+            return
+        _last_flush = now  # Claim this interval so concurrent callers skip it
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _write_snapshot()
+    finally:
+        _flush_lock.release()
+
+
+atexit.register(flush)
+
+
+def collect():
+    """Merge the snapshots of every process into one view"""
+    flush()
+    merged = {}
+    try:
+        files = [name for name in os.listdir(METRICS_DIR) if name.endswith('.json')]
+    except OSError:
+        files = []
+
+    for filename in files:
+        try:
+            with open(os.path.join(METRICS_DIR, filename)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        for name, metric in data.items():
+            target = merged.setdefault(name, dict(metric, values={}))
+            for key, value in metric['values'].items():
+                if metric['kind'] == 'counter':
+                    target['values'][key] = target['values'].get(key, 0) + value
+                else:
+                    series = target['values'].setdefault(
+                        key, {'buckets': [0] * len(metric['buckets']), 'sum': 0.0, 'count': 0})
+                    series['buckets'] = [a + b for a, b in zip(series['buckets'], value['buckets'])]
+                    series['sum'] += value['sum']
+                    series['count'] += value['count']
+    return merged
+
+
+def _format_labels(names, key, extra=None):
+    pairs = [(name, value) for name, value in zip(names, key.split('|') if names else [])]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for name, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_prometheus():
+    """Render all workers' metrics in the Prometheus text exposition format"""
+    lines = []
+    for name, metric in sorted(collect().items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for key, value in sorted(metric['values'].items()):
+            if metric['kind'] == 'counter':
+                lines.append(f"{name}{_format_labels(metric['labels'], key)} {value}")
+                continue
+            for bound, count in zip(metric['buckets'], value['buckets']):
+                lines.append(f"{name}_bucket{_format_labels(metric['labels'], key, ('le', bound))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(metric['labels'], key, ('le', '+Inf'))} {value['count']}")
+            lines.append(f"{name}_sum{_format_labels(metric['labels'], key)} {value['sum']}")
+            lines.append(f"{name}_count{_format_labels(metric['labels'], key)} {value['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+# Database timing
+
+def current_route():
+    """Flask endpoint of the current request, or 'background' outside one"""
+    from flask import has_request_context, request
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return 'background'
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records each statement's duration in db_query_seconds
+    and reports slow ones to the slow-query log"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = current_route()
+            DB_QUERY_SECONDS.observe(elapsed, route=route)
+            profiling.log_slow_query(self.connection, sql, parameters, elapsed, route)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = current_route()
+            DB_QUERY_SECONDS.observe(elapsed, route=route)
+            profiling.log_slow_query(self.connection, sql, None, elapsed, route)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors are TimedCursor (pass as sqlite3.connect(factory=...))"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# Shared metrics used across modules
+
+DB_QUERY_SECONDS = histogram('db_query_seconds', 'SQLite statement duration by route', ['route'])
+SCHEDULER_JOB_SECONDS = histogram('scheduler_job_seconds', 'Scheduled job duration', ['job'],
+                                  buckets=DEFAULT_BUCKETS + (30.0, 60.0, 300.0, 900.0))
+SCHEDULER_JOB_TOTAL = counter('scheduler_job_total', 'Scheduled job runs by outcome', ['job', 'result'])
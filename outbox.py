@@ -0,0 +1,326 @@
+"""
+Durable outbox for outbound SMS.
+
+Routes and the daily cron job enqueue messages here instead of calling the
+provider inline. drain_outbox() claims due rows, sends them, and reschedules
+failures with exponential backoff until they succeed or reach max_attempts,
+at which point they are parked in the 'dead' state for manual retry.
+
+Each claim writes a fresh claim_token. The lease is renewed right before
+each send, and every later update checks the token, so a worker whose lease
+ran out (and whose rows another drain re-claimed) neither sends them nor
+overwrites the new owner's outcome.
+"""
+
+import json
+import random
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+DEAD = 'dead'
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class QuotaExhausted(Exception):
+    """Raised by a send function when no more messages can go out today"""
+
+
+def utc_now():
+    return datetime.utcnow()
+
+
+def format_time(dt):
+    return dt.strftime(TIME_FORMAT)
+
+
+def connect(db_path):
+    return sqlite3.connect(db_path, timeout=30, isolation_level=None, uri=True)
+
+
+def init_outbox(cursor):
+    """Create the outbox table and its indexes (called from init_db)"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS sms_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        user_id INTEGER,
+        phone TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 5,
+        next_attempt_at TIMESTAMP NOT NULL,
+        locked_until TIMESTAMP NULL,
+        last_error TEXT NULL,
+        text_id TEXT NULL,
+        broadcast_id INTEGER NULL,
+        claim_token TEXT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )''')
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(sms_outbox)').fetchall()]
+    if 'broadcast_id' not in columns:
+        cursor.execute('ALTER TABLE sms_outbox ADD COLUMN broadcast_id INTEGER NULL')
+    if 'claim_token' not in columns:
+        cursor.execute('ALTER TABLE sms_outbox ADD COLUMN claim_token TEXT NULL')
+
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_sms_outbox_due
+                      ON sms_outbox (status, next_attempt_at)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_sms_outbox_broadcast
+                      ON sms_outbox (broadcast_id, status)''')
+
+
+def enqueue_sms(db_path, kind, user_id, phone, message, payload=None, max_attempts=5):
+    """Queue one message for delivery and return its outbox id"""
+    return enqueue_many(db_path, [{
+        'kind': kind,
+        'user_id': user_id,
+        'phone': phone,
+        'message': message,
+        'payload': payload,
+    }], max_attempts=max_attempts)[0]
+
+
+def enqueue_many(db_path, messages, max_attempts=5, broadcast_id=None, conn=None):
+    """Queue a batch of messages in one transaction and return their outbox ids.
+
+    Pass an open autocommit connection with a transaction already started to
+    enqueue as part of a larger write; it is then left for the caller to commit.
+    """
+    now = format_time(utc_now())
+    owns_conn = conn is None
+    if owns_conn:
+        conn = connect(db_path)
+    try:
+        if owns_conn:
+            conn.execute('BEGIN IMMEDIATE')
+        ids = []
+        for msg in messages:
+            payload = dict(msg.get('payload') or {})
+            payload['message'] = msg['message']
+            cursor = conn.execute('''INSERT INTO sms_outbox
+                                     (kind, user_id, phone, payload, max_attempts, next_attempt_at, broadcast_id)
+                                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                                  (msg['kind'], msg.get('user_id'), msg['phone'],
+                                   json.dumps(payload), max_attempts, now, broadcast_id))
+            ids.append(cursor.lastrowid)
+        if owns_conn:
+            conn.execute('COMMIT')
+        return ids
+    except Exception:
+        if owns_conn:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        if owns_conn:
+            conn.close()
+
+
+def claim_due(db_path, limit=100, lease_seconds=300):
+    """Atomically claim up to `limit` due messages for this worker.
+
+    Rows stuck in 'sending' past their lease (worker died mid-send) are
+    claimed again. Every claimed item carries this claim's token.
+    """
+    now = utc_now()
+    claim_token = uuid.uuid4().hex
+    conn = connect(db_path)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        rows = conn.execute('''SELECT id, kind, user_id, phone, payload, attempts, max_attempts
+                               FROM sms_outbox
+                               WHERE (status = ? AND next_attempt_at <= ?)
+                                  OR (status = ? AND locked_until <= ?)
+                               ORDER BY next_attempt_at
+                               LIMIT ?''',
+                            (PENDING, format_time(now), SENDING, format_time(now), limit)).fetchall()
+        if rows:
+            locked_until = format_time(now + timedelta(seconds=lease_seconds))
+            conn.executemany('''UPDATE sms_outbox
+                                SET status = ?, locked_until = ?, claim_token = ?, attempts = attempts + 1,
+                                    updated_at = CURRENT_TIMESTAMP
+                                WHERE id = ?''',
+                             [(SENDING, locked_until, claim_token, row[0]) for row in rows])
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+    return [{
+        'id': row[0],
+        'kind': row[1],
+        'user_id': row[2],
+        'phone': row[3],
+        'payload': json.loads(row[4]),
+        'attempts': row[5] + 1,
+        'max_attempts': row[6],
+        'claim_token': claim_token,
+    } for row in rows]
+
+
+def backoff_seconds(attempts, base=30, cap=3600):
+    """Exponential backoff with jitter: base, 2*base, 4*base ... capped"""
+    delay = min(cap, base * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def renew_lease(db_path, item, lease_seconds=300):
+    """Extend the lease on a claimed item; False if this claim no longer owns it"""
+    locked_until = format_time(utc_now() + timedelta(seconds=lease_seconds))
+    conn = connect(db_path)
+    try:
+        cursor = conn.execute('''UPDATE sms_outbox SET locked_until = ?
+                                 WHERE id = ? AND status = ? AND claim_token = ?''',
+                              (locked_until, item['id'], SENDING, item['claim_token']))
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def mark_sent(db_path, item, text_id):
+    """Record a delivery; False if the claim was lost to another drain"""
+    conn = connect(db_path)
+    try:
+        cursor = conn.execute('''UPDATE sms_outbox
+                                 SET status = ?, text_id = ?, locked_until = NULL, last_error = NULL,
+                                     updated_at = CURRENT_TIMESTAMP
+                                 WHERE id = ? AND status = ? AND claim_token = ?''',
+                              (SENT, str(text_id), item['id'], SENDING, item['claim_token']))
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def mark_failed(db_path, item, error, base_delay=30):
+    """Reschedule a failed message, or dead-letter it once attempts run out.
+
+    Returns the new status, or None if the claim was lost to another drain.
+    """
+    if item['attempts'] >= item['max_attempts']:
+        status, next_attempt_at = DEAD, utc_now()
+    else:
+        status = PENDING
+        next_attempt_at = utc_now() + timedelta(seconds=backoff_seconds(item['attempts'], base_delay))
+
+    conn = connect(db_path)
+    try:
+        cursor = conn.execute('''UPDATE sms_outbox
+                                 SET status = ?, next_attempt_at = ?, locked_until = NULL, last_error = ?,
+                                     updated_at = CURRENT_TIMESTAMP
+                                 WHERE id = ? AND status = ? AND claim_token = ?''',
+                              (status, format_time(next_attempt_at), str(error)[:500], item['id'],
+                               SENDING, item['claim_token']))
+        return status if cursor.rowcount > 0 else None
+    finally:
+        conn.close()
+
+
+def release(db_path, items):
+    """Hand unsent items back to 'pending', due now, without using up an attempt"""
+    conn = connect(db_path)
+    try:
+        conn.executemany('''UPDATE sms_outbox
+                              SET status = ?, attempts = attempts - 1, next_attempt_at = ?, locked_until = NULL,
+                                  updated_at = CURRENT_TIMESTAMP
+                              WHERE id = ? AND status = ? AND claim_token = ?''',
+                         [(PENDING, format_time(utc_now()), item['id'], SENDING, item['claim_token'])
+                          for item in items])
+    finally:
+        conn.close()
+
+
+def drain_outbox(db_path, send_fn, batch_size=100, max_workers=1, max_batches=None,
+                 base_delay=30, on_sent=None, lease_seconds=300):
+    """Send due messages until none are left (or max_batches is reached).
+
+    send_fn(phone, message) returns a provider text ID on success and a
+    falsy value on failure, and raises QuotaExhausted to stop the drain:
+    the rest of the batch goes back to 'pending' without losing an attempt.
+    on_sent(item, text_id) runs after each success. Returns counts of sent,
+    retried, dead-lettered and deferred messages.
+    """
+    summary = {'sent': 0, 'retry': 0, 'dead': 0, 'deferred': 0}
+    stop = threading.Event()
+
+    def deliver(item):
+        # Renewing right before the send also checks this claim still owns the row
+        if stop.is_set() or not renew_lease(db_path, item, lease_seconds):
+            return None
+        try:
+            text_id = send_fn(item['phone'], item['payload']['message'])
+            error = None if text_id else 'Provider did not accept the message'
+        except QuotaExhausted:
+            stop.set()
+            return None
+        except Exception as e:
+            text_id, error = None, str(e)
+
+        if text_id:
+            if mark_sent(db_path, item, text_id) and on_sent:
+                on_sent(item, text_id)
+            return 'sent'
+        status = mark_failed(db_path, item, error, base_delay)
+        return 'dead' if status == DEAD else 'retry' if status else None
+
+    batches = 0
+    executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+    try:
+        while not stop.is_set() and (max_batches is None or batches < max_batches):
+            items = claim_due(db_path, limit=batch_size, lease_seconds=lease_seconds)
+            if not items:
+                break
+            batches += 1
+            results = list(executor.map(deliver, items) if executor else map(deliver, items))
+            for result in results:
+                if result:
+                    summary[result] += 1
+            if stop.is_set():
+                unsent = [item for item, result in zip(items, results) if result is None]
+                release(db_path, unsent)
+                summary['deferred'] += len(unsent)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return summary
+
+
+def requeue(db_path, outbox_id):
+    """Move a dead-lettered message back to pending with a fresh attempt budget"""
+    conn = connect(db_path)
+    try:
+        cursor = conn.execute('''UPDATE sms_outbox
+                                 SET status = ?, attempts = 0, next_attempt_at = ?, last_error = NULL,
+                                     updated_at = CURRENT_TIMESTAMP
+                                 WHERE id = ? AND status = ?''',
+                              (PENDING, format_time(utc_now()), outbox_id, DEAD))
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def outbox_stats(db_path, recent_dead=10):
+    """Counts by status plus the most recent dead letters"""
+    conn = connect(db_path)
+    try:
+        counts = dict(conn.execute('SELECT status, COUNT(*) FROM sms_outbox GROUP BY status').fetchall())
+        dead = conn.execute('''SELECT id, kind, user_id, phone, attempts, last_error, updated_at
+                               FROM sms_outbox WHERE status = ?
+                               ORDER BY updated_at DESC LIMIT ?''', (DEAD, recent_dead)).fetchall()
+    finally:
+        conn.close()
+
+    return {
+        'counts': {status: counts.get(status, 0) for status in (PENDING, SENDING, SENT, DEAD)},
+        'dead_letters': [dict(zip(('id', 'kind', 'user_id', 'phone', 'attempts', 'last_error', 'updated_at'), row))
+                         for row in dead]
+    }
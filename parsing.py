@@ -0,0 +1,37 @@
+"""
+Parsing of SMS survey replies.
+
+Kept free of Flask, the database and the scheduler so tests and tools can
+import it without starting the app.
+"""
+
+import re
+
+_SCORE = re.compile(r'\b([1-9]|10)\b')
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def parse_survey_response(text):
+    """Parse survey response text to extract ratings and influence"""
+    # Look for 3 numbers (joy, achievement, meaning ratings)
+    numbers = _SCORE.findall(text)
+
+    if len(numbers) >= 3:
+        try:
+            joy = int(numbers[0])
+            achievement = int(numbers[1])
+            meaning = int(numbers[2])
+
+            # Extract influence text (everything after the numbers)
+            # Remove the numbers and clean up the remaining text
+            influence_text = text
+            for num in numbers[:3]:
+                influence_text = influence_text.replace(num, '', 1)
+            influence_text = _PUNCTUATION.sub(' ', influence_text).strip()
+            influence_text = ' '.join(influence_text.split())  # Clean whitespace
+
+            return joy, achievement, meaning, influence_text
+        except ValueError:
+            pass
+
+    return None, None, None, None
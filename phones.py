@@ -0,0 +1,144 @@
+"""
+Phone number normalization and the per-worker phone -> user map.
+
+Providers report the same number in different shapes ('+16175551234',
+'6175551234', '1 (617) 555-1234'). normalize_phone() turns all of them
+into one E.164 key. users.phone_e164 stores that key under a UNIQUE index,
+so a number can only be registered once.
+
+Webhooks resolve their user through PhoneDirectory, an in-memory map that
+each worker loads once and drops whenever it adds or deletes a user. A
+number the map doesn't know is looked up by index, so users added by
+another worker are still found; the map is also reloaded every
+PHONE_MAP_TTL seconds to forget users deleted elsewhere.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Country code assumed for numbers given without one (NANP by default)
+DEFAULT_COUNTRY_CODE = os.getenv('DEFAULT_COUNTRY_CODE', '1')
+PHONE_MAP_TTL = float(os.getenv('PHONE_MAP_TTL', '300'))
+
+_FORMATTING = re.compile(r'[\s\-.()/]')
+
+
+def normalize_phone(raw, default_country=DEFAULT_COUNTRY_CODE):
+    """E.164 form of a phone number ('+16175551234'), or None if it isn't one"""
+    if not raw:
+        return None
+    phone = _FORMATTING.sub('', str(raw))
+    if phone.startswith('00'):
+        phone = '+' + phone[2:]
+
+    if phone.startswith('+'):
+        digits = phone[1:]
+    elif default_country == '1' and len(phone) == 11 and phone.startswith('1'):
+        digits = phone
+    elif default_country == '1' and len(phone) == 10:
+        digits = '1' + phone
+    elif default_country != '1' and phone.startswith('0'):
+        digits = default_country + phone[1:]  # National trunk prefix
+    else:
+        digits = phone
+
+    if not digits.isdigit() or not 8 <= len(digits) <= 15 or digits.startswith('0'):
+        return None
+    return '+' + digits
+
+
+def init_phones(cursor):
+    """Add and backfill users.phone_e164 with its UNIQUE index (called from init_db)"""
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(users)').fetchall()]
+    if 'phone_e164' not in columns:
+        cursor.execute('ALTER TABLE users ADD COLUMN phone_e164 TEXT NULL')
+
+    taken = {key for key, in cursor.execute('SELECT phone_e164 FROM users WHERE phone_e164 IS NOT NULL')}
+    updates = []
+    for user_id, phone in cursor.execute('SELECT id, phone FROM users WHERE phone_e164 IS NULL ORDER BY id').fetchall():
+        key = normalize_phone(phone)
+        if key is None:
+            continue
+        if key in taken:
+            # Same number registered twice in different formats: the oldest user keeps it
+            logger.warning("Duplicate phone number left unindexed", extra={'user_id': user_id, 'phone': phone})
+            continue
+        taken.add(key)
+        updates.append((key, user_id))
+    cursor.executemany('UPDATE users SET phone_e164 = ? WHERE id = ?', updates)
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_phone_e164 ON users (phone_e164)')
+
+
+class PhoneDirectory:
+    """Per-worker map from E.164 number to user id"""
+
+    def __init__(self, ttl=PHONE_MAP_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db_path = None
+        self.users = {}
+        self.loaded_at = 0.0
+
+    def invalidate(self):
+        """Forget the map; the next lookup reloads it"""
+        with self.lock:
+            self.db_path = None
+
+    def _load(self, conn, db_path):
+        users = {}
+        for user_id, key, phone in conn.execute('SELECT id, phone_e164, phone FROM users'):
+            # Rows written outside the app may not have their key yet
+            key = key or normalize_phone(phone)
+            if key:
+                users.setdefault(key, user_id)
+        self.users, self.db_path, self.loaded_at = users, db_path, time.monotonic()
+
+    def lookup(self, conn, db_path, phone):
+        """User id for a phone number in any format, or None"""
+        key = normalize_phone(phone)
+        if key is None:
+            return None
+        with self.lock:
+            if self.db_path != db_path or time.monotonic() - self.loaded_at > self.ttl:
+                self._load(conn, db_path)
+            user_id = self.users.get(key)
+        if user_id is not None:
+            return user_id
+
+        # Possibly added by another worker since the map was loaded
+        row = conn.execute('SELECT id FROM users WHERE phone_e164 = ?', (key,)).fetchone()
+        if row:
+            with self.lock:
+                if self.db_path == db_path:
+                    self.users[key] = row[0]
+            return row[0]
+        return None
+
+    def refresh(self, conn, phone):
+        """Look a number up again through the phone_e164 index, bypassing the map"""
+        key = normalize_phone(phone)
+        if key is None:
+            return None
+        row = conn.execute('SELECT id FROM users WHERE phone_e164 = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def __len__(self):
+        return len(self.users)
+
+
+def add_user(conn, phone):
+    """Insert a user with a normalized phone; returns (user_id, None) or (None, error)"""
+    key = normalize_phone(phone)
+    if key is None:
+        return None, 'invalid'
+    try:
+        cursor = conn.execute('INSERT INTO users (phone, phone_e164) VALUES (?, ?)', (key, key))
+    except sqlite3.IntegrityError:
+        return None, 'exists'
+    return cursor.lastrowid, None
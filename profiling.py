@@ -0,0 +1,198 @@
+"""
+Opt-in request profiling and a slow-query log.
+
+A request is profiled with cProfile when it carries an X-Profile header
+matching PROFILE_TOKEN, or when it is picked by PROFILE_SAMPLE_RATE on one
+of the PROFILE_ROUTES endpoints. Each capture is written to PROFILE_DIR,
+so /debug/profiles lists captures from every gunicorn worker.
+
+SQLite statements slower than SLOW_QUERY_MS are logged together with their
+EXPLAIN QUERY PLAN and attached to the profile of the request running them.
+
+    PROFILE_TOKEN=            secret enabling the X-Profile header (unset = header ignored)
+    PROFILE_SAMPLE_RATE=0     fraction of PROFILE_ROUTES requests to profile
+    PROFILE_ROUTES=feedback,view_responses,survey
+    PROFILE_KEEP=50           captures kept on disk
+    SLOW_QUERY_MS=100         0 disables the slow-query log
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_ROUTES = set(filter(None, os.getenv('PROFILE_ROUTES', 'feedback,view_responses,survey').split(',')))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'sms_survey_profiles'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+
+# Statements EXPLAIN QUERY PLAN understands
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_lock = threading.Lock()
+slow_queries = deque(maxlen=100)
+_active = threading.local()
+
+
+def should_profile(endpoint, header_value):
+    """Decide whether the current request gets profiled"""
+    if PROFILE_TOKEN and header_value and header_value == PROFILE_TOKEN:
+        return True
+    return bool(PROFILE_SAMPLE_RATE) and endpoint in PROFILE_ROUTES and random.random() < PROFILE_SAMPLE_RATE
+
+
+class RequestProfile:
+    """cProfile capture of a single request plus its slow queries"""
+
+    def __init__(self, route, method, path):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.queries = []
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        _active.profile = self
+        self.started = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def stop(self, status_code, top=40):
+        """Stop profiling, write the capture to PROFILE_DIR and return its id"""
+        self.profiler.disable()
+        duration = time.perf_counter() - self.started
+        _active.profile = None
+
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(top)
+
+        profile_id = f"{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        summary = {
+            'id': profile_id,
+            'route': self.route,
+            'method': self.method,
+            'path': self.path,
+            'status': status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'pid': os.getpid(),
+            'slow_queries': self.queries,
+        }
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            base = os.path.join(PROFILE_DIR, profile_id)
+            stats.dump_stats(base + '.prof')
+            with open(base + '.json', 'w') as f:
+                json.dump(dict(summary, stats=out.getvalue()), f)
+            _prune()
+        except OSError as e:
+            logger.warning("Could not save profile: %s", e)
+            return None
+        logger.info("Request profiled", extra={'profile_id': profile_id, 'route': self.route,
+                                               'duration_ms': summary['duration_ms']})
+        return profile_id
+
+
+def current_profile():
+    return getattr(_active, 'profile', None)
+
+
+def _prune():
+    captures = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith('.json'))
+    for name in captures[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else captures:
+        for ext in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name[:-5] + ext))
+            except OSError:
+                pass
+
+
+def list_profiles():
+    """Summaries of saved captures, newest first"""
+    try:
+        names = sorted((name for name in os.listdir(PROFILE_DIR) if name.endswith('.json')), reverse=True)
+    except OSError:
+        return []
+    profiles = []
+    for name in names:
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        data.pop('stats', None)
+        data['slow_queries'] = len(data['slow_queries'])
+        profiles.append(data)
+    return profiles
+
+
+def profile_path(profile_id, ext='.json'):
+    """Path of a saved capture, or None for unknown or malformed ids"""
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ext)
+    return path if os.path.exists(path) else None
+
+
+def load_profile(profile_id):
+    path = profile_path(profile_id)
+    if not path:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+# Slow-query log
+
+def log_slow_query(conn, sql, parameters, seconds, route):
+    """Record a slow statement with its query plan (called by metrics.TimedCursor).
+
+    parameters is None for executemany batches, which are logged unexplained.
+    """
+    if not SLOW_QUERY_MS or seconds * 1000 < SLOW_QUERY_MS:
+        return
+
+    plan = []
+    if parameters is not None and sql.lstrip().upper().startswith(_EXPLAINABLE):
+        try:
+            # Plain cursor so the EXPLAIN itself is not timed
+            rows = sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+            plan = [row[-1] for row in rows]
+        except Exception as e:
+            plan = [f'EXPLAIN failed: {e}']
+
+    entry = {
+        'sql': ' '.join(sql.split()),
+        'duration_ms': round(seconds * 1000, 2),
+        'route': route,
+        'plan': plan,
+        'at': datetime.utcnow().isoformat(timespec='seconds'),
+    }
+    with _lock:
+        slow_queries.append(entry)
+    profile = current_profile()
+    if profile is not None:
+        profile.queries.append(entry)
+    logger.warning("Slow query (%.1f ms): %s", entry['duration_ms'], entry['sql'],
+                   extra={'route': route, 'plan': ' | '.join(plan)})
+
+
+def recent_slow_queries(limit=20):
+    with _lock:
+        return list(slow_queries)[-limit:][::-1]
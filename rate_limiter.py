@@ -0,0 +1,198 @@
+"""
+Outbound SMS rate limiter shared across worker processes.
+
+A token bucket (messages/second plus burst) and a daily quota are kept in a
+small SQLite file so every gunicorn worker and the scheduler draw from the
+same budget. The refill rate adapts AIMD-style: it is cut when the provider
+returns errors or slows down, and creeps back up while sends succeed.
+"""
+
+import os
+import sqlite3
+import time
+from datetime import date
+
+
+class SMSRateLimiter:
+    """Token bucket + daily quota with adaptive backpressure, stored in SQLite"""
+
+    def __init__(self, db_path, rate=5.0, burst=10, daily_quota=0, min_rate=0.2,
+                 latency_target_ms=2000, error_threshold=0.2, decrease_factor=0.5,
+                 increase_step=None, cooldown=1.0):
+        self.db_path = db_path
+        self.max_rate = float(rate)
+        self.burst = float(burst)
+        self.daily_quota = int(daily_quota)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.latency_target = latency_target_ms / 1000.0
+        self.error_threshold = error_threshold
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step or max(self.max_rate * 0.05, 0.01)
+        self.cooldown = cooldown
+        # The table is created on first use, so building a limiter does no I/O
+        self._initialized = False
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        if not self._initialized:
+            self.init_db(conn)
+        return conn
+
+    def init_db(self, conn):
+        conn.execute('''CREATE TABLE IF NOT EXISTS sms_rate_limit (
+            id INTEGER PRIMARY KEY,
+            tokens REAL NOT NULL,
+            current_rate REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            last_decrease_at REAL NOT NULL DEFAULT 0,
+            day TEXT NOT NULL,
+            sent_today INTEGER NOT NULL DEFAULT 0,
+            quota_remaining INTEGER NULL,
+            error_ewma REAL NOT NULL DEFAULT 0,
+            latency_ewma REAL NOT NULL DEFAULT 0
+        )''')
+        conn.execute('''INSERT OR IGNORE INTO sms_rate_limit
+                        (id, tokens, current_rate, updated_at, day)
+                        VALUES (1, ?, ?, ?, ?)''',
+                     (self.burst, self.max_rate, time.time(), date.today().isoformat()))
+        self._initialized = True
+
+    def try_acquire(self):
+        """Take one token if available.
+
+        Returns (True, 0) on success, (False, seconds_to_wait) when the bucket
+        is empty, and (False, None) when the daily quota is used up.
+        """
+        conn = self.connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            tokens, current_rate, updated_at, day, sent_today, quota_remaining = conn.execute(
+                '''SELECT tokens, current_rate, updated_at, day, sent_today, quota_remaining
+                   FROM sms_rate_limit WHERE id = 1''').fetchone()
+
+            now = time.time()
+            today = date.today().isoformat()
+            if day != today:
+                day, sent_today, quota_remaining = today, 0, None
+
+            tokens = min(self.burst, tokens + max(now - updated_at, 0) * current_rate)
+
+            if (self.daily_quota and sent_today >= self.daily_quota) or quota_remaining == 0:
+                acquired, wait = False, None
+            elif tokens >= 1:
+                tokens -= 1
+                sent_today += 1
+                acquired, wait = True, 0
+            else:
+                acquired, wait = False, (1 - tokens) / current_rate
+
+            conn.execute('''UPDATE sms_rate_limit
+                            SET tokens = ?, updated_at = ?, day = ?, sent_today = ?, quota_remaining = ?
+                            WHERE id = 1''',
+                         (tokens, now, day, sent_today, quota_remaining))
+            conn.execute('COMMIT')
+            return acquired, wait
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def acquire(self, timeout=None):
+        """Block until a send slot is free. Returns False on quota exhaustion or timeout."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            acquired, wait = self.try_acquire()
+            if acquired:
+                return True
+            if wait is None:
+                return False
+            if deadline is not None and time.time() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def record(self, success, latency, quota_remaining=None, rate_limited=False):
+        """Feed back the outcome of a send so the refill rate can adapt"""
+        conn = self.connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            current_rate, last_decrease_at, error_ewma, latency_ewma = conn.execute(
+                '''SELECT current_rate, last_decrease_at, error_ewma, latency_ewma
+                   FROM sms_rate_limit WHERE id = 1''').fetchone()
+
+            now = time.time()
+            error_ewma = 0.8 * error_ewma + 0.2 * (0 if success else 1)
+            latency_ewma = 0.8 * latency_ewma + 0.2 * latency
+
+            overloaded = (rate_limited or error_ewma > self.error_threshold
+                          or latency_ewma > self.latency_target)
+            if overloaded:
+                # Multiplicative decrease, at most once per cooldown so a burst
+                # of concurrent failures does not collapse the rate to the floor
+                if now - last_decrease_at >= self.cooldown:
+                    current_rate = max(self.min_rate, current_rate * self.decrease_factor)
+                    last_decrease_at = now
+            else:
+                current_rate = min(self.max_rate, current_rate + self.increase_step)
+
+            if quota_remaining is not None:
+                conn.execute('UPDATE sms_rate_limit SET quota_remaining = ? WHERE id = 1',
+                             (int(quota_remaining),))
+            conn.execute('''UPDATE sms_rate_limit
+                            SET current_rate = ?, last_decrease_at = ?, error_ewma = ?, latency_ewma = ?
+                            WHERE id = 1''',
+                         (current_rate, last_decrease_at, error_ewma, latency_ewma))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def quota_exhausted(self):
+        """Whether today's daily or provider quota is used up"""
+        status = self.status()
+        if status['day'] != date.today().isoformat():
+            return False
+        return bool((self.daily_quota and status['sent_today'] >= self.daily_quota)
+                    or status['provider_quota_remaining'] == 0)
+
+    def status(self):
+        """Current limiter state, for debugging endpoints"""
+        conn = self.connect()
+        try:
+            row = conn.execute('''SELECT tokens, current_rate, day, sent_today, quota_remaining,
+                                         error_ewma, latency_ewma
+                                  FROM sms_rate_limit WHERE id = 1''').fetchone()
+        finally:
+            conn.close()
+        tokens, current_rate, day, sent_today, quota_remaining, error_ewma, latency_ewma = row
+        return {
+            'max_rate': self.max_rate,
+            'current_rate': round(current_rate, 3),
+            'burst': self.burst,
+            'tokens': round(tokens, 3),
+            'daily_quota': self.daily_quota or None,
+            'day': day,
+            'sent_today': sent_today,
+            'provider_quota_remaining': quota_remaining,
+            'error_rate': round(error_ewma, 3),
+            'latency_ms': round(latency_ewma * 1000, 1)
+        }
+
+
+def get_sms_limiter():
+    """Build the shared limiter from SMS_RATE_* settings (None when SMS_RATE_PER_SEC=0)"""
+    rate = float(os.getenv('SMS_RATE_PER_SEC', '5'))
+    if rate <= 0:
+        return None
+
+    return SMSRateLimiter(
+        db_path=os.getenv('SMS_LIMITER_DB', 'sms_limiter.db'),
+        rate=rate,
+        burst=float(os.getenv('SMS_BURST', '10')),
+        daily_quota=int(os.getenv('SMS_DAILY_QUOTA', '0')),
+        min_rate=float(os.getenv('SMS_MIN_RATE', '0.2')),
+        latency_target_ms=float(os.getenv('SMS_LATENCY_TARGET_MS', '2000')),
+    )
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Materialized daily rollups of survey activity.
+
+One row per calendar day in daily_rollups holds:
+- surveys sent (survey tokens minted) and responses received;
+- distinct responders and the response rate;
+- a 1-10 score histogram per dimension;
+- a histogram of how long people took to reply after their survey went out.
+
+Reports read these rows instead of scanning responses. Their cost grows
+with the number of days, not the number of responses.
+
+update_rollups() only processes the days after the stored watermark (plus
+a small lookback for late writes) and stops at yesterday, since today is
+still filling up. backfill() rebuilds any range from scratch. Both are
+idempotent. Days whose responses were moved to cold storage (archive.py)
+are never recomputed: their stored rollups are final.
+
+    python rollups.py backfill [--start 2025-01-01] [--end 2025-06-30]
+    python rollups.py update
+    python rollups.py export rollups.csv [--start ...] [--end ...]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+from datetime import date, timedelta
+
+DIMENSIONS = (('joy', 'joy'), ('achievement', 'achievement'), ('meaning', 'meaningfulness'))
+
+# Upper bounds (minutes) of the reply-delay buckets; the last bucket is open-ended
+DELAY_BUCKETS = ((5, '<5m'), (15, '5-15m'), (60, '15-60m'), (180, '1-3h'), (720, '3-12h'), (1440, '12-24h'))
+DELAY_LABELS = [label for _, label in DELAY_BUCKETS] + ['24h+', 'unknown']
+
+WATERMARK = 'daily_rollups'
+# Days up to this watermark were moved to cold storage (archive.py): their rollups are final
+ARCHIVE_WATERMARK = 'archived_responses'
+
+EXPORT_COLUMNS = ['day', 'surveys_sent', 'responses', 'responders', 'response_rate',
+                  'joy_mean', 'achievement_mean', 'meaning_mean', 'median_delay_bucket']
+
+
+def init_rollups(cursor):
+    """Create the rollup and watermark tables (called from init_db)"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS daily_rollups (
+        day TEXT PRIMARY KEY,
+        surveys_sent INTEGER NOT NULL DEFAULT 0,
+        responses INTEGER NOT NULL DEFAULT 0,
+        responders INTEGER NOT NULL DEFAULT 0,
+        joy_hist TEXT NOT NULL,
+        achievement_hist TEXT NOT NULL,
+        meaning_hist TEXT NOT NULL,
+        delay_hist TEXT NOT NULL,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS rollup_watermarks (
+        name TEXT PRIMARY KEY,
+        watermark TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    # Finds the survey a reply answers, and counts surveys sent per day
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_survey_tokens_user_created
+                      ON survey_tokens (user_id, created_at)''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_survey_tokens_created ON survey_tokens (created_at)')
+
+
+def delay_label(minutes):
+    if minutes is None or minutes < 0:
+        return 'unknown'
+    for bound, label in DELAY_BUCKETS:
+        if minutes < bound:
+            return label
+    return '24h+'
+
+
+def compute_day(conn, day):
+    """Aggregate one calendar day ('YYYY-MM-DD') straight from the source tables"""
+    start, end = day, (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+    surveys_sent = conn.execute('SELECT COUNT(*) FROM survey_tokens WHERE created_at >= ? AND created_at < ?',
+                                (start, end)).fetchone()[0]
+
+    hists = {label: [0] * 10 for label, _ in DIMENSIONS}
+    delays = dict.fromkeys(DELAY_LABELS, 0)
+    responders = set()
+    rows = conn.execute('''
+        SELECT r.user_id, r.joy, r.achievement, r.meaningfulness,
+               (julianday(r.date) - julianday((
+                   SELECT MAX(st.created_at) FROM survey_tokens st
+                   WHERE st.user_id = r.user_id AND st.created_at <= r.date
+               ))) * 1440 AS delay_minutes
+        FROM responses r
+        WHERE r.date >= ? AND r.date < ?
+    ''', (start, end))
+    count = 0
+    for user_id, *scores, delay in rows:
+        count += 1
+        responders.add(user_id)
+        for (label, _), score in zip(DIMENSIONS, scores):
+            if score is not None and 1 <= score <= 10:
+                hists[label][score - 1] += 1
+        delays[delay_label(delay)] += 1
+
+    return {
+        'day': day,
+        'surveys_sent': surveys_sent,
+        'responses': count,
+        'responders': len(responders),
+        'joy_hist': hists['joy'],
+        'achievement_hist': hists['achievement'],
+        'meaning_hist': hists['meaning'],
+        'delay_hist': delays,
+    }
+
+
+def store_day(conn, rollup):
+    conn.execute('''INSERT OR REPLACE INTO daily_rollups
+                    (day, surveys_sent, responses, responders, joy_hist, achievement_hist,
+                     meaning_hist, delay_hist, computed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)''',
+                 (rollup['day'], rollup['surveys_sent'], rollup['responses'], rollup['responders'],
+                  json.dumps(rollup['joy_hist']), json.dumps(rollup['achievement_hist']),
+                  json.dumps(rollup['meaning_hist']), json.dumps(rollup['delay_hist'])))
+
+
+def get_watermark(conn, name=WATERMARK):
+    row = conn.execute('SELECT watermark FROM rollup_watermarks WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(conn, day, name=WATERMARK):
+    conn.execute('''INSERT INTO rollup_watermarks (name, watermark) VALUES (?, ?)
+                    ON CONFLICT(name) DO UPDATE SET watermark = excluded.watermark,
+                                                    updated_at = CURRENT_TIMESTAMP''', (name, day))
+
+
+def first_activity_day(conn):
+    row = conn.execute('''SELECT MIN(day) FROM (
+                              SELECT MIN(substr(date, 1, 10)) AS day FROM responses
+                              UNION ALL
+                              SELECT MIN(substr(created_at, 1, 10)) FROM survey_tokens
+                          )''').fetchone()
+    return row[0]
+
+
+def rollup_range(conn, start, end):
+    """Recompute and store every day from start to end inclusive, except archived ones; returns the day count"""
+    day, last, processed = date.fromisoformat(start), date.fromisoformat(end), 0
+    archived = get_watermark(conn, ARCHIVE_WATERMARK)
+    if archived:
+        day = max(day, date.fromisoformat(archived) + timedelta(days=1))
+    while day <= last:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            store_day(conn, compute_day(conn, day.isoformat()))
+            if day.isoformat() > (get_watermark(conn) or ''):
+                set_watermark(conn, day.isoformat())
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        processed += 1
+        day += timedelta(days=1)
+    return processed
+
+
+def connect(db_path):
+    return sqlite3.connect(db_path, timeout=30, isolation_level=None, uri=True)
+
+
+def update_rollups(db_path, today=None, lookback=1):
+    """Roll up completed days after the watermark.
+
+    The last `lookback` days up to the watermark are recomputed too, to pick
+    up responses written just after midnight with an earlier timestamp.
+    """
+    today = today or date.today()
+    yesterday = (today - timedelta(days=1)).isoformat()
+    conn = connect(db_path)
+    try:
+        watermark = get_watermark(conn)
+        if watermark:
+            start = (date.fromisoformat(watermark) + timedelta(days=1 - lookback)).isoformat()
+        else:
+            start = first_activity_day(conn)
+        if not start or start > yesterday:
+            return 0
+        return rollup_range(conn, start, yesterday)
+    finally:
+        conn.close()
+
+
+def backfill(db_path, start=None, end=None, today=None):
+    """Rebuild rollups for a range (default: first activity through yesterday)"""
+    today = today or date.today()
+    conn = connect(db_path)
+    try:
+        start = start or first_activity_day(conn)
+        end = end or (today - timedelta(days=1)).isoformat()
+        if not start or start > end:
+            return 0
+        return rollup_range(conn, start, end)
+    finally:
+        conn.close()
+
+
+def histogram_mean(hist):
+    total = sum(hist)
+    return sum((score + 1) * n for score, n in enumerate(hist)) / total if total else None
+
+
+def median_bucket(delays):
+    """Bucket holding the median reply delay, ignoring unknown delays"""
+    known = [(label, delays.get(label, 0)) for label in DELAY_LABELS if label != 'unknown']
+    total = sum(n for _, n in known)
+    seen = 0
+    for label, n in known:
+        seen += n
+        if total and seen * 2 >= total:
+            return label
+    return None
+
+
+def load_rollups(conn, start=None, end=None):
+    """Stored rollups for a day range, oldest first, with derived rates and means"""
+    rows = conn.execute('''SELECT day, surveys_sent, responses, responders, joy_hist, achievement_hist,
+                                  meaning_hist, delay_hist
+                           FROM daily_rollups
+                           WHERE day >= ? AND day <= ?
+                           ORDER BY day''', (start or '0000-00-00', end or '9999-99-99')).fetchall()
+    rollups = []
+    for day, surveys_sent, responses, responders, *hists in rows:
+        entry = {
+            'day': day,
+            'surveys_sent': surveys_sent,
+            'responses': responses,
+            'responders': responders,
+            'response_rate': round(responders / surveys_sent, 4) if surveys_sent else None,
+        }
+        for (label, _), hist in zip(DIMENSIONS, hists[:3]):
+            entry[f'{label}_hist'] = json.loads(hist)
+            mean = histogram_mean(entry[f'{label}_hist'])
+            entry[f'{label}_mean'] = round(mean, 2) if mean is not None else None
+        entry['delay_hist'] = json.loads(hists[3])
+        entry['median_delay_bucket'] = median_bucket(entry['delay_hist'])
+        rollups.append(entry)
+    return rollups
+
+
+def write_csv(rollups, out):
+    writer = csv.writer(out)
+    writer.writerow(EXPORT_COLUMNS + [f'delay_{label}' for label in DELAY_LABELS])
+    for entry in rollups:
+        writer.writerow([entry[column] for column in EXPORT_COLUMNS] +
+                        [entry['delay_hist'].get(label, 0) for label in DELAY_LABELS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'survey.db'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    fill = commands.add_parser('backfill', help='Rebuild rollups for a date range')
+    fill.add_argument('--start')
+    fill.add_argument('--end')
+    commands.add_parser('update', help='Roll up new days since the watermark')
+    export = commands.add_parser('export', help='Write rollups as CSV')
+    export.add_argument('output')
+    export.add_argument('--start')
+    export.add_argument('--end')
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        print(f"✅ Rolled up {backfill(args.db, args.start, args.end)} days")
+    elif args.command == 'update':
+        print(f"✅ Rolled up {update_rollups(args.db)} days")
+    else:
+        conn = connect(args.db)
+        try:
+            rollups = load_rollups(conn, args.start, args.end)
+        finally:
+            conn.close()
+        with open(args.output, 'w', newline='') as f:
+            write_csv(rollups, f)
+        print(f"📊 Exported {len(rollups)} days to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Full-text search over the free-text `influence` comments.
+
+responses_fts is an external-content FTS5 index over responses.influence:
+it stores only the inverted index, keyed by the response id, and triggers
+on responses keep it in sync on insert, update and delete. A database
+that predates the index is backfilled once when it is created.
+
+search() ranks matches by bm25 and joins back to responses for the
+user, date and score filters. term_summary() counts, per week and cohort,
+how many comments use each term, splitting words the way the index's
+unicode61 tokenizer does, so every listed term is searchable as is. The
+week's comments are found through the date index: an fts5vocab scan
+would read the instance list of the whole index, however narrow the
+week (138ms against 19ms for a 3,360-comment week out of 300k).
+Summaries of completed weeks are stored in analytics_snapshots after the
+first request; only the current week is counted live. Stored summaries are
+dropped with forget_term_summaries() when the rows or cohorts behind them
+change: enrollments, deleted users and restored archive months.
+
+Cohorts are campaigns (see campaigns.py): the default campaign stands for
+users who are not enrolled anywhere else.
+"""
+
+import logging
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from analytics import load_snapshot, save_snapshot
+from campaigns import DEFAULT_CAMPAIGN_ID
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 200
+MAX_WEEKS = 12
+
+# Too common to say anything about a week
+STOPWORDS = frozenset('''a about after all am an and any are as at be been but by can did do for from
+    got had has have i im in is it its just me my no not of on or our out so that the them then there
+    they this to too up us was we were what when with you your'''.split())
+
+_QUERY_TOKEN = re.compile(r'"([^"]+)"|(\w+\*?)', re.UNICODE)
+_WORD = re.compile(r'[^\W_]+')  # unicode61 token characters: letters and digits
+
+
+def init_search(cursor):
+    """Create the FTS index and the triggers that keep it in sync (called from init_db)"""
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'responses_fts'").fetchone()
+    try:
+        cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS responses_fts USING fts5(
+            influence, content='responses', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )''')
+    except sqlite3.OperationalError as e:
+        logger.warning("Full-text search disabled: %s", e)
+        return
+
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS responses_fts_insert AFTER INSERT ON responses BEGIN
+        INSERT INTO responses_fts (rowid, influence) VALUES (new.id, new.influence);
+    END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS responses_fts_delete AFTER DELETE ON responses BEGIN
+        INSERT INTO responses_fts (responses_fts, rowid, influence) VALUES ('delete', old.id, old.influence);
+    END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS responses_fts_update AFTER UPDATE OF influence ON responses BEGIN
+        INSERT INTO responses_fts (responses_fts, rowid, influence) VALUES ('delete', old.id, old.influence);
+        INSERT INTO responses_fts (rowid, influence) VALUES (new.id, new.influence);
+    END''')
+
+    if not exists:
+        cursor.execute("INSERT INTO responses_fts (responses_fts) VALUES ('rebuild')")
+
+
+def search_available(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'responses_fts'").fetchone() is not None
+
+
+def fts_query(text):
+    """FTS5 query for free text: every word (or "quoted phrase") must match; word* is a prefix"""
+    parts = []
+    for phrase, word in _QUERY_TOKEN.findall(text or ''):
+        if phrase:
+            words = re.findall(r'\w+', phrase)
+            if words:
+                parts.append('"' + ' '.join(words) + '"')
+        else:
+            parts.append(f'"{word.rstrip("*")}"' + ('*' if word.endswith('*') else ''))
+    return ' '.join(parts)
+
+
+def _day_after(day):
+    return (datetime.strptime(day, '%Y-%m-%d').date() + timedelta(days=1)).isoformat()
+
+
+def search(conn, text, user_id=None, start=None, end=None, min_score=None, max_score=None,
+           limit=50, offset=0):
+    """Ranked matches for text, filtered by user, date (inclusive) and average score.
+
+    Returns (results, has_more). Raises ValueError for an empty query.
+    """
+    query = fts_query(text)
+    if not query:
+        raise ValueError('Query has no searchable words')
+
+    where, params = ['responses_fts MATCH ?'], [query]
+    if user_id is not None:
+        where.append('r.user_id = ?')
+        params.append(user_id)
+    if start:
+        where.append('r.date >= ?')
+        params.append(start)
+    if end:
+        where.append('r.date < ?')
+        params.append(_day_after(end))
+    if min_score is not None:
+        where.append('(r.joy + r.achievement + r.meaningfulness) / 3.0 >= ?')
+        params.append(min_score)
+    if max_score is not None:
+        where.append('(r.joy + r.achievement + r.meaningfulness) / 3.0 <= ?')
+        params.append(max_score)
+
+    rows = conn.execute(f'''
+        SELECT r.id, r.user_id, r.date, r.joy, r.achievement, r.meaningfulness, r.influence,
+               snippet(responses_fts, 0, '[', ']', '...', 12), bm25(responses_fts)
+        FROM responses_fts JOIN responses r ON r.id = responses_fts.rowid
+        WHERE {' AND '.join(where)}
+        ORDER BY bm25(responses_fts)
+        LIMIT ? OFFSET ?
+    ''', (*params, limit + 1, offset)).fetchall()
+
+    results = [{'id': row[0], 'user_id': row[1], 'date': row[2], 'joy': row[3], 'achievement': row[4],
+                'meaning': row[5], 'influence': row[6], 'snippet': row[7], 'rank': round(row[8], 4)}
+               for row in rows[:limit]]
+    return results, len(rows) > limit
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def terms_of(text):
+    """Distinct index terms of a comment: lowercased, diacritics removed"""
+    text = text.lower()
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return set(_WORD.findall(text))
+
+
+def _count_terms(conn, week, campaign_id, limit):
+    """Responses per term in one week and cohort"""
+    start, end = week.isoformat(), (week + timedelta(days=7)).isoformat()
+    if campaign_id is None:
+        cohort, cohort_params = '', ()
+    elif campaign_id == DEFAULT_CAMPAIGN_ID:
+        cohort = 'AND NOT EXISTS (SELECT 1 FROM campaign_enrollments e WHERE e.user_id = r.user_id)'
+        cohort_params = ()
+    else:
+        cohort = 'AND r.user_id IN (SELECT user_id FROM campaign_enrollments WHERE campaign_id = ?)'
+        cohort_params = (campaign_id,)
+
+    counts, total = Counter(), 0
+    for (influence,) in conn.execute(f"""SELECT r.influence FROM responses r
+                                         WHERE r.date >= ? AND r.date < ? AND r.influence != '' {cohort}""",
+                                     (start, end, *cohort_params)):
+        counts.update(terms_of(influence))
+        total += 1
+    terms = [{'term': term, 'responses': n}
+             for term, n in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+             if term not in STOPWORDS and not term.isdigit()][:limit]
+    return total, terms
+
+
+def forget_term_summaries(conn, campaign_ids=None):
+    """Drop stored summaries of the given cohorts, or all of them (caller commits)"""
+    if campaign_ids is None:
+        conn.execute("DELETE FROM analytics_snapshots WHERE name LIKE 'terms:%'")
+        return
+    conn.executemany("DELETE FROM analytics_snapshots WHERE name LIKE ?",
+                     ((f'terms:%:{campaign_id}:%',) for campaign_id in campaign_ids))
+
+
+def term_summary(conn, week, campaign_id=None, limit=20, today=None):
+    """Most used terms in one week (a date inside it) for a cohort (None = everyone)"""
+    week = week_start(week)
+    complete = week + timedelta(days=7) <= (today or date.today())
+    name = f"terms:{week.isoformat()}:{campaign_id or 'all'}:{limit}"
+    if complete:
+        stored = load_snapshot(conn, name)
+        if stored:
+            return stored
+
+    start = time.perf_counter()
+    total, terms = _count_terms(conn, week, campaign_id, limit)
+    summary = {'week': week.isoformat(), 'campaign_id': campaign_id, 'responses': total, 'terms': terms,
+               'complete': complete, 'computed_at': datetime.now().isoformat(timespec='seconds'),
+               'compute_ms': round((time.perf_counter() - start) * 1000, 1)}
+    if complete:
+        save_snapshot(conn, summary, name=name)
+    return summary
@@ -0,0 +1,133 @@
+"""
+Short survey links.
+
+A long survey link is BASE_URL/survey/ plus a 43-character random token,
+which costs about 40 characters in every SMS. A short code packs the
+survey_tokens row id and a random secret into base62:
+
+    base62(id) + 8 random base62 characters    e.g. /s/4c92kQ7ZpXa
+
+The id finds the row through the integer primary key. The secret (47 bits)
+is then compared in constant time, so knowing or guessing ids is useless.
+Clients that keep presenting invalid tokens are locked out for a while by
+GuessLimiter, which keeps online guessing far below any useful rate.
+
+SURVEY_LINK_STYLE picks the format for new links: 'long' (default) or
+'short'. Both formats stay valid, so links already sent keep working.
+"""
+
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+SURVEY_LINK_STYLE = os.getenv('SURVEY_LINK_STYLE', 'long')
+SHORT_LINK_MAX_FAILURES = int(os.getenv('SHORT_LINK_MAX_FAILURES', '20'))
+SHORT_LINK_FAILURE_WINDOW = float(os.getenv('SHORT_LINK_FAILURE_WINDOW', '600'))  # seconds
+
+BASE62 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+_BASE62_INDEX = {c: i for i, c in enumerate(BASE62)}
+SECRET_CHARS = 8
+MAX_ID_CHARS = 11  # Enough for any SQLite rowid
+MAX_ROWID = 2 ** 63 - 1  # 11 base62 digits go past it, so decoded ids are checked too
+
+
+def encode_base62(number):
+    if number < 0:
+        raise ValueError("Only non-negative integers can be encoded")
+    digits = []
+    while True:
+        number, rem = divmod(number, 62)
+        digits.append(BASE62[rem])
+        if not number:
+            return ''.join(reversed(digits))
+
+
+def decode_base62(text):
+    number = 0
+    for c in text:
+        if c not in _BASE62_INDEX:
+            raise ValueError(f"Not a base62 string: {text!r}")
+        number = number * 62 + _BASE62_INDEX[c]
+    return number
+
+
+def make_short_code(token_id, secret=None):
+    """Short code for a survey_tokens row: base62 id followed by the secret"""
+    secret = secret or ''.join(secrets.choice(BASE62) for _ in range(SECRET_CHARS))
+    return encode_base62(token_id) + secret
+
+
+def parse_short_code(code):
+    """Row id of a short code, or None if the code can't be one"""
+    if not code or not SECRET_CHARS < len(code) <= SECRET_CHARS + MAX_ID_CHARS:
+        return None
+    try:
+        token_id = decode_base62(code[:-SECRET_CHARS])
+    except ValueError:
+        return None
+    return token_id if token_id <= MAX_ROWID else None
+
+
+def codes_match(stored, presented):
+    return hmac.compare_digest(stored.encode('utf-8'), presented.encode('utf-8'))
+
+
+def insert_short_token(conn, user_id, expires_at, run_id=None):
+    """Insert a survey token whose token is a short code; returns the code (caller commits)"""
+    # The code embeds the row id, so the row is written first with a unique placeholder
+    token_id = conn.execute('''INSERT INTO survey_tokens (token, user_id, expires_at, run_id)
+                               VALUES (?, ?, ?, ?) RETURNING id''',
+                            ('pending:' + secrets.token_hex(16), user_id, expires_at, run_id)).fetchone()[0]
+    code = make_short_code(token_id)
+    conn.execute('UPDATE survey_tokens SET token = ? WHERE id = ?', (code, token_id))
+    return code
+
+
+def survey_path(token):
+    """URL path of the survey page for a token of either format"""
+    return f"/s/{token}" if parse_short_code(token) is not None else f"/survey/{token}"
+
+
+class GuessLimiter:
+    """Per-worker count of invalid survey tokens per client, over a sliding window.
+
+    Each worker process counts on its own, so a client spreading guesses
+    over every worker gets up to max_failures * WEB_CONCURRENCY per window.
+    """
+
+    def __init__(self, max_failures=SHORT_LINK_MAX_FAILURES, window=SHORT_LINK_FAILURE_WINDOW, size=10000):
+        self.max_failures = max_failures
+        self.window = window
+        self.size = size
+        self.lock = threading.Lock()
+        self.failures = OrderedDict()  # client -> [window start, failures]
+
+    def blocked(self, client, now=None):
+        """True if the client used up its invalid-token budget in the current window"""
+        now = now or time.time()
+        with self.lock:
+            entry = self.failures.get(client)
+            if entry is None:
+                return False
+            if now - entry[0] > self.window:
+                del self.failures[client]
+                return False
+            return entry[1] >= self.max_failures
+
+    def record_failure(self, client, now=None):
+        now = now or time.time()
+        with self.lock:
+            entry = self.failures.get(client)
+            if entry is None or now - entry[0] > self.window:
+                entry = self.failures[client] = [now, 0]
+            entry[1] += 1
+            self.failures.move_to_end(client)
+            while len(self.failures) > self.size:
+                self.failures.popitem(last=False)
+
+    def reset(self):
+        with self.lock:
+            self.failures.clear()
@@ -0,0 +1,175 @@
+"""
+SMS provider implementations used by send_sms.
+
+Every provider exposes send(phone, message, **options) and returns a dict
+shaped like TextBelt's JSON reply: {'success', 'textId', 'error', 'quotaRemaining'}.
+"""
+
+import os
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class SMSProvider:
+    """Base class for outbound SMS providers"""
+
+    name = 'base'
+
+    def send(self, phone, message, reply_webhook_url=None, test_mode=False):
+        raise NotImplementedError
+
+
+class TextBeltProvider(SMSProvider):
+    """Send SMS through the TextBelt HTTP API"""
+
+    name = 'textbelt'
+
+    def __init__(self, api_key, url='https://textbelt.com/text', timeout=10):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        # requests.Session is not thread-safe, and outbox drains send from a thread pool
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            # requests is the slowest import in the app, so it waits for the first send
+            import requests
+            session = self._local.session = requests.Session()
+        return session
+
+    def send(self, phone, message, reply_webhook_url=None, test_mode=False):
+        payload = {
+            'phone': phone,
+            'message': message,
+            'key': self.api_key + '_test' if test_mode else self.api_key,
+        }
+        if reply_webhook_url:
+            payload['replyWebhookUrl'] = reply_webhook_url
+
+        response = self._session().post(self.url, payload, timeout=self.timeout)
+        return response.json()
+
+
+class FakeSMSProvider(SMSProvider):
+    """In-process stand-in for TextBelt with simulated latency, failures and rate limits.
+
+    latency_ms is a (min, max) range slept per send, failure_rate is the
+    probability of a provider error, rate_limit caps sends per second (0 = off)
+    and quota caps the total number of successful sends (None = unlimited).
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency_ms=(50, 150), failure_rate=0.0, rate_limit=0,
+                 quota=None, seed=None, keep_messages=1000):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.quota = quota
+        self.keep_messages = keep_messages
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sent = []
+        self.stats = {'attempted': 0, 'sent': 0, 'failed': 0, 'rate_limited': 0}
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def send(self, phone, message, reply_webhook_url=None, test_mode=False):
+        with self.lock:
+            self.stats['attempted'] += 1
+            low, high = self.latency_ms
+            latency = self.random.uniform(low, high) / 1000.0
+            fail = self.random.random() < self.failure_rate
+
+            if self.rate_limit:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start = now
+                    self._window_count = 0
+                self._window_count += 1
+                if self._window_count > self.rate_limit:
+                    self.stats['rate_limited'] += 1
+                    return {'success': False, 'error': 'Rate limit exceeded',
+                            'quotaRemaining': self._quota_remaining()}
+
+        time.sleep(latency)
+
+        with self.lock:
+            if self.quota is not None and self.stats['sent'] >= self.quota:
+                self.stats['failed'] += 1
+                return {'success': False, 'error': 'Out of quota', 'quotaRemaining': 0}
+            if fail:
+                self.stats['failed'] += 1
+                return {'success': False, 'error': 'Simulated provider failure',
+                        'quotaRemaining': self._quota_remaining()}
+
+            self.stats['sent'] += 1
+            text_id = uuid.uuid4().hex[:12]
+            self.sent.append({'phone': phone, 'message': message, 'textId': text_id})
+            if len(self.sent) > self.keep_messages:
+                del self.sent[:len(self.sent) - self.keep_messages]
+            return {'success': True, 'textId': text_id,
+                    'quotaRemaining': self._quota_remaining()}
+
+    def _quota_remaining(self):
+        if self.quota is None:
+            return 999999
+        return max(self.quota - self.stats['sent'], 0)
+
+
+def serve_fake_provider(provider=None, host='127.0.0.1', port=0):
+    """Serve a FakeSMSProvider over HTTP using TextBelt's form-encoded API.
+
+    Point TextBeltProvider (or TEXTBELT_URL) at the returned server's /text URL
+    to exercise the real HTTP client path without network access. Returns the
+    server; call server.shutdown() when done.
+    """
+    provider = provider or FakeSMSProvider()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            form = parse_qs(self.rfile.read(length).decode('utf-8'))
+            result = provider.send(form.get('phone', [''])[0],
+                                   form.get('message', [''])[0],
+                                   reply_webhook_url=form.get('replyWebhookUrl', [None])[0])
+            body = json.dumps(result).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.provider = provider
+    server.url = f"http://{host}:{server.server_address[1]}/text"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_sms_provider():
+    """Build the provider selected by SMS_PROVIDER ('textbelt' or 'fake')"""
+    provider_name = os.getenv('SMS_PROVIDER', 'textbelt').lower()
+
+    if provider_name == 'fake':
+        return FakeSMSProvider(
+            latency_ms=(float(os.getenv('FAKE_SMS_MIN_LATENCY_MS', '50')),
+                        float(os.getenv('FAKE_SMS_MAX_LATENCY_MS', '150'))),
+            failure_rate=float(os.getenv('FAKE_SMS_FAILURE_RATE', '0')),
+            rate_limit=int(os.getenv('FAKE_SMS_RATE_LIMIT', '0')),
+        )
+
+    return TextBeltProvider(
+        api_key=os.getenv('TEXTBELT_API_KEY', 'textbelt'),
+        url=os.getenv('TEXTBELT_URL', 'https://textbelt.com/text'),
+    )
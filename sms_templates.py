@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+SMS message templates with encoding and segment accounting.
+
+A message that only uses the GSM-7 alphabet is billed per 160 characters
+(153 per part once it is split). A single emoji, bullet or curly quote
+switches the whole message to UCS-2: 70 characters per segment, 67 per
+part, and emoji count twice. The survey texts with 🌟 and 💙 cost about
+twice as many segments as the same words in GSM-7.
+
+Every template has a GSM-7 variant, derived with gsm_safe() unless written
+by hand. SMS_TEMPLATE_STYLE picks which one is sent: 'gsm' (default, the
+emoji are dropped) or 'unicode'. Segment budgets are set per style.
+Templates are parsed once at import, and each render reports its encoding
+and segment count.
+
+    python sms_templates.py report            # segments per template, unicode vs gsm
+    python sms_templates.py check --style unicode  # exit 1 if a template exceeds its budget
+    python sms_templates.py check --budget 2  # same, with one budget for every template
+    python sms_templates.py --short-links report  # with short survey links
+"""
+
+import argparse
+import os
+import sys
+import time
+from string import Formatter
+
+SMS_TEMPLATE_STYLE = os.getenv('SMS_TEMPLATE_STYLE', 'gsm')
+STYLES = ('gsm', 'unicode')
+
+# GSM 03.38 default alphabet (without the escape character) and its extension table
+GSM7_BASIC = set("@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+                 "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà")
+GSM7_EXTENDED = set("^{}\\[~]|€\f")  # Two septets each
+
+# (single message, per part of a concatenated message) capacity in units
+LIMITS = {'GSM-7': (160, 153), 'UCS-2': (70, 67)}
+
+# Common non-GSM characters and their closest GSM-7 spelling
+GSM_REPLACEMENTS = {
+    '•': '-', '·': '-', '–': '-', '—': '-', '‘': "'", '’': "'", '“': '"', '”': '"',
+    '…': '...', ' ': ' ', '\t': ' ', '✓': 'OK',
+}
+
+
+def is_gsm7(text):
+    return all(c in GSM7_BASIC or c in GSM7_EXTENDED for c in text)
+
+
+def segment_info(text):
+    """Encoding, length in encoding units and billed segments of a message"""
+    if is_gsm7(text):
+        encoding = 'GSM-7'
+        sizes = [2 if c in GSM7_EXTENDED else 1 for c in text]
+    else:
+        encoding = 'UCS-2'
+        sizes = [2 if ord(c) > 0xFFFF else 1 for c in text]  # Astral characters are surrogate pairs
+
+    single, part = LIMITS[encoding]
+    units = sum(sizes)
+    if units <= single:
+        segments = 1 if text else 0
+    else:
+        # Escape sequences and surrogate pairs are never split across parts
+        segments, used = 1, 0
+        for size in sizes:
+            if used + size > part:
+                segments, used = segments + 1, 0
+            used += size
+    return {'encoding': encoding, 'chars': len(text), 'units': units, 'segments': segments}
+
+
+def gsm_safe(text):
+    """Rewrite text into the GSM-7 alphabet: replace what has an equivalent, drop the rest (emoji)"""
+    out = ''.join(GSM_REPLACEMENTS.get(c, c) for c in text)
+    out = ''.join(c for c in out if c in GSM7_BASIC or c in GSM7_EXTENDED)
+    # Dropped emoji leave stray spaces at line edges and between words
+    return '\n'.join(' '.join(filter(None, line.split(' '))) for line in out.split('\n'))
+
+
+class SMSTemplate:
+    """A message template parsed once, with unicode and GSM-7 variants and a segment budget.
+
+    max_segments is one budget for both styles or a {style: budget} dict.
+    """
+
+    def __init__(self, name, text, gsm_text=None, max_segments=None):
+        self.name = name
+        self.max_segments = max_segments if isinstance(max_segments, dict) else dict.fromkeys(STYLES, max_segments)
+        self.variants = {'unicode': text, 'gsm': gsm_text if gsm_text is not None else gsm_safe(text)}
+        self.parts = {style: self._compile(variant) for style, variant in self.variants.items()}
+        self.fields = sorted({field for _, field in self.parts['unicode'] if field})
+        if not is_gsm7(self.variants['gsm']):
+            raise ValueError(f"GSM variant of template {name!r} has non-GSM characters")
+
+    def _compile(self, text):
+        parts = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if spec or conversion:
+                raise ValueError(f"Template {self.name!r}: format specs are not supported ({{{field}}})")
+            parts.append((literal, field))
+        return parts
+
+    def budget(self, style=None):
+        """Segment budget for a style (None = unlimited)"""
+        return self.max_segments.get(style or SMS_TEMPLATE_STYLE)
+
+    def render(self, style=None, **values):
+        """Render with the given field values; returns text plus its encoding and segment count"""
+        style = style or SMS_TEMPLATE_STYLE
+        text = ''.join(literal + (str(values[field]) if field else '') for literal, field in self.parts[style])
+        info = segment_info(text)
+        budget = self.budget(style)
+        info.update(text=text, template=self.name, style=style,
+                    over_budget=bool(budget and info['segments'] > budget))
+        return info
+
+
+SURVEY_DAILY = SMSTemplate('survey_daily', """{greeting}
+
+Time for your daily wellbeing check-in! 🌟
+
+Please rate your day (1-10):
+• Joy & Happiness
+• Achievement & Progress
+• Meaning & Purpose
+
+Click here: {survey_url}
+
+Takes just 30 seconds. Thank you! 💙""", max_segments={'gsm': 2, 'unicode': 5})
+
+SURVEY_WEEKLY = SMSTemplate('survey_weekly', """{greeting}
+
+🎉 Week {week} complete! Time for today's check-in + your weekly insights!
+
+Today's survey: {survey_url}
+
+📊 View your week's wellbeing report: {report_url}
+
+See your progress and insights! 💙""", max_segments={'gsm': 3, 'unicode': 6})
+
+FEEDBACK_LINK = SMSTemplate('feedback_link', """📊 Your Wellbeing Report is ready!
+
+View your personalized insights and progress:
+{report_url}
+
+See how you're doing across Joy, Achievement, and Meaning. 💙""", max_segments={'gsm': 2, 'unicode': 4})
+
+TEMPLATES = {template.name: template for template in (SURVEY_DAILY, SURVEY_WEEKLY, FEEDBACK_LINK)}
+
+
+def sample_values(base_url=None, short_links=False):
+    """Realistic worst-case field values: production URL, full-length token, two-digit week"""
+    base_url = base_url or os.getenv('BASE_URL', 'https://sms-survey-prototype-production.up.railway.app')
+    # A short code for row id ~10M is 4 + 8 characters
+    survey_path = f"/s/{'x' * 12}" if short_links else f"/survey/{'x' * 43}"
+    return {
+        'greeting': 'Hi!',
+        'survey_url': base_url + survey_path,
+        'report_url': f"{base_url}/feedback/100000",
+        'week': 52,
+    }
+
+
+def check_templates(templates=None, style=None, budget=None, values=None):
+    """Templates whose sample render exceeds their budget (or `budget`): [(name, segments, limit)]"""
+    values = values or sample_values()
+    failures = []
+    for template in (templates or TEMPLATES.values()):
+        limit = budget or template.budget(style)
+        rendered = template.render(style, **values)
+        if limit and rendered['segments'] > limit:
+            failures.append((template.name, rendered['segments'], limit))
+    return failures
+
+
+def report(values=None, renders=2000):
+    """Per template: segments in each style and the render cost"""
+    values = values or sample_values()
+    rows = []
+    for template in TEMPLATES.values():
+        row = {'template': template.name, 'budget': dict(template.max_segments)}
+        for style in STYLES:
+            rendered = template.render(style, **values)
+            start = time.perf_counter()
+            for _ in range(renders):
+                template.render(style, **values)
+            row[style] = {key: rendered[key] for key in ('encoding', 'chars', 'units', 'segments')}
+            row[style]['render_us'] = round((time.perf_counter() - start) / renders * 1e6, 1)
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--base-url', help='BASE_URL to size links with')
+    parser.add_argument('--short-links', action='store_true',
+                        default=os.getenv('SURVEY_LINK_STYLE', 'long') == 'short',
+                        help='Size survey links as short codes (SURVEY_LINK_STYLE=short)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('report', help='Compare segments per template in both styles')
+    check = commands.add_parser('check', help='Fail if a template exceeds its segment budget')
+    check.add_argument('--style', choices=STYLES, default=SMS_TEMPLATE_STYLE)
+    check.add_argument('--budget', type=int, help='Override every template budget')
+    args = parser.parse_args()
+    values = sample_values(args.base_url, args.short_links)
+
+    if args.command == 'report':
+        rows = report(values)
+        print(f"{'template':<16}{'unicode':>18}{'gsm':>18}{'saved':>8}")
+        for row in rows:
+            uni, gsm = row['unicode'], row['gsm']
+            print(f"{row['template']:<16}{uni['segments']:>4} seg {uni['encoding']:>5} {uni['units']:>3}u"
+                  f"{gsm['segments']:>4} seg {gsm['encoding']:>5} {gsm['units']:>3}u"
+                  f"{uni['segments'] - gsm['segments']:>8}")
+        total_uni = sum(row['unicode']['segments'] for row in rows)
+        total_gsm = sum(row['gsm']['segments'] for row in rows)
+        print(f"\n📉 {total_uni} -> {total_gsm} segments for one of each message "
+              f"({(1 - total_gsm / total_uni) * 100:.0f}% fewer)")
+    else:
+        failures = check_templates(style=args.style, budget=args.budget, values=values)
+        for name, segments, limit in failures:
+            print(f"❌ {name}: {segments} segments ({args.style}), budget {limit}")
+        if failures:
+            sys.exit(1)
+        print(f"✅ All templates within budget ({args.style})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Small helpers shared by the app and the command-line tools: survey tokens,
+TextBelt webhook signatures and display timezones.
+
+Nothing here touches Flask or the database, so importing it is cheap.
+"""
+
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+from datetime import datetime
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+# Signed webhooks older than this are rejected
+WEBHOOK_MAX_AGE_SECONDS = 900
+
+
+def generate_survey_token():
+    """Generate a unique survey token"""
+    return secrets.token_urlsafe(32)
+
+
+def sign_textbelt_webhook(api_key, timestamp, payload):
+    """TextBelt webhook signature: HMAC-SHA256 of timestamp + body, keyed by the API key"""
+    message = str(timestamp) + payload
+    return hmac.new(api_key.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def verify_textbelt_webhook(api_key, timestamp, signature, payload):
+    """Verify TextBelt webhook signature"""
+    try:
+        # Check timestamp is not more than 15 minutes old
+        current_time = int(time.time())
+        webhook_time = int(timestamp)
+        if abs(current_time - webhook_time) > WEBHOOK_MAX_AGE_SECONDS:
+            logger.warning("Webhook timestamp too old: %d seconds", abs(current_time - webhook_time))
+            return False
+
+        expected_signature = sign_textbelt_webhook(api_key, timestamp, payload)
+
+        # Compare signatures
+        return hmac.compare_digest(signature, expected_signature)
+    except Exception as e:
+        logger.warning("Signature verification error: %s", e)
+        return False
+
+
+def convert_utc_to_eastern(utc_timestamp_str):
+    """Convert UTC timestamp string to Eastern Time"""
+    try:
+        # Parse the UTC timestamp
+        utc_dt = datetime.strptime(utc_timestamp_str, '%Y-%m-%d %H:%M:%S')
+
+        # Set UTC timezone
+        utc_dt = utc_dt.replace(tzinfo=pytz.UTC)
+
+        # Convert to Eastern Time
+        eastern = pytz.timezone('US/Eastern')
+        eastern_dt = utc_dt.astimezone(eastern)
+
+        # Return formatted string with 12-hour format
+        return eastern_dt.strftime('%Y-%m-%d %I:%M:%S %p %Z')
+    except Exception as e:
+        logger.warning("Error converting timestamp: %s", e)
+        return utc_timestamp_str
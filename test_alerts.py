@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script to verify incremental wellbeing state, alert rules, the alert queue and its admin routes
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import alerts
+from conftest import seed_survey_db
+
+
+def response(response_id, joy, achievement, meaning, date):
+    return {'id': response_id, 'joy': joy, 'achievement': achievement, 'meaning': meaning, 'date': date}
+
+
+def run_rules(state, responses):
+    raised = []
+    for r in responses:
+        alerts.advance(state, r)
+        raised.extend(rule for rule_fn in alerts.RULES for rule, _, _ in rule_fn(state))
+    return raised
+
+
+def test_low_streak_rule():
+    """A streak alert fires when it reaches its length, and again only after a break"""
+    state = alerts.empty_state(1)
+    days = [response(i, joy, 6, 6, f'2025-03-0{i} 12:00:00') for i, joy in enumerate([3, 2, 4, 1, 8, 2, 3, 3], 1)]
+    assert run_rules(state, days[:3]) == ['low_joy_streak']
+    assert run_rules(state, days[3:5]) == []
+    assert run_rules(state, days[5:]) == ['low_joy_streak']
+    assert state['joy_streak'] == 3 and state['achievement_streak'] == 0
+
+
+def test_week_drop_rule():
+    """A sharp drop against the week right before is raised once; gaps reset the comparison"""
+    state = alerts.empty_state(1)
+    good_week = [response(1, 8, 8, 8, '2025-03-03 12:00:00'), response(2, 9, 8, 7, '2025-03-05 12:00:00')]
+    bad_week = [response(3, 5, 5, 5, '2025-03-10 12:00:00'), response(4, 5, 6, 5, '2025-03-11 12:00:00'),
+                response(5, 5, 5, 5, '2025-03-12 12:00:00')]
+    assert run_rules(state, good_week) == []
+    assert run_rules(state, bad_week[:1]) == []  # One reply is not a week
+    assert run_rules(state, bad_week[1:]) == ['week_drop']
+    assert state['drop_alerted_week'] == '2025-03-10'
+
+    later = alerts.empty_state(2)
+    run_rules(later, good_week)
+    assert run_rules(later, [response(3, 5, 5, 5, '2025-03-17 12:00:00'),
+                             response(4, 5, 5, 5, '2025-03-18 12:00:00')]) == []  # Skipped a week
+
+
+def test_alerts_from_webhook_and_survey():
+    """Both ingestion paths update state and queue alerts the admin can acknowledge"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), ['+15555550101'])
+        client = app.app.test_client()
+        for text in ['2 6 6 rough', '3 6 7 tired']:
+            assert client.post('/sms_webhook', json={'fromNumber': '+15555550101', 'text': text}).status_code == 200
+        token = app.create_survey_token(1)
+        client.post(f'/survey/{token}', data={'joy': 1, 'achievement': 6, 'meaning': 6, 'influence': 'bad'})
+
+        state = alerts.load_state(conn, 1)
+        assert state['joy_streak'] == 3
+        assert state['last_response_id'] == conn.execute('SELECT MAX(id) FROM responses').fetchone()[0]
+
+        data = client.get('/admin/alerts.json').get_json()
+        assert [alert['rule'] for alert in data['alerts']] == ['low_joy_streak']
+        alert_id = data['alerts'][0]['id']
+        assert data['alerts'][0]['phone'] == '+15555550101'
+        assert b'low_joy_streak' in client.get('/admin/alerts').data
+
+        assert client.post(f'/admin/alerts/{alert_id}/ack').status_code == 200
+        assert client.post(f'/admin/alerts/{alert_id}/ack').status_code == 404
+        assert client.get('/admin/alerts.json').get_json()['alerts'] == []
+        assert len(client.get('/admin/alerts.json?status=all').get_json()['alerts']) == 1
+        assert len(client.get('/admin/alerts.json?status=all&limit=1').get_json()['alerts']) == 1
+        for bad in ('abc', '-1', '0'):
+            rejected = client.get(f'/admin/alerts.json?status=all&limit={bad}')
+            assert rejected.status_code == 400 and not rejected.get_json()['success']
+
+        # The same response is never folded in twice
+        assert alerts.observe(conn, 1, response(state['last_response_id'], 1, 1, 1, '2025-03-03 12:00:00')) == []
+
+        client.post('/delete_user/1')
+        assert conn.execute('SELECT COUNT(*) FROM alerts').fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM wellbeing_state').fetchone()[0] == 0
+        conn.close()
+
+
+def test_rebuild_replays_history_quietly():
+    """rebuild() derives state from stored responses without raising alerts"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), ['+15555550101'])
+        conn.executemany('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                            VALUES (1, ?, 5, 5, '', ?)''', [(2, '2025-03-03 12:00:00'), (2, '2025-03-04 12:00:00')])
+        conn.commit()
+
+        assert alerts.rebuild(conn) == 1
+        assert conn.execute('SELECT COUNT(*) FROM alerts').fetchone()[0] == 0
+        conn.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                        VALUES (1, 3, 5, 5, '', '2025-03-05 12:00:00')''')
+        raised = alerts.observe(conn, 1, response(3, 3, 5, 5, '2025-03-05 12:00:00'))
+        assert [alert['rule'] for alert in raised] == ['low_joy_streak']
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_low_streak_rule()
+    test_week_drop_rule()
+    test_alerts_from_webhook_and_survey()
+    test_rebuild_replays_history_quietly()
+    print("🎉 All alert tests passed!")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script to verify cohort analytics: trends, deltas, streaks and flourishing
+"""
+
+import sys
+import os
+import tempfile
+from datetime import date, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from analytics import compute_snapshot, histogram_median, longest_run, trailing_run
+from conftest import seed_survey_db
+
+TODAY = date(2025, 3, 15)
+
+
+def seed(db_path):
+    """User 1 replies daily for 10 days with high scores; user 2 on alternate days with low scores"""
+    conn = seed_survey_db(db_path, ['+15555550101', '+15555550102'])
+    for day in range(10):
+        when = f'{TODAY - timedelta(days=day)} 12:00:00'
+        conn.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                        VALUES (1, 8, 9, ?, '', ?)''', (7 if day < 7 else 5, when))
+        if day % 2 == 0:
+            conn.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                            VALUES (2, 4, 5, 6, '', ?)''', (when,))
+    conn.commit()
+    return conn
+
+
+def test_histogram_helpers():
+    """Medians come straight from score counts and streaks from bitmasks"""
+    assert histogram_median({4: 1, 8: 1}) == 6
+    assert histogram_median({3: 2, 9: 1}) == 3
+    assert trailing_run(0b0111) == 3 and trailing_run(0b0110) == 0
+    assert longest_run(0b1110111101) == 4
+
+
+def test_compute_snapshot():
+    """Daily trends, week-over-week deltas, streaks and flourishing share"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed(os.path.join(tmp, 'survey.db'))
+        snapshot = compute_snapshot(conn, days=14, today=TODAY)
+        conn.close()
+        print(f"Snapshot: {snapshot['week_over_week']}, {snapshot['streaks']}, {snapshot['flourishing']}")
+
+        today = snapshot['daily'][-1]
+        assert today['day'] == TODAY.isoformat() and today['responses'] == 2
+        assert today['joy'] == {'mean': 6.0, 'median': 6.0}
+
+        # Meaning: user 1 goes from 5 to 7, user 2 stays at 6
+        assert snapshot['week_over_week']['meaning']['delta'] > 0
+        assert snapshot['streaks']['users_on_streak'] == 2
+        assert snapshot['streaks']['longest_current'] == 10
+        assert snapshot['streaks']['current_buckets']['7-13'] == 1
+
+        # Only user 1 averages 7+ this week, on all three dimensions
+        assert snapshot['flourishing']['users'] == 2
+        assert snapshot['flourishing']['all_three'] == 0.5
+
+
+def test_dashboard_routes():
+    """The dashboard renders the stored snapshot and JSON can force a refresh"""
+    with tempfile.TemporaryDirectory() as tmp:
+        seed(os.path.join(tmp, 'survey.db')).close()
+        app.analytics_cache.update(version=None, snapshot=None)
+        client = app.app.test_client()
+
+        page = client.get('/admin/analytics')
+        assert page.status_code == 200 and b'Cohort Analytics' in page.data
+        cached = client.get('/admin/analytics.json').json
+        assert cached['users'] == 2
+        assert client.get('/admin/analytics.json?refresh=1').json['users'] == 2
+
+
+if __name__ == "__main__":
+    test_histogram_helpers()
+    test_compute_snapshot()
+    test_dashboard_routes()
+    print("🎉 All analytics tests passed!")
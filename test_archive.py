@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script to verify cold-storage archival, frozen rollups, exports and restores
+"""
+
+import sys
+import os
+import csv
+import io
+import tempfile
+from datetime import date
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import archive
+import rollups
+import search
+from conftest import seed_survey_db
+
+TODAY = date(2025, 6, 15)
+
+
+def seed_database(tmp):
+    conn = seed_survey_db(os.path.join(tmp, 'survey.db'), ['+15555550001', '+15555550002'])
+    rows = []
+    for month, days in ((1, 20), (2, 10), (3, 5), (5, 3)):
+        for day in range(1, days + 1):
+            rows.append((1 + day % 2, day % 10 + 1, 5, 6, f'Month {month} day {day} meetings', f'2025-{month:02d}-{day:02d} 12:00:00'))
+    conn.executemany('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                        VALUES (?, ?, ?, ?, ?, ?)''', rows)
+    conn.commit()
+    rollups.update_rollups(app.DB_PATH, today=TODAY)
+    return conn
+
+
+def rollup_counts(conn):
+    return {day['day']: day['responses'] for day in rollups.load_rollups(conn, '2025-01-01', '2025-03-31')
+            if day['responses']}
+
+
+def test_archive_moves_old_months():
+    """Whole months past retention move to compressed partitions; rollups and counts stay"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(tmp)
+        archive_dir = os.path.join(tmp, 'archive')
+        before = rollup_counts(conn)
+        user_total = archive.total_responses(conn, 1)
+
+        # 100 days back from June 15 is March 7: January and February go, March stays
+        moved = archive.archive_responses(app.DB_PATH, archive_dir, retention_days=100, today=TODAY)
+        assert moved == {'2025-01': 20, '2025-02': 10}
+        assert conn.execute("SELECT MIN(date) FROM responses").fetchone()[0].startswith('2025-03')
+        assert sorted(os.listdir(archive_dir)) == ['responses-2025-01.jsonl.gz', 'responses-2025-02.jsonl.gz']
+        assert len(archive.read_partition(os.path.join(archive_dir, 'responses-2025-01.jsonl.gz'))) == 20
+
+        assert archive.total_responses(conn, 1) == user_total
+        assert archive.total_responses(conn) == 38
+        assert all(result['date'] >= '2025-03' for result in search.search(conn, 'month', limit=200)[0])
+
+        # Archived days keep their rollups, even through a backfill
+        rollups.backfill(app.DB_PATH, '2025-01-01', '2025-03-31', today=TODAY)
+        assert rollup_counts(conn) == before
+        assert archive.archive_responses(app.DB_PATH, archive_dir, retention_days=100, today=TODAY) == {}
+        conn.close()
+
+
+def test_archive_waits_for_rollups():
+    """Months that are not fully rolled up are not archived"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(tmp)
+        conn.execute("UPDATE rollup_watermarks SET watermark = '2025-02-27' WHERE name = ?", (rollups.WATERMARK,))
+        conn.commit()
+        moved = archive.archive_responses(app.DB_PATH, os.path.join(tmp, 'archive'), retention_days=100, today=TODAY)
+        assert moved == {'2025-01': 20}
+
+        try:
+            archive.archive_responses(app.DB_PATH, os.path.join(tmp, 'archive'), retention_days=30, today=TODAY)
+            assert False, "short retention must be rejected"
+        except ValueError:
+            pass
+        conn.close()
+
+
+def test_export_and_restore():
+    """Exports read archived months back; a restored month is live again and stays live"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(tmp)
+        archive_dir = os.path.join(tmp, 'archive')
+        archive.ARCHIVE_DIR = archive_dir
+        archive.archive_responses(app.DB_PATH, retention_days=100, today=TODAY)
+        client = app.app.test_client()
+
+        data = client.get('/admin/responses.json?start=2025-02-05&end=2025-03-02').get_json()
+        assert [row['date'][:10] for row in data['responses']][:2] == ['2025-02-05', '2025-02-06']
+        assert len(data['responses']) == 8 and data['responses'][0]['phone']
+
+        exported = list(csv.reader(io.StringIO(client.get('/admin/responses.csv').get_data(as_text=True))))
+        assert exported[0][:2] == ['id', 'phone'] and len(exported) == 1 + 38
+        assert client.get('/admin/responses.csv?start=Feb').status_code == 400
+
+        assert search.term_summary(conn, date(2025, 2, 3), today=TODAY)['responses'] == 0
+        assert archive.restore_month(app.DB_PATH, '2025-02') == 10
+        assert search.term_summary(conn, date(2025, 2, 3), today=TODAY)['responses'] == 7  # Not the stored 0
+        assert not os.path.exists(os.path.join(archive_dir, 'responses-2025-02.jsonl.gz'))
+        assert conn.execute("SELECT COUNT(*) FROM responses WHERE date LIKE '2025-02%'").fetchone()[0] == 10
+        assert archive.total_responses(conn) == 38
+        assert len(search.search(conn, 'month 2', limit=200)[0]) >= 10
+
+        # Pinned: scheduled runs leave it alone
+        assert archive.archive_responses(app.DB_PATH, retention_days=100, today=TODAY) == {}
+        try:
+            archive.restore_month(app.DB_PATH, '2025-02')
+            assert False, "a restored month is no longer archived"
+        except ValueError:
+            pass
+        conn.close()
+
+
+def test_deleted_users_are_skipped():
+    """Archived rows of deleted users are neither exported nor restored"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(tmp)
+        archive.archive_responses(app.DB_PATH, os.path.join(tmp, 'archive'), retention_days=100, today=TODAY)
+        app.app.test_client().post('/delete_user/2')
+
+        assert all(row['user_id'] == 1 for row in archive.read_responses(conn))
+        assert archive.total_responses(conn, 2) == 0
+        assert archive.restore_month(app.DB_PATH, '2025-01') == 10
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_archive_moves_old_months()
+    test_archive_waits_for_rollups()
+    test_export_and_restore()
+    test_deleted_users_are_skipped()
+    print("🎉 All archive tests passed!")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test script to verify online backups, snapshot pruning and snapshot reads for reports
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import backups
+from conftest import seed_survey_db
+
+NOW = datetime(2025, 3, 3, 12, 0, 0)
+
+
+def seed_database(db_path):
+    conn = seed_survey_db(db_path, ['+15555550001'])
+    conn.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                    VALUES (1, 7, 8, 9, 'Good meetings', '2025-03-03 10:00:00')''')
+    conn.commit()
+    return conn
+
+
+def test_backup_does_not_block_writers():
+    """A backup runs alongside an open write transaction and copies only committed data"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(os.path.join(tmp, 'survey.db'))
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute("INSERT INTO users (phone) VALUES ('+15555550002')")
+
+        result = backups.make_backup(app.DB_PATH, os.path.join(tmp, 'backups'), now=NOW)
+        conn.commit()
+        assert result['path'].endswith('survey-20250303T120000.db') and result['pages'] > 0
+
+        snapshot = backups.connect_snapshot(result['path'])
+        assert snapshot.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 1
+        assert snapshot.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+        try:
+            snapshot.execute("INSERT INTO users (phone) VALUES ('+15555550003')")
+            assert False, "snapshots are read-only"
+        except sqlite3.OperationalError:
+            pass
+        snapshot.close()
+        assert not os.path.exists(result['path'] + '-wal')
+        conn.close()
+
+
+def test_prune_and_latest():
+    """Only the newest snapshots are kept; stale ones are not used for reports"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(os.path.join(tmp, 'survey.db'))
+        backup_dir = os.path.join(tmp, 'backups')
+        for hours in range(4):
+            result = backups.make_backup(app.DB_PATH, backup_dir, keep=2, now=NOW + timedelta(hours=hours))
+        assert result['pruned'] == 1
+        assert [taken_at.hour for taken_at, _ in backups.list_snapshots(backup_dir)] == [15, 14]
+
+        assert backups.latest_snapshot(backup_dir, max_age=60, now=NOW + timedelta(hours=3, minutes=30))[0].hour == 15
+        assert backups.latest_snapshot(backup_dir, max_age=60, now=NOW + timedelta(hours=5)) is None
+        assert backups.latest_snapshot(os.path.join(tmp, 'missing')) is None
+        conn.close()
+
+
+def test_reports_read_from_snapshot():
+    """With REPORT_SOURCE=snapshot, reporting routes read the newest backup and say so"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(os.path.join(tmp, 'survey.db'))
+        backups.REPORT_SOURCE, backups.BACKUP_DIR = 'snapshot', os.path.join(tmp, 'backups')
+        client = app.app.test_client()
+        response = client.get('/responses/search?q=meetings')
+        assert 'X-Report-Snapshot' not in response.headers  # No backup yet: primary
+        assert len(response.get_json()['results']) == 1
+
+        result = app.backup_database()
+        conn.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                        VALUES (1, 3, 3, 3, 'More meetings', '2025-03-04 10:00:00')''')
+        conn.commit()
+
+        response = client.get('/responses/search?q=meetings')
+        assert response.headers['X-Report-Snapshot'] == result['taken_at']
+        assert len(response.get_json()['results']) == 1  # As of the backup
+        assert b'as of' in client.get('/responses').data
+
+        # The dashboard says how old the data is, not just when it was computed
+        snapshot = app.refresh_analytics()
+        app.analytics_cache.update(version=snapshot['computed_at'], snapshot=snapshot)
+        assert snapshot['data_as_of'] == result['taken_at'].replace('T', ' ')
+        assert result['taken_at'].replace('T', ' ').encode() in client.get('/admin/analytics').data
+
+        backups.REPORT_SOURCE = 'primary'
+        response = client.get('/responses/search?q=meetings')
+        assert 'X-Report-Snapshot' not in response.headers
+        assert len(response.get_json()['results']) == 2
+        snapshot = app.refresh_analytics()
+        assert snapshot['data_as_of'] == snapshot['computed_at']
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_backup_does_not_block_writers()
+    test_prune_and_latest()
+    test_reports_read_from_snapshot()
+    print("🎉 All backup tests passed!")
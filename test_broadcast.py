@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script to verify segment resolution and broadcast progress reporting
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import sms_templates
+import outbox
+from broadcast import validate_segment, resolve_segment, create_broadcast, broadcast_status
+from sms_providers import FakeSMSProvider
+from conftest import seed_survey_db
+
+
+def seed_database(db_path):
+    """Three users: one low scorer, one thriving, one who never replied"""
+    conn = seed_survey_db(db_path, ['+15555550101', '+15555550102', '+15555550103'])
+    c = conn.cursor()
+    for day in range(7):
+        c.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                     VALUES (1, 3, 4, 5, '', datetime('now', ?))''', (f'-{day + 5} days',))
+        c.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                     VALUES (2, 9, 8, 9, '', datetime('now', ?))''', (f'-{day} days',))
+    conn.commit()
+    conn.close()
+
+
+def test_resolve_segments():
+    """Each segment type resolves to the expected users"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        seed_database(db_path)
+        conn = sqlite3.connect(db_path)
+
+        low = resolve_segment(conn, validate_segment({'type': 'low_average', 'threshold': 7}))
+        inactive = resolve_segment(conn, validate_segment({'type': 'inactive', 'days': 3}))
+        everyone = resolve_segment(conn, validate_segment({'type': 'all'}))
+        conn.close()
+
+        print(f"low_average={low}, inactive={inactive}")
+        assert [user_id for user_id, _ in low] == [1]
+        assert [user_id for user_id, _ in inactive] == [1, 3]
+        assert len(everyone) == 3
+
+        try:
+            validate_segment({'type': 'unknown'})
+            assert False, 'invalid segment accepted'
+        except ValueError:
+            pass
+
+
+def test_broadcast_progress():
+    """A broadcast queues one outbox row per recipient and reports progress"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        seed_database(db_path)
+
+        broadcast_id, total = create_broadcast(db_path, {'type': 'all'}, 'custom', 'Hello all')
+        assert total == 3
+        status = broadcast_status(db_path, broadcast_id)
+        assert status['counts']['pending'] == 3 and not status['complete']
+
+        outbox.drain_outbox(db_path, lambda phone, message: None if phone.endswith('03') else 'ok')
+        status = broadcast_status(db_path, broadcast_id)
+        print(f"Broadcast status: {status['counts']}, progress={status['progress']}")
+        assert status['counts']['sent'] == 2
+        assert {r['phone']: r['status'] for r in status['recipients']}['+15555550103'] == 'pending'
+
+
+def test_broadcast_route():
+    """The broadcast endpoint supports dry runs and queues feedback links per user"""
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_database(os.path.join(tmp, 'survey.db'))
+        app.sms_provider = FakeSMSProvider(latency_ms=(0, 0))
+        app.sms_limiter = None
+        client = app.app.test_client()
+
+        preview = client.post('/broadcast_sms', json={'kind': 'feedback', 'dry_run': True,
+                                                      'segment': {'type': 'inactive', 'days': 3}})
+        assert preview.json['recipients'] == 2
+
+        bad = client.post('/broadcast_sms', json={'kind': 'custom', 'segment': {'type': 'all'}})
+        assert bad.status_code == 400
+
+        segments_before = sum(app.SMS_SEGMENTS_TOTAL.values.values())
+        queued = client.post('/broadcast_sms', json={'kind': 'feedback',
+                                                     'segment': {'type': 'inactive', 'days': 3}})
+        assert queued.status_code == 202
+        # One feedback link per recipient; the stored '{user_id}' template is not counted
+        per_message = sms_templates.FEEDBACK_LINK.render(report_url='https://example.test/feedback/3')['segments']
+        assert sum(app.SMS_SEGMENTS_TOTAL.values.values()) - segments_before == 2 * per_message
+        with app.outbox_drain_lock:  # Wait for the background drain to finish
+            app.process_outbox()
+
+        status = client.get(queued.json['status_url']).json
+        assert status['complete'] and status['counts']['sent'] == 2
+        assert any('/feedback/3' in sent['message'] for sent in app.sms_provider.sent)
+
+
+if __name__ == "__main__":
+    test_resolve_segments()
+    test_broadcast_progress()
+    test_broadcast_route()
+    print("🎉 All broadcast tests passed!")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the campaign simulator and token-free SMS previews
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import campaign_sim
+
+
+def test_small_campaign():
+    """A short campaign exercises every route and restores the app afterwards"""
+    db_path = app.DB_PATH
+    report = campaign_sim.simulate(users=40, days=8, reply_rate=0.9, feedback_rate=1.0, seed=7)
+    print(f"Simulated: {report['sends']} {report['growth']}")
+
+    assert app.DB_PATH == db_path and app.datetime is campaign_sim.datetime
+    assert report['sends']['total'] == 40 * 8
+    assert report['sends']['peak_per_second'] <= 5.0
+    assert report['growth']['survey_tokens_total'] == 40 * 8
+    assert report['growth']['survey_tokens_per_day'] == 40
+    assert set(report['routes']) == {'survey_get', 'survey_post', 'sms_webhook', 'feedback'}
+    assert report['routes']['survey_post']['statuses'].get(302, 0) > 0
+    assert 0 < report['growth']['responses_total'] <= 40 * 8
+
+    days = report['days']
+    assert [day['day'] for day in days] == list(range(1, 9))
+    assert all(later['db_bytes'] >= earlier['db_bytes'] for earlier, later in zip(days, days[1:]))
+
+
+def test_virtual_clock_expires_tokens():
+    """Replies long after the send hit expired links, following the virtual calendar"""
+    report = campaign_sim.simulate(users=20, days=2, reply_rate=1.0, link_share=1.0,
+                                   reply_median_minutes=48 * 60, seed=3)
+    statuses = report['routes']['survey_get']['statuses']
+    assert statuses.get(400, 0) > 0  # Expired after SURVEY_TOKEN_TTL_HOURS of virtual time
+
+
+def test_previews_do_not_create_tokens():
+    """The weekly SMS previews render a message without writing survey_tokens"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app.DB_PATH = os.path.join(tmp, 'survey.db')
+        app.init_db()
+        client = app.app.test_client()
+        for url in ('/test_weekly_sms', '/test_weekly_sms/7', '/test_weekly_sms/8'):
+            data = client.get(url).get_json()
+            assert data['message_preview'] and data['segments'] >= 1
+        conn = sqlite3.connect(app.DB_PATH)
+        assert conn.execute('SELECT COUNT(*) FROM survey_tokens').fetchone()[0] == 0
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_small_campaign()
+    test_virtual_clock_expires_tokens()
+    test_previews_do_not_create_tokens()
+    print("🎉 All campaign simulator tests passed!")
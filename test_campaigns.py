@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test script to verify campaign windows, per-campaign schedules and enrollment
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, date, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import campaigns
+from conftest import seed_survey_db
+
+MONDAY = datetime(2025, 3, 3)
+
+
+PHONES = [f'+1555555{i:04d}' for i in range(5)]
+
+
+def queued_users(conn):
+    return sorted(row[0] for row in conn.execute('SELECT user_id FROM survey_tokens'))
+
+
+def test_default_campaign_schedule_and_window():
+    """The default campaign sends once a day at its hour, and never outside its window"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), PHONES[:4])
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY.replace(hour=10)) == (0, 0)
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY.replace(hour=11)) == (4, 4)
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY.replace(hour=12)) == (0, 0)  # Ran today
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY + timedelta(days=1, hours=13)) == (4, 4)
+
+        campaigns.set_window(conn, campaigns.DEFAULT_CAMPAIGN_ID, '2025-03-01', '2025-03-04')
+        conn.commit()
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY + timedelta(days=2, hours=11)) == (0, 0)
+        assert conn.execute('SELECT COUNT(*) FROM survey_runs').fetchone()[0] == 2  # No empty runs
+        conn.close()
+
+
+def test_concurrent_cohorts():
+    """Cohorts run side by side; a user in two due campaigns gets one text"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), PHONES)
+        spring = campaigns.create_campaign(conn, {'name': 'Spring', 'start_date': '2025-03-01',
+                                                  'end_date': '2025-03-31', 'send_hour': 9, 'weekdays': '0123456'})
+        pilot = campaigns.create_campaign(conn, {'name': 'Pilot', 'start_date': '2025-03-01',
+                                                 'end_date': '2025-03-31', 'send_hour': 9, 'weekdays': '024'})
+        campaigns.enroll(conn, spring, [1, 2])
+        campaigns.enroll(conn, pilot, [2, 3, 99])  # 99 does not exist
+        conn.commit()
+
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY.replace(hour=9)) == (3, 3)
+        assert queued_users(conn) == [1, 2, 3]
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY.replace(hour=11)) == (2, 2)  # Default: 4, 5
+        assert queued_users(conn) == [1, 2, 3, 4, 5]
+
+        # Tuesday: the pilot is off, so user 3 gets nothing
+        conn.execute('DELETE FROM survey_tokens')
+        conn.commit()
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY + timedelta(days=1, hours=9)) == (2, 2)
+        assert queued_users(conn) == [1, 2]
+
+        plan = ' '.join(row[3] for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT user_id FROM campaign_enrollments WHERE campaign_id IN (2, 3)'))
+        assert 'campaign_enrollments USING PRIMARY KEY' in plan, plan
+        conn.close()
+
+
+def test_interrupted_run_resumes():
+    """A run whose worker died partway is claimed again after its lease and queues only the rest"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), PHONES[:4])
+        send = app.send_survey_sms
+        calls = []
+
+        def dies_on_third(*args, **kwargs):
+            calls.append(args[0])
+            if len(calls) == 3:
+                raise KeyboardInterrupt  # The worker is recycled mid-run
+            return send(*args, **kwargs)
+
+        app.send_survey_sms = dies_on_third
+        try:
+            app.send_daily_sms(start_delivery=False, now=MONDAY.replace(hour=11))
+            assert False, "the run must be interrupted"
+        except KeyboardInterrupt:
+            pass
+        finally:
+            app.send_survey_sms = send
+        assert queued_users(conn) == [1, 2]
+
+        # Still leased: another tick right away does not start a second run
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY.replace(hour=11, minute=5)) == (0, 0)
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY.replace(hour=12)) == (2, 2)
+        assert queued_users(conn) == [1, 2, 3, 4]
+        assert conn.execute('SELECT COUNT(*) FROM sms_outbox').fetchone()[0] == 4
+        assert app.send_daily_sms(start_delivery=False, now=MONDAY.replace(hour=13)) == (0, 0)  # Ran today
+
+        # A user already surveyed that day is skipped before a token is minted
+        assert app.send_survey_sms(1, PHONES[0], survey_day=MONDAY.date().isoformat()) == (None, None)
+        assert queued_users(conn) == [1, 2, 3, 4]
+        conn.close()
+
+
+def test_long_run_renews_lease():
+    """A run keeps renewing its claim while it queues, so the lease cannot lapse mid-run"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), PHONES)
+        renew = campaigns.renew_claim
+        leases = []
+
+        def recording_renew(renew_conn, campaign_ids, now):
+            renew(renew_conn, campaign_ids, now)
+            leases.append(renew_conn.execute('SELECT claimed_until FROM campaign WHERE id = 1').fetchone()[0])
+
+        every = campaigns.CLAIM_RENEW_EVERY
+        campaigns.CLAIM_RENEW_EVERY, campaigns.renew_claim = 2, recording_renew
+        try:
+            assert app.send_daily_sms(start_delivery=False, now=MONDAY.replace(hour=11)) == (5, 5)
+        finally:
+            campaigns.CLAIM_RENEW_EVERY, campaigns.renew_claim = every, renew
+        assert len(leases) == 2
+        assert all(lease >= '2025-03-03 11:30:00' for lease in leases)
+        assert conn.execute('SELECT claimed_until FROM campaign WHERE id = 1').fetchone()[0] is None
+
+        # Renewing a completed run does not claim it again
+        campaigns.renew_claim(conn, [1], MONDAY.replace(hour=12))
+        assert conn.execute('SELECT claimed_until FROM campaign WHERE id = 1').fetchone()[0] is None
+        conn.close()
+
+
+def test_campaign_routes():
+    """Campaigns are created, listed and (un)enrolled over JSON"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), PHONES[:4])
+        client = app.app.test_client()
+        start = date.today().isoformat()
+        end = (date.today() + timedelta(days=30)).isoformat()
+
+        bad = client.post('/campaigns', json={'name': 'X', 'start_date': end, 'end_date': start})
+        assert bad.status_code == 400 and not bad.get_json()['success']
+        assert client.post('/campaigns', json={'name': 'X', 'start_date': start, 'end_date': end,
+                                               'send_hour': 25}).status_code == 400
+
+        created = client.post('/campaigns', json={'name': 'Cohort A', 'start_date': start, 'end_date': end,
+                                                  'send_hour': 14, 'segment': {'type': 'all'}}).get_json()
+        assert created['success'] and created['enrolled'] == 4
+        campaign_id = created['campaign_id']
+        assert client.post(f'/campaigns/{campaign_id}/unenroll', json={'user_ids': [1, 2]}).get_json()['unenrolled'] == 2
+        assert client.post(f'/campaigns/{campaign_id}/enroll', json={'user_ids': [1]}).get_json()['enrolled'] == 1
+        assert client.post(f'/campaigns/{campaign_id}/enroll', json={'user_ids': 'all'}).status_code == 400
+        assert client.post('/campaigns/1/enroll', json={'user_ids': [1]}).status_code == 400
+        assert client.post('/campaigns/999/enroll', json={'user_ids': [1]}).status_code == 404
+
+        listed = {c['name']: c for c in client.get('/campaigns').get_json()['campaigns']}
+        assert listed['Cohort A']['recipients'] == 3 and listed['Cohort A']['status'] == 'active'
+        assert listed['Default']['recipients'] == 1  # Only user 2 is unenrolled
+        assert client.get('/admin').status_code == 200
+
+        client.post('/delete_user/1')
+        assert conn.execute('SELECT COUNT(*) FROM campaign_enrollments WHERE user_id = 1').fetchone()[0] == 0
+        conn.close()
+
+
+def test_existing_campaign_row_is_kept():
+    """A database from before campaigns keeps its dates as the default campaign's window"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute('CREATE TABLE campaign (id INTEGER PRIMARY KEY, start_date TEXT, end_date TEXT)')
+        conn.execute("INSERT INTO campaign VALUES (1, '2025-01-01', '2025-02-01')")
+        conn.commit()
+        conn.close()
+
+        app.DB_PATH = db_path
+        app.init_db()
+        conn = sqlite3.connect(db_path)
+        row = conn.execute('SELECT name, start_date, end_date, send_hour, weekdays FROM campaign').fetchall()
+        assert row == [('Default', '2025-01-01', '2025-02-01', 11, '0123456')]
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_default_campaign_schedule_and_window()
+    test_concurrent_cohorts()
+    test_interrupted_run_resumes()
+    test_long_run_renews_lease()
+    test_campaign_routes()
+    test_existing_campaign_row_is_kept()
+    print("🎉 All campaign tests passed!")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the synthetic cohort generator and benchmark comparison
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cohort import generate_cohort, parse_mix
+from bench_stats import percentile
+from bench_suite import compare, run_suite
+from datetime import datetime
+
+
+def test_generate_cohort_is_reproducible():
+    """The same seed produces the same users, responses and tokens"""
+    with tempfile.TemporaryDirectory() as tmp:
+        now = datetime(2025, 6, 1, 12, 0, 0)
+        first = generate_cohort(os.path.join(tmp, 'a.db'), users=20, days=10, seed=7, now=now)
+        second = generate_cohort(os.path.join(tmp, 'b.db'), users=20, days=10, seed=7, now=now)
+        print(f"Cohort: {first['users']} users, {first['responses']} responses")
+        assert first['tokens'] == second['tokens'] and first['replies'] == second['replies']
+
+        rows = [sqlite3.connect(s['db_path']).execute('SELECT * FROM responses ORDER BY id').fetchall()
+                for s in (first, second)]
+        assert rows[0] == rows[1] and len(rows[0]) == first['responses'] > 0
+        assert all(1 <= row[2] <= 10 for row in rows[0])
+
+
+def test_reply_mix():
+    """Only invalid replies means no stored responses"""
+    assert parse_mix('clean=1,invalid=0.5') == {'clean': 1.0, 'invalid': 0.5}
+    with tempfile.TemporaryDirectory() as tmp:
+        summary = generate_cohort(os.path.join(tmp, 'c.db'), users=5, days=5,
+                                  reply_rate=1.0, mix={'invalid': 1.0})
+        assert summary['responses'] == 0
+
+
+def test_suite_and_compare():
+    """A small suite run succeeds and regressions are detected against a baseline"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cohort = generate_cohort(os.path.join(tmp, 'bench.db'), users=10, days=5, open_tokens=5)
+        results = run_suite(cohort, 5, scenarios=('survey_get', 'survey_post', 'sms_webhook', 'feedback'))
+        assert all(r['errors'] == 0 and r['count'] == 5 for r in results.values()), results
+
+    assert percentile([1, 2, 3, 4], 50) == 2
+    baseline = {'scenarios': {'feedback': {'p50_ms': 1.0, 'p99_ms': 2.0, 'ops_per_second': 100}}}
+    slower = {'scenarios': {'feedback': {'p50_ms': 1.5, 'p99_ms': 2.1, 'ops_per_second': 70}}}
+    regressions = compare(slower, baseline, tolerance=0.2)
+    assert {(r['metric']) for r in regressions} == {'p50_ms', 'ops_per_second'}
+
+
+if __name__ == "__main__":
+    test_generate_cohort_is_reproducible()
+    test_reply_mix()
+    test_suite_and_compare()
+    print("🎉 All cohort tests passed!")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the rendered /feedback page cache and its invalidation
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from conftest import seed_survey_db
+
+
+def setup_user(db_path, responses):
+    """Point the app at a fresh database with one user and some responses"""
+    conn = seed_survey_db(db_path, ['+15555550100'])
+    c = conn.cursor()
+    user_id = 1
+    for i, (joy, achievement, meaning) in enumerate(responses):
+        c.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                     VALUES (?, ?, ?, ?, ?, ?)''',
+                  (user_id, joy, achievement, meaning, '', f'2025-01-0{i + 1} 12:00:00'))
+    conn.commit()
+    conn.close()
+    return user_id
+
+
+def test_feedback_cache():
+    """Repeat views are served from cache, conditional requests get 304"""
+    with tempfile.TemporaryDirectory() as tmp:
+        user_id = setup_user(os.path.join(tmp, 'survey.db'), [(8, 7, 9), (6, 6, 6), (9, 9, 9)])
+        client = app.app.test_client()
+
+        first = client.get(f'/feedback/{user_id}')
+        print(f"First view: {first.status_code}, ETag={first.headers.get('ETag')}")
+        assert first.status_code == 200
+        assert first.headers.get('ETag')
+        assert first.headers.get('Last-Modified')
+        assert user_id in app.feedback_cache
+
+        # Remove the database file: a repeat view inside the verify window must not need it
+        os.remove(app.DB_PATH)
+        second = client.get(f'/feedback/{user_id}')
+        assert second.status_code == 200
+        assert second.data == first.data
+
+        not_modified = client.get(f'/feedback/{user_id}',
+                                  headers={'If-None-Match': first.headers['ETag']})
+        print(f"Conditional view: {not_modified.status_code}")
+        assert not_modified.status_code == 304
+        assert not_modified.data == b''
+
+
+def test_feedback_cache_invalidation():
+    """Storing a new response drops the cached page for that user"""
+    with tempfile.TemporaryDirectory() as tmp:
+        user_id = setup_user(os.path.join(tmp, 'survey.db'), [(5, 5, 5), (5, 5, 5), (5, 5, 5)])
+        client = app.app.test_client()
+
+        first = client.get(f'/feedback/{user_id}')
+        assert first.status_code == 200
+
+        app.store_survey_response('+15555550100', 10, 10, 10, 'great', '10 10 10 great')
+        assert user_id not in app.feedback_cache
+
+        second = client.get(f'/feedback/{user_id}',
+                            headers={'If-None-Match': first.headers['ETag']})
+        print(f"View after new response: {second.status_code}")
+        assert second.status_code == 200
+        assert second.headers['ETag'] != first.headers['ETag']
+
+
+def test_feedback_cache_sees_other_workers():
+    """A response stored by another worker (no local invalidation) shows up once the verify window passes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        user_id = setup_user(os.path.join(tmp, 'survey.db'), [(5, 5, 5), (5, 5, 5), (5, 5, 5)])
+        client = app.app.test_client()
+        first = client.get(f'/feedback/{user_id}')
+        assert first.status_code == 200
+        entry = app.feedback_cache[user_id]
+
+        # Past the verify window, an unchanged version keeps the page without rendering it again
+        entry['verified_at'] -= app.FEEDBACK_CACHE_VERIFY_SECONDS + 1
+        assert client.get(f'/feedback/{user_id}').data == first.data
+        assert app.feedback_cache[user_id] is entry
+
+        conn = app.sqlite3.connect(app.DB_PATH)
+        conn.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                        VALUES (?, 10, 10, 10, '', '2025-01-09 12:00:00')''', (user_id,))
+        conn.commit()
+        entry['verified_at'] -= app.FEEDBACK_CACHE_VERIFY_SECONDS + 1
+        second = client.get(f'/feedback/{user_id}', headers={'If-None-Match': first.headers['ETag']})
+        assert second.status_code == 200
+        assert second.headers['ETag'] != first.headers['ETag']
+
+        conn.execute('DELETE FROM responses WHERE user_id = ?', (user_id,))
+        conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+        conn.commit()
+        conn.close()
+        app.feedback_cache[user_id]['verified_at'] -= app.FEEDBACK_CACHE_VERIFY_SECONDS + 1
+        assert client.get(f'/feedback/{user_id}').status_code == 404
+
+
+if __name__ == "__main__":
+    test_feedback_cache()
+    test_feedback_cache_invalidation()
+    test_feedback_cache_sees_other_workers()
+    print("🎉 All feedback cache tests passed!")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script to verify per-run survey funnel tracking (sent, opened, submitted, expired)
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from campaigns import DEFAULT_CAMPAIGN_ID
+import funnel
+from sms_providers import FakeSMSProvider
+from conftest import seed_survey_db
+
+
+PHONES = ['+15555550101', '+15555550102', '+15555550103']
+
+
+def test_daily_run_funnel():
+    """A daily run counts each stage once per token and buckets the send-to-submit delay"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        seed_survey_db(db_path, PHONES).close()
+        app.sms_provider = FakeSMSProvider(latency_ms=(0, 0))
+        app.sms_limiter = None
+        assert app.send_daily_sms(start_delivery=False, campaign_ids=[DEFAULT_CAMPAIGN_ID]) == (3, 3)
+        app.process_outbox()
+        app.process_outbox()  # Nothing left: must not count again
+
+        conn = sqlite3.connect(db_path)
+        tokens = [row[0] for row in conn.execute('SELECT token FROM survey_tokens ORDER BY user_id')]
+        client = app.app.test_client()
+
+        # Two opens, one of them twice; one submission
+        assert client.get(f'/survey/{tokens[0]}').status_code == 200
+        assert client.get(f'/survey/{tokens[0]}').status_code == 200
+        assert client.get(f'/survey/{tokens[1]}').status_code == 200
+        response = client.post(f'/survey/{tokens[0]}',
+                               data={'joy': '8', 'achievement': '6', 'meaning': '7', 'influence': ''})
+        assert response.status_code == 302
+
+        # Third link runs out unused; the sweep only counts it once
+        conn.execute("UPDATE survey_tokens SET expires_at = '2000-01-01 00:00:00' WHERE token = ?", (tokens[2],))
+        conn.commit()
+        assert app.expire_survey_tokens() == 1
+        assert app.expire_survey_tokens() == 0
+
+        report = funnel.funnel_report(conn)
+        conn.close()
+        print(f"Funnel: {report}")
+        assert len(report) == 1
+        run = report[0]
+        assert run['kind'] == 'daily' and run['tokens'] == 3
+        assert (run['sent'], run['opened'], run['submitted'], run['expired']) == (3, 2, 1, 1)
+        assert run['open_rate'] == round(2 / 3, 4)
+        assert run['submit_delay']['<5m'] == 1
+
+
+def test_funnel_routes():
+    """Manual sends share a per-day run, reported on the JSON endpoint and the dashboard"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        seed_survey_db(db_path, PHONES).close()
+        conn = sqlite3.connect(db_path)
+        assert funnel.manual_run(conn, '2025-03-01') == funnel.manual_run(conn, '2025-03-01')
+        conn.close()
+
+        client = app.app.test_client()
+        runs = client.get('/admin/funnel.json').json['runs']
+        assert [run['kind'] for run in runs] == ['manual']
+        assert runs[0]['open_rate'] is None
+        for bad in ('abc', '-1', '0'):
+            assert client.get(f'/admin/funnel.json?limit={bad}').status_code == 400
+
+        # A survey sent by hand counts its token in today's manual run
+        app.sms_provider = FakeSMSProvider(latency_ms=(0, 0))
+        app.sms_limiter = None
+        response = client.post('/send_survey_sms', json={'user_id': 1, 'phone': '+15555550101'})
+        assert response.status_code == 202
+        with app.outbox_drain_lock:  # Wait for the background drain to finish
+            app.process_outbox()
+        runs = client.get('/admin/funnel.json').json['runs']
+        assert [run['tokens'] for run in runs] == [1, 0]  # Newest first: today's run, then March 1
+        assert b'Survey Funnel' in client.get('/admin/analytics').data
+
+
+if __name__ == "__main__":
+    test_daily_run_funnel()
+    test_funnel_routes()
+    print("🎉 All funnel tests passed!")
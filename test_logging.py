@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test script to verify log redaction, sampling and JSON formatting
+"""
+
+import sys
+import os
+import io
+import json
+import logging
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from logging_config import redact, SamplingFilter, RedactionFilter, JSONFormatter, SAMPLED
+
+
+def make_record(msg, args=(), level=logging.INFO, extra=None):
+    record = logging.LogRecord('app', level, __file__, 1, msg, args, None)
+    for key, value in (extra or {}).items():
+        setattr(record, key, value)
+    return record
+
+
+def test_redact():
+    """Phone numbers keep their last 4 digits and tokens are truncated"""
+    assert redact('Reply from +1 (555) 123-4567') == 'Reply from ***4567'
+    assert redact('token Zx9_kQ3mP0aL-vT7bN2cR8') == 'token Zx9_…'
+    assert redact('Joy=8, Achievement=7, user 42') == 'Joy=8, Achievement=7, user 42'
+
+
+def test_redaction_filter_and_json():
+    """Messages, args and extra fields are redacted before formatting"""
+    record = make_record('SMS to %s failed', ('+15555550123',), extra={'phone': '+15555550123', 'user_id': 7})
+    RedactionFilter().filter(record)
+    entry = json.loads(JSONFormatter().format(record))
+    print(f"JSON log entry: {entry}")
+    assert entry['msg'] == 'SMS to ***0123 failed'
+    assert entry['phone'] == '***0123' and entry['user_id'] == 7
+    assert entry['level'] == 'INFO' and entry['logger'] == 'app'
+
+
+def test_sampling_filter():
+    """Only sampled records below WARNING are dropped"""
+    drop_all = SamplingFilter(0.0)
+    assert not drop_all.filter(make_record('SMS sent', extra=SAMPLED))
+    assert drop_all.filter(make_record('SMS failed', level=logging.WARNING, extra=SAMPLED))
+    assert drop_all.filter(make_record('Daily SMS queued'))
+
+
+def test_app_logs_without_pii():
+    """App log calls produce redacted JSON lines"""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JSONFormatter())
+    handler.addFilter(RedactionFilter())
+    logger = logging.getLogger('test_app_logs')
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.warning("SMS failed: %s", 'Invalid phone', extra={'phone': '5555550199'})
+    finally:
+        logger.removeHandler(handler)
+    line = json.loads(stream.getvalue())
+    assert line['phone'] == '***0199' and '5555550199' not in stream.getvalue()
+
+
+if __name__ == "__main__":
+    test_redact()
+    test_redaction_filter_and_json()
+    test_sampling_filter()
+    test_app_logs_without_pii()
+    print("🎉 All logging tests passed!")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the metrics registry, cross-worker merging and /metrics
+"""
+
+import sys
+import os
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import metrics
+
+
+def test_counter_and_histogram():
+    """Counters add up and histograms fill cumulative buckets"""
+    requests_total = metrics.counter('test_requests_total', 'Test counter', ['result'])
+    latency = metrics.histogram('test_latency_seconds', 'Test histogram', buckets=(0.1, 1.0))
+
+    requests_total.inc(result='ok')
+    requests_total.inc(2, result='ok')
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    assert requests_total.snapshot() == {'ok': 3}
+    assert latency.snapshot()[''] == {'buckets': [1, 2], 'sum': 0.55, 'count': 2}
+
+
+def test_collect_merges_workers():
+    """Snapshots written by other worker processes are summed into the output"""
+    with tempfile.TemporaryDirectory() as tmp:
+        metrics.METRICS_DIR = tmp
+        metrics.counter('test_merge_total', 'Merged counter').inc(5)
+        other_worker = {'test_merge_total': {'kind': 'counter', 'help': 'Merged counter',
+                                             'labels': [], 'buckets': [], 'values': {'': 7}}}
+        with open(os.path.join(tmp, '999999.json'), 'w') as f:
+            json.dump(other_worker, f)
+
+        output = metrics.render_prometheus()
+        print(output[:300])
+        assert 'test_merge_total 12' in output
+
+
+def test_metrics_endpoint():
+    """Webhook and DB timings show up on /metrics"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app.DB_PATH = os.path.join(tmp, 'survey.db')
+        app.init_db()
+        client = app.app.test_client()
+
+        client.post('/sms_webhook', json={'fromNumber': '+15555550100', 'text': 'no numbers here'})
+        client.get('/')
+        output = client.get('/metrics').get_data(as_text=True)
+
+        assert 'webhook_ingest_total{result="unparsed"}' in output
+        assert 'http_request_seconds_count{route="sms_webhook",method="POST"}' in output
+        assert 'db_query_seconds_count{route="index"}' in output
+
+
+def test_concurrent_flush():
+    """Request threads racing past the flush interval write one intact snapshot"""
+    with tempfile.TemporaryDirectory() as tmp:
+        metrics.METRICS_DIR = tmp
+        metrics.counter('test_race_total', 'Raced counter').inc()
+        writes = []
+        original_write = metrics._write_snapshot
+
+        def counting_write():
+            writes.append(1)
+            original_write()
+
+        metrics._write_snapshot = counting_write
+        metrics._last_flush = 0.0
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(lambda _: metrics._maybe_flush(), range(32)))
+        finally:
+            metrics._write_snapshot = original_write
+
+        assert len(writes) == 1
+        assert os.listdir(tmp) == [f'{os.getpid()}.json']
+        with open(os.path.join(tmp, f'{os.getpid()}.json')) as f:
+            assert json.load(f)['test_race_total']['values'] == {'': 1}
+
+
+if __name__ == "__main__":
+    test_counter_and_histogram()
+    test_collect_merges_workers()
+    test_metrics_endpoint()
+    test_concurrent_flush()
+    print("🎉 All metrics tests passed!")
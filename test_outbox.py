@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the durable SMS outbox: retries, backoff and dead letters
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import outbox
+
+
+def make_outbox(tmp):
+    db_path = os.path.join(tmp, 'survey.db')
+    conn = sqlite3.connect(db_path)
+    outbox.init_outbox(conn.cursor())
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def row(db_path, outbox_id):
+    conn = sqlite3.connect(db_path)
+    result = conn.execute('SELECT status, attempts, next_attempt_at, text_id, last_error FROM sms_outbox WHERE id = ?',
+                          (outbox_id,)).fetchone()
+    conn.close()
+    return result
+
+
+def make_due(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE sms_outbox SET next_attempt_at = '2000-01-01 00:00:00'")
+    conn.commit()
+    conn.close()
+
+
+def test_send_and_retry():
+    """Failures are rescheduled with backoff, then succeed on a later drain"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = make_outbox(tmp)
+        outbox_id = outbox.enqueue_sms(db_path, 'survey', 1, '+15555550100', 'hello',
+                                       payload={'token': 'abc'})
+
+        summary = outbox.drain_outbox(db_path, lambda phone, message: False)
+        status, attempts, next_attempt_at, _, last_error = row(db_path, outbox_id)
+        print(f"After failure: {summary}, status={status}, next_attempt_at={next_attempt_at}")
+        assert summary == {'sent': 0, 'retry': 1, 'dead': 0, 'deferred': 0}
+        assert status == outbox.PENDING and attempts == 1 and last_error
+
+        # Not due yet, so nothing is claimed
+        assert outbox.drain_outbox(db_path, lambda phone, message: 'id-1')['sent'] == 0
+
+        make_due(db_path)
+        sent = []
+        summary = outbox.drain_outbox(db_path, lambda phone, message: sent.append(message) or 'id-1')
+        assert summary['sent'] == 1 and sent == ['hello']
+        assert row(db_path, outbox_id)[0] == outbox.SENT
+        assert row(db_path, outbox_id)[3] == 'id-1'
+
+
+def test_dead_letter_and_requeue():
+    """Messages are dead-lettered after max_attempts and can be requeued"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = make_outbox(tmp)
+        outbox_id = outbox.enqueue_sms(db_path, 'custom', 1, '+15555550100', 'hi', max_attempts=2)
+
+        def boom(phone, message):
+            raise RuntimeError('provider down')
+
+        outbox.drain_outbox(db_path, boom)
+        make_due(db_path)
+        summary = outbox.drain_outbox(db_path, boom)
+        assert summary['dead'] == 1
+        assert row(db_path, outbox_id)[0] == outbox.DEAD
+        assert outbox.outbox_stats(db_path)['dead_letters'][0]['last_error'] == 'provider down'
+
+        assert outbox.requeue(db_path, outbox_id)
+        assert outbox.drain_outbox(db_path, lambda phone, message: 'ok')['sent'] == 1
+
+
+def test_concurrent_drain_batch():
+    """A batch drained with several workers sends every message exactly once"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = make_outbox(tmp)
+        outbox.enqueue_many(db_path, [{'kind': 'custom', 'user_id': i, 'phone': f'+1555000{i:04d}',
+                                       'message': f'msg {i}'} for i in range(50)])
+        sent = []
+        summary = outbox.drain_outbox(db_path, lambda phone, message: sent.append(phone) or phone,
+                                      batch_size=20, max_workers=4)
+        assert summary['sent'] == 50
+        assert len(set(sent)) == 50
+        assert outbox.outbox_stats(db_path)['counts']['sent'] == 50
+
+
+def test_stale_claim_is_fenced():
+    """A drain whose lease ran out neither sends nor overwrites the new owner's outcome"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = make_outbox(tmp)
+        outbox_id = outbox.enqueue_sms(db_path, 'custom', 1, '+15555550100', 'hi')
+        stale = outbox.claim_due(db_path, lease_seconds=-1)[0]  # Lease already over
+        fresh = outbox.claim_due(db_path)[0]
+        assert fresh['id'] == outbox_id and fresh['claim_token'] != stale['claim_token']
+
+        assert not outbox.renew_lease(db_path, stale)
+        assert outbox.mark_failed(db_path, stale, 'late') is None
+        assert outbox.mark_sent(db_path, fresh, 'id-1')
+        assert not outbox.mark_sent(db_path, stale, 'id-2')
+        assert row(db_path, outbox_id)[0] == outbox.SENT and row(db_path, outbox_id)[3] == 'id-1'
+
+
+def test_quota_exhaustion_stops_drain():
+    """Running out of quota stops the drain and hands the rest back without using an attempt"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = make_outbox(tmp)
+        ids = outbox.enqueue_many(db_path, [{'kind': 'custom', 'user_id': i, 'phone': f'+1555000{i:04d}',
+                                             'message': f'msg {i}'} for i in range(5)], max_attempts=1)
+        sent = []
+
+        def send(phone, message):
+            if len(sent) == 2:
+                raise outbox.QuotaExhausted()
+            sent.append(phone)
+            return 'ok'
+
+        assert outbox.drain_outbox(db_path, send) == {'sent': 2, 'retry': 0, 'dead': 0, 'deferred': 3}
+        assert [row(db_path, i)[:2] for i in ids[2:]] == [(outbox.PENDING, 0)] * 3
+        assert outbox.drain_outbox(db_path, lambda phone, message: 'ok')['sent'] == 3
+
+
+if __name__ == "__main__":
+    test_send_and_retry()
+    test_dead_letter_and_requeue()
+    test_concurrent_drain_batch()
+    test_stale_claim_is_fenced()
+    test_quota_exhaustion_stops_drain()
+    print("🎉 All outbox tests passed!")
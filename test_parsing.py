@@ -7,8 +7,8 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Import the parsing function from app.py
-from app import parse_survey_response
+# Import the parsing function (no app startup needed)
+from parsing import parse_survey_response
 
 def test_parsing():
     """Test various SMS response formats"""
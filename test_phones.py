@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test script to verify phone normalization, the unique phone index and webhook user lookups
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from phones import normalize_phone, PhoneDirectory
+
+
+def test_normalize_phone():
+    """Provider formats collapse to one E.164 key; junk is rejected"""
+    cases = {
+        '+16175551234': '+16175551234',
+        '6175551234': '+16175551234',
+        '16175551234': '+16175551234',
+        '1 (617) 555-1234': '+16175551234',
+        '+1 617.555.1234': '+16175551234',
+        '0044 20 7946 0958': '+442079460958',
+        '+44 20 7946 0958': '+442079460958',
+        'test_user': None,
+        '12345': None,
+        '': None,
+    }
+    for raw, expected in cases.items():
+        assert normalize_phone(raw) == expected, (raw, normalize_phone(raw))
+    assert normalize_phone('020 7946 0958', default_country='44') == '+442079460958'
+
+
+def test_migration_and_unique_index():
+    """Existing users get their key; duplicates in another format keep the oldest user"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, phone TEXT NOT NULL)')
+        conn.executemany('INSERT INTO users (phone) VALUES (?)',
+                         [('+16175551234',), ('617-555-1234',), ('test_user',), ('(212) 555-0000',)])
+        conn.commit()
+        conn.close()
+
+        app.DB_PATH = db_path
+        app.init_db()
+        conn = sqlite3.connect(db_path)
+        keys = dict(conn.execute('SELECT id, phone_e164 FROM users'))
+        print(f"Backfilled keys: {keys}")
+        assert keys == {1: '+16175551234', 2: None, 3: None, 4: '+12125550000'}
+        try:
+            conn.execute("INSERT INTO users (phone, phone_e164) VALUES ('x', '+12125550000')")
+            assert False, "duplicate phone key accepted"
+        except sqlite3.IntegrityError:
+            pass
+        conn.close()
+
+
+def test_webhook_lookup_and_invalidation():
+    """Replies in any format reach the user; adds and deletes refresh the map"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app.DB_PATH = os.path.join(tmp, 'survey.db')
+        app.init_db()
+        client = app.app.test_client()
+
+        client.post('/admin', data={'phone': '(617) 555-1234'})
+        client.post('/admin', data={'phone': '+1 617 555 1234'})  # Same number again
+        conn = sqlite3.connect(app.DB_PATH)
+        assert conn.execute('SELECT phone, phone_e164 FROM users').fetchall() == [('+16175551234', '+16175551234')]
+
+        for number in ('+16175551234', '6175551234', '1-617-555-1234'):
+            assert client.post('/sms_webhook', json={'fromNumber': number, 'text': '8 7 6 ok'}).status_code == 200
+        assert conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0] == 3
+        assert len(app.phone_directory) == 1
+
+        # Added by another worker: not in this worker's map, found through the index
+        conn.execute("INSERT INTO users (phone, phone_e164) VALUES ('+12125550000', '+12125550000')")
+        conn.commit()
+        client.post('/sms_webhook', json={'fromNumber': '2125550000', 'text': '5 5 5'})
+        assert conn.execute('SELECT COUNT(*) FROM responses WHERE user_id = 2').fetchone()[0] == 1
+
+        # Deleted by another worker: the stale map entry must not store an orphan
+        conn.execute('DELETE FROM users WHERE id = 2')
+        conn.commit()
+        client.post('/sms_webhook', json={'fromNumber': '2125550000', 'text': '5 5 6'})
+        assert conn.execute('SELECT COUNT(*) FROM responses WHERE user_id = 2').fetchone()[0] == 1
+        assert app.phone_directory.db_path is None  # Invalidated, reloads on next lookup
+
+        # Deleted and added again by another worker: the reply reaches the new user id
+        conn.execute("INSERT INTO users (phone, phone_e164) VALUES ('+12125550000', '+12125550000')")
+        conn.commit()
+        client.post('/sms_webhook', json={'fromNumber': '2125550000', 'text': '5 5 7'})  # Maps it to 3
+        conn.execute('DELETE FROM users WHERE id = 3')
+        conn.execute("INSERT INTO users (phone, phone_e164) VALUES ('+12125550000', '+12125550000')")
+        conn.commit()
+        response = client.post('/sms_webhook', json={'fromNumber': '2125550000', 'text': '5 5 8'})
+        assert response.status_code == 200
+        assert conn.execute('SELECT COUNT(*) FROM responses WHERE user_id = 4').fetchone()[0] == 1
+
+        client.post('/delete_user/1')
+        assert app.phone_directory.lookup(conn, app.DB_PATH, '6175551234') is None
+        conn.close()
+
+
+def test_directory_reloads_after_ttl():
+    """With a zero TTL every lookup sees the current users"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        app.DB_PATH = db_path
+        app.init_db()
+        conn = sqlite3.connect(db_path)
+        directory = PhoneDirectory(ttl=0)
+        conn.execute("INSERT INTO users (phone) VALUES ('+16175551234')")
+        assert directory.lookup(conn, db_path, '617 555 1234') == 1
+        conn.execute('DELETE FROM users')
+        assert directory.lookup(conn, db_path, '617 555 1234') is None
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_normalize_phone()
+    test_migration_and_unique_index()
+    test_webhook_lookup_and_invalidation()
+    test_directory_reloads_after_ttl()
+    print("🎉 All phone tests passed!")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script to verify opt-in request profiling and the slow-query log
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import profiling
+from metrics import TimedConnection
+
+
+def test_profile_header():
+    """Requests with the profiling header are captured and listed"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app.DB_PATH = os.path.join(tmp, 'survey.db')
+        app.init_db()
+        profiling.PROFILE_DIR = os.path.join(tmp, 'profiles')
+        profiling.PROFILE_TOKEN = 'let-me-profile'
+        client = app.app.test_client()
+
+        plain = client.get('/responses')
+        assert 'X-Profile-Id' not in plain.headers
+        wrong = client.get('/responses', headers={'X-Profile': 'guess'})
+        assert 'X-Profile-Id' not in wrong.headers
+
+        profiled = client.get('/responses', headers={'X-Profile': 'let-me-profile'})
+        profile_id = profiled.headers.get('X-Profile-Id')
+        print(f"Profile id: {profile_id}")
+        assert profile_id
+
+        listing = client.get('/debug/profiles').json
+        assert [p['id'] for p in listing['profiles']] == [profile_id]
+        detail = client.get(f'/debug/profiles/{profile_id}').json
+        assert detail['route'] == 'view_responses' and 'cumulative' in detail['stats']
+        assert client.get(f'/debug/profiles/{profile_id}?format=pstats').status_code == 200
+        assert client.get('/debug/profiles/../../etc').status_code == 404
+
+
+def test_slow_query_plan():
+    """Slow statements are logged with their query plan"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app.DB_PATH = os.path.join(tmp, 'survey.db')
+        app.init_db()
+        profiling.SLOW_QUERY_MS = 1e-6
+        conn = app.sqlite3.connect(app.DB_PATH, factory=TimedConnection)
+        conn.execute('SELECT * FROM responses WHERE user_id = ? ORDER BY date DESC', (1,)).fetchall()
+        conn.close()
+
+        entry = profiling.recent_slow_queries(1)[0]
+        print(f"Slow query: {entry}")
+        assert entry['sql'].startswith('SELECT * FROM responses')
+        assert any('idx_responses_user_date' in step for step in entry['plan'])
+
+
+if __name__ == "__main__":
+    test_profile_header()
+    test_slow_query_plan()
+    print("🎉 All profiling tests passed!")
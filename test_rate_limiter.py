@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the shared outbound SMS rate limiter
+"""
+
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rate_limiter import SMSRateLimiter
+
+
+def test_burst_and_refill():
+    """A full bucket allows a burst, then sends are paced at the configured rate"""
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = SMSRateLimiter(os.path.join(tmp, 'limiter.db'), rate=20, burst=3)
+
+        assert all(limiter.try_acquire()[0] for _ in range(3))
+        acquired, wait = limiter.try_acquire()
+        print(f"After burst: acquired={acquired}, wait={wait:.3f}s")
+        assert not acquired and 0 < wait <= 0.06
+
+        start = time.time()
+        assert limiter.acquire(timeout=1)
+        assert time.time() - start < 0.5
+
+
+def test_shared_between_instances():
+    """Two limiters on the same file (e.g. two workers) share one bucket"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'limiter.db')
+        worker_a = SMSRateLimiter(path, rate=1, burst=2)
+        worker_b = SMSRateLimiter(path, rate=1, burst=2)
+
+        assert worker_a.try_acquire()[0]
+        assert worker_b.try_acquire()[0]
+        assert not worker_a.try_acquire()[0]
+        assert worker_b.status()['sent_today'] == 2
+
+
+def test_daily_and_provider_quota():
+    """Sends stop once the daily quota or the provider's quotaRemaining runs out"""
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = SMSRateLimiter(os.path.join(tmp, 'limiter.db'), rate=100, burst=100, daily_quota=2)
+        assert limiter.acquire() and limiter.acquire()
+        assert limiter.try_acquire() == (False, None)
+        assert not limiter.acquire()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = SMSRateLimiter(os.path.join(tmp, 'limiter.db'), rate=100, burst=100)
+        limiter.record(True, 0.05, quota_remaining=0)
+        assert limiter.try_acquire() == (False, None)
+
+
+def test_adaptive_backpressure():
+    """Errors cut the rate, successful fast sends bring it back"""
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = SMSRateLimiter(os.path.join(tmp, 'limiter.db'), rate=10, burst=10,
+                                 min_rate=1, cooldown=0)
+
+        limiter.record(False, 0.1, rate_limited=True)
+        slowed = limiter.status()['current_rate']
+        print(f"Rate after provider rate limit: {slowed}")
+        assert slowed == 5
+
+        for _ in range(10):
+            limiter.record(False, 0.1)
+        assert limiter.status()['current_rate'] == 1
+
+        for _ in range(200):
+            limiter.record(True, 0.05)
+        recovered = limiter.status()['current_rate']
+        print(f"Rate after recovery: {recovered}")
+        assert recovered == 10
+
+
+if __name__ == "__main__":
+    test_burst_and_refill()
+    test_shared_between_instances()
+    test_daily_and_provider_quota()
+    test_adaptive_backpressure()
+    print("🎉 All rate limiter tests passed!")
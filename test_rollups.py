@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script to verify incremental daily rollups, backfill and exports
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+from datetime import date
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import rollups
+from analytics import daily_histograms
+from conftest import seed_survey_db
+
+TODAY = date(2025, 3, 4)
+
+
+def seed(db_path):
+    """Two users surveyed at 11:00 on March 1-3; replies arrive 3 minutes to 2 hours later"""
+    conn = seed_survey_db(db_path, ['+15555550101', '+15555550102'])
+    for day in ('2025-03-01', '2025-03-02', '2025-03-03'):
+        for user_id in (1, 2):
+            conn.execute('''INSERT INTO survey_tokens (token, user_id, created_at, expires_at)
+                            VALUES (?, ?, ?, ?)''', (f'{day}-{user_id}', user_id, f'{day} 11:00:00', f'{day} 23:00:00'))
+        conn.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                        VALUES (1, 8, 6, 7, '', ?)''', (f'{day} 11:03:00',))
+    conn.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                    VALUES (2, 4, 4, 4, '', '2025-03-02 13:00:00')''')
+    conn.commit()
+    conn.close()
+
+
+def test_backfill_and_incremental_update():
+    """Backfill writes one row per day; updates only touch days after the watermark"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        seed(db_path)
+
+        assert rollups.backfill(db_path, today=TODAY) == 3
+        conn = sqlite3.connect(db_path)
+        days = {entry['day']: entry for entry in rollups.load_rollups(conn)}
+        print(f"Rollup for 2025-03-02: {days['2025-03-02']}")
+        assert days['2025-03-02']['responses'] == 2 and days['2025-03-02']['response_rate'] == 1.0
+        assert days['2025-03-01']['response_rate'] == 0.5
+        assert days['2025-03-02']['joy_mean'] == 6.0
+        assert days['2025-03-02']['delay_hist']['<5m'] == 1 and days['2025-03-02']['delay_hist']['1-3h'] == 1
+        assert rollups.get_watermark(conn) == '2025-03-03'
+
+        # Nothing new: only the lookback day is re-checked
+        assert rollups.update_rollups(db_path, today=TODAY) == 1
+        assert rollups.update_rollups(db_path, today=date(2025, 3, 6)) == 3
+        assert rollups.get_watermark(conn) == '2025-03-05'
+        conn.close()
+
+
+def test_analytics_reads_rollups():
+    """Analytics histograms agree whether days come from rollups or live"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        seed(db_path)
+        conn = sqlite3.connect(db_path)
+        live = daily_histograms(conn, date(2025, 3, 1), TODAY)
+        rollups.backfill(db_path, today=TODAY)
+        # Drop the raw rows: rolled-up days must not need them
+        conn.execute("DELETE FROM responses WHERE date < '2025-03-04'")
+        conn.commit()
+        assert daily_histograms(conn, date(2025, 3, 1), TODAY) == live
+        conn.close()
+
+
+def test_export_route():
+    """Rollups can be downloaded as CSV or JSON"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        seed(db_path)
+        rollups.backfill(db_path, today=TODAY)
+        client = app.app.test_client()
+
+        exported = client.get('/admin/rollups.csv?start=2025-03-02')
+        lines = exported.data.decode().strip().splitlines()
+        assert lines[0].startswith('day,surveys_sent') and len(lines) == 3
+        assert len(client.get('/admin/rollups.json').json['days']) == 3
+        assert client.get('/admin/rollups.xml').status_code == 404
+
+
+if __name__ == "__main__":
+    test_backfill_and_incremental_update()
+    test_analytics_reads_rollups()
+    test_export_route()
+    print("🎉 All rollup tests passed!")
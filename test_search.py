@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the full-text index over influence comments, search filters and term summaries
+"""
+
+import sys
+import os
+import tempfile
+from datetime import date
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import campaigns
+import search
+from conftest import seed_survey_db
+
+RESPONSES = [
+    # user_id, joy, achievement, meaningfulness, influence, date
+    (1, 8, 8, 9, 'Great team lunch and a productive sprint review', '2025-03-03 12:00:00'),
+    (1, 3, 4, 3, 'Long meetings all day, no time for deep work', '2025-03-04 12:00:00'),
+    (2, 4, 3, 4, 'Meetings again. The deadline stress is getting to me', '2025-03-05 12:00:00'),
+    (2, 9, 9, 9, 'Shipped the release, team celebrated', '2025-03-11 12:00:00'),
+    (3, 2, 2, 2, 'Deadline missed, meetings ran late', '2025-03-12 12:00:00'),
+    (3, 7, 6, 7, '', '2025-03-12 13:00:00'),
+]
+
+
+def seed_database(db_path):
+    conn = seed_survey_db(db_path, [f'+1555555000{i}' for i in range(1, 4)])
+    conn.executemany('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                        VALUES (?, ?, ?, ?, ?, ?)''', RESPONSES)
+    conn.commit()
+    return conn
+
+
+def matched_ids(conn, text, **filters):
+    results, _ = search.search(conn, text, **filters)
+    return sorted(result['id'] for result in results)
+
+
+def test_fts_query():
+    """Free text becomes quoted terms; prefixes and phrases survive, operators don't"""
+    assert search.fts_query('meetings deadline') == '"meetings" "deadline"'
+    assert search.fts_query('meet* OR "deep work"') == '"meet"* "OR" "deep work"'
+    assert search.fts_query('  -- ( ') == ''
+    assert search.terms_of('Café, CAFE_time! café') == {'cafe', 'time'}
+
+
+def test_search_filters_and_triggers():
+    """Matches are ranked and filtered; inserts, edits and deletes reach the index"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(os.path.join(tmp, 'survey.db'))
+        assert matched_ids(conn, 'meetings') == [2, 3, 5]
+        assert matched_ids(conn, 'meet*', user_id=2) == [3]
+        assert matched_ids(conn, 'meetings', start='2025-03-05', end='2025-03-12') == [3, 5]
+        assert matched_ids(conn, 'meetings', max_score=3.5) == [2, 5]
+        assert matched_ids(conn, 'team', min_score=8.5) == [4]
+        assert matched_ids(conn, '"deep work"') == [2]
+
+        results, has_more = search.search(conn, 'meetings', limit=2)
+        assert len(results) == 2 and has_more
+        assert '[meetings]' in results[0]['snippet'].lower()
+
+        conn.execute("UPDATE responses SET influence = 'Quiet focus day' WHERE id = 2")
+        conn.execute('DELETE FROM responses WHERE id = 3')
+        conn.execute('''INSERT INTO responses (user_id, joy, achievement, meaningfulness, influence, date)
+                        VALUES (1, 5, 5, 5, 'More meetings', '2025-03-13 09:00:00')''')
+        conn.commit()
+        assert matched_ids(conn, 'meetings') == [5, 7]
+        assert matched_ids(conn, 'focus') == [2]
+        conn.execute("INSERT INTO responses_fts (responses_fts) VALUES ('integrity-check')")
+        conn.close()
+
+
+def test_existing_database_is_backfilled():
+    """Responses written before the index existed are indexed on startup"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(os.path.join(tmp, 'survey.db'))
+        for name in ('responses_fts_insert', 'responses_fts_delete', 'responses_fts_update'):
+            conn.execute(f'DROP TRIGGER {name}')
+        conn.execute('DROP TABLE responses_fts')
+        conn.commit()
+
+        app.init_db()
+        assert matched_ids(conn, 'deadline') == [3, 5]
+        conn.close()
+
+
+def test_term_summaries():
+    """Weekly term counts per cohort; completed weeks are stored, the current one is not"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(os.path.join(tmp, 'survey.db'))
+        pilot = campaigns.create_campaign(conn, {'name': 'Pilot', 'start_date': '2025-03-01',
+                                                 'end_date': '2025-03-31', 'send_hour': 9, 'weekdays': '0123456'})
+        campaigns.enroll(conn, pilot, [2])
+        conn.commit()
+
+        week = search.term_summary(conn, date(2025, 3, 5), today=date(2025, 3, 12))
+        assert week['week'] == '2025-03-03' and week['complete'] and week['responses'] == 3
+        counts = {term['term']: term['responses'] for term in week['terms']}
+        assert counts['meetings'] == 2 and counts['deadline'] == 1
+        assert 'the' not in counts and 'no' not in counts
+
+        pilot_week = search.term_summary(conn, date(2025, 3, 3), pilot, today=date(2025, 3, 12))
+        assert pilot_week['responses'] == 1 and pilot_week['terms'][0]['responses'] == 1
+        default_week = search.term_summary(conn, date(2025, 3, 3), campaigns.DEFAULT_CAMPAIGN_ID,
+                                           today=date(2025, 3, 12))
+        assert default_week['responses'] == 2
+        assert {term['term']: term['responses'] for term in default_week['terms']}['meetings'] == 1
+
+        # Completed weeks come back from the snapshot store
+        conn.execute("DELETE FROM responses WHERE date < '2025-03-10'")
+        conn.commit()
+        assert search.term_summary(conn, date(2025, 3, 3), today=date(2025, 3, 12)) == week
+
+        current = search.term_summary(conn, date(2025, 3, 12), today=date(2025, 3, 12))
+        assert not current['complete'] and current['responses'] == 2  # The empty comment is not counted
+        assert conn.execute("SELECT COUNT(*) FROM analytics_snapshots WHERE name LIKE 'terms:2025-03-10%'"
+                            ).fetchone()[0] == 0
+        conn.close()
+
+
+def test_term_summaries_follow_cohort_changes():
+    """Stored summaries are dropped when enrollments change or users are deleted"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(os.path.join(tmp, 'survey.db'))
+        pilot = campaigns.create_campaign(conn, {'name': 'Pilot', 'start_date': '2025-03-01',
+                                                 'end_date': '2025-03-31', 'send_hour': 9, 'weekdays': '0123456'})
+        conn.commit()
+        client = app.app.test_client()
+
+        def responses(campaign_id):
+            return search.term_summary(conn, date(2025, 3, 3), campaign_id, today=date(2025, 3, 12))['responses']
+
+        assert (responses(pilot), responses(campaigns.DEFAULT_CAMPAIGN_ID)) == (0, 3)
+        assert client.post(f'/campaigns/{pilot}/enroll', json={'user_ids': [2]}).status_code == 200
+        assert (responses(pilot), responses(campaigns.DEFAULT_CAMPAIGN_ID)) == (1, 2)
+        assert client.post(f'/campaigns/{pilot}/unenroll', json={'user_ids': [2]}).status_code == 200
+        assert (responses(pilot), responses(campaigns.DEFAULT_CAMPAIGN_ID)) == (0, 3)
+
+        assert responses(None) == 3
+        client.post('/delete_user/1')
+        assert responses(None) == 1
+        conn.close()
+
+
+def test_search_routes():
+    """Search and term endpoints validate input and return JSON"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_database(os.path.join(tmp, 'survey.db'))
+        conn.close()
+        client = app.app.test_client()
+
+        data = client.get('/responses/search?q=meetings&max_score=5&limit=1').get_json()
+        assert data['success'] and data['has_more'] and len(data['results']) == 1
+        assert client.get('/responses/search?q=meetings&start=March').status_code == 400
+        assert client.get('/responses/search?q=%3F%3F').status_code == 400
+
+        data = client.get('/responses/terms?week=2025-03-12&weeks=2').get_json()
+        assert [summary['week'] for summary in data['weeks']] == ['2025-03-10', '2025-03-03']
+        assert client.get('/responses/terms?weeks=two').status_code == 400
+
+
+if __name__ == "__main__":
+    test_fts_query()
+    test_search_filters_and_triggers()
+    test_existing_database_is_backfilled()
+    test_term_summaries()
+    test_term_summaries_follow_cohort_changes()
+    test_search_routes()
+    print("🎉 All search tests passed!")
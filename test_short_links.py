@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script to verify short survey links, primary-key lookups and guess limiting
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import short_links
+from short_links import encode_base62, decode_base62, parse_short_code, GuessLimiter
+from conftest import seed_survey_db
+
+
+def test_base62_round_trip():
+    """Ids survive encoding; long tokens and junk are not short codes"""
+    for number in (0, 1, 61, 62, 3843, 10**7, 2**63 - 1):
+        assert decode_base62(encode_base62(number)) == number
+    assert len(encode_base62(2**63 - 1)) <= short_links.MAX_ID_CHARS
+    code = short_links.make_short_code(1234)
+    assert len(code) == len(encode_base62(1234)) + short_links.SECRET_CHARS
+    assert parse_short_code(code) == 1234
+    assert parse_short_code(app.generate_survey_token()) is None
+    assert parse_short_code('abc') is None and parse_short_code('a-b_c.d/e!fghij') is None
+    # 11 base62 digits can go past SQLite's largest rowid
+    assert parse_short_code(encode_base62(2**63 - 1) + 'ABCDEFGH') == 2**63 - 1
+    assert parse_short_code('zzzzzzzzzzzABCDEFGH') is None
+
+
+def test_short_link_survey_flow():
+    """Short links open and submit the survey; a wrong secret for a real id is rejected"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), ['+15555550100'])
+        short_links.SURVEY_LINK_STYLE = 'short'
+        try:
+            code = app.create_survey_token(1)
+        finally:
+            short_links.SURVEY_LINK_STYLE = 'long'
+        long_token = app.create_survey_token(1)
+        assert parse_short_code(code) is not None and len(code) < 16
+        assert short_links.survey_path(code) == f'/s/{code}'
+        assert short_links.survey_path(long_token) == f'/survey/{long_token}'
+
+        app.guess_limiter.reset()
+        client = app.app.test_client()
+        assert client.get(f'/s/{code}').status_code == 200
+        assert client.get(f'/survey/{long_token}').status_code == 200
+        forged = code[:-short_links.SECRET_CHARS] + 'A' * short_links.SECRET_CHARS
+        assert client.get(f'/s/{forged}').status_code == 400
+
+        response = client.post(f'/s/{code}', data={'joy': 7, 'achievement': 6, 'meaning': 8})
+        assert response.status_code == 302
+        assert conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0] == 1
+        assert conn.execute('SELECT is_used FROM survey_tokens WHERE token = ?', (code,)).fetchone()[0]
+        assert client.get(f'/s/{code}').status_code == 400  # Already used
+
+        plan = ' '.join(row[3] for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT user_id FROM survey_tokens WHERE id = ?', (1,)))
+        print(f"Short code lookup plan: {plan}")
+        assert 'INTEGER PRIMARY KEY' in plan
+        conn.close()
+
+
+def test_guessing_is_rate_limited():
+    """A client that keeps presenting invalid tokens gets 429, valid clients do not"""
+    limiter = GuessLimiter(max_failures=3, window=60)
+    for _ in range(3):
+        assert not limiter.blocked('1.2.3.4', now=100)
+        limiter.record_failure('1.2.3.4', now=100)
+    assert limiter.blocked('1.2.3.4', now=110)
+    assert not limiter.blocked('5.6.7.8', now=110)
+    assert not limiter.blocked('1.2.3.4', now=200)  # Window passed
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_survey_db(os.path.join(tmp, 'survey.db'), ['+15555550100']).close()
+        app.guess_limiter.reset()
+        client = app.app.test_client()
+        statuses = [client.get(f'/s/{short_links.make_short_code(1)}').status_code
+                    for _ in range(short_links.SHORT_LINK_MAX_FAILURES + 1)]
+        assert statuses[-2] == 400 and statuses[-1] == 429
+        app.guess_limiter.reset()
+
+        # An id past the largest rowid is an invalid token, and counts as a guess
+        assert client.get('/s/zzzzzzzzzzzABCDEFGH').status_code == 400
+        assert app.guess_limiter.failures
+        app.guess_limiter.reset()
+
+
+if __name__ == "__main__":
+    test_base62_round_trip()
+    test_short_link_survey_flow()
+    test_guessing_is_rate_limited()
+    print("🎉 All short link tests passed!")
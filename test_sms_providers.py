@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the SMS provider layer without touching the real TextBelt API
+"""
+
+import sys
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sms_providers import FakeSMSProvider, TextBeltProvider, serve_fake_provider
+
+
+def test_fake_provider():
+    """The fake provider succeeds, fails and rate limits on demand"""
+    provider = FakeSMSProvider(latency_ms=(0, 0), seed=1)
+    result = provider.send('+15555550100', 'hello')
+    print(f"Fake send: {result}")
+    assert result['success'] and result['textId']
+    assert provider.sent[-1]['message'] == 'hello'
+
+    failing = FakeSMSProvider(latency_ms=(0, 0), failure_rate=1.0)
+    assert not failing.send('+15555550100', 'hello')['success']
+
+    limited = FakeSMSProvider(latency_ms=(0, 0), rate_limit=2)
+    results = [limited.send('+15555550100', 'hello')['success'] for _ in range(3)]
+    assert results == [True, True, False]
+    assert limited.stats['rate_limited'] == 1
+
+    quota = FakeSMSProvider(latency_ms=(0, 0), quota=1)
+    assert quota.send('+15555550100', 'hello')['quotaRemaining'] == 0
+    assert quota.send('+15555550100', 'hello')['error'] == 'Out of quota'
+
+
+def test_local_http_fake():
+    """TextBeltProvider can talk to the local HTTP fake"""
+    server = serve_fake_provider(FakeSMSProvider(latency_ms=(0, 0)))
+    try:
+        provider = TextBeltProvider('test-key', url=server.url)
+        result = provider.send('+15555550100', 'over http', reply_webhook_url='http://example/hook')
+        print(f"HTTP fake send: {result}")
+        assert result['success']
+        assert server.provider.sent[-1]['message'] == 'over http'
+
+        # Sends from a thread pool each use their own session
+        def send(i):
+            return provider.send('+15555550100', f'msg {i}'), threading.get_ident(), provider._session()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(send, range(8)))
+        assert all(result['success'] for result, _, _ in results)
+        sessions = {}
+        for _, thread, session in results:
+            assert sessions.setdefault(thread, session) is session
+        assert len({id(session) for session in sessions.values()}) == len(sessions)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_fake_provider()
+    test_local_http_fake()
+    print("🎉 All SMS provider tests passed!")
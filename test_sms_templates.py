@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test script to verify SMS template rendering, encoding detection and segment counts
+"""
+
+import sys
+import os
+import subprocess
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import metrics
+import sms_templates
+from sms_templates import SMSTemplate, segment_info, gsm_safe
+from conftest import seed_survey_db
+
+
+def test_segment_counts():
+    """Segment boundaries for GSM-7, the extension table and UCS-2"""
+    assert segment_info('a' * 160) == {'encoding': 'GSM-7', 'chars': 160, 'units': 160, 'segments': 1}
+    assert segment_info('a' * 161)['segments'] == 2
+    assert segment_info('a' * 306)['segments'] == 2
+    assert segment_info('a' * 307)['segments'] == 3
+    assert segment_info('{' * 80)['units'] == 160  # Escaped characters cost two septets
+    assert segment_info('a' * 152 + '€' + 'a' * 10)['segments'] == 2  # Escape never split across parts
+    assert segment_info('a' * 69 + '💙')['encoding'] == 'UCS-2'
+    assert segment_info('a' * 69 + '💙')['segments'] == 2  # Emoji is a surrogate pair
+    assert segment_info('é' * 70)['encoding'] == 'GSM-7'
+    assert segment_info('ê' * 70)['segments'] == 1
+    assert segment_info('')['segments'] == 0
+
+
+def test_gsm_safe():
+    """Bullets, quotes and dashes are rewritten; emoji are dropped without stray spaces"""
+    text = "🎉 Week 2 — done! Thank you! 💙\n• Joy “today”"
+    assert gsm_safe(text) == "Week 2 - done! Thank you!\n- Joy \"today\""
+    for template in sms_templates.TEMPLATES.values():
+        assert segment_info(template.variants['gsm'])['encoding'] == 'GSM-7'
+
+
+def test_render_and_budget():
+    """Renders report segments; budgets apply to the style being sent"""
+    template = SMSTemplate('t', 'Hi {name} 🌟', max_segments=1)
+    rendered = template.render('unicode', name='Ann')
+    assert rendered['text'] == 'Hi Ann 🌟' and rendered['encoding'] == 'UCS-2'
+    assert template.render('gsm', name='Ann')['text'] == 'Hi Ann'
+    assert template.render('gsm', name='x' * 200)['over_budget']
+    per_style = SMSTemplate('t', 'Hi {name} 🌟', max_segments={'gsm': 1, 'unicode': 3})
+    assert not per_style.render('unicode', name='x' * 150)['over_budget']
+    assert per_style.render('gsm', name='x' * 170)['over_budget']
+    try:
+        SMSTemplate('bad', '{week:02d}')
+        assert False, "format spec accepted"
+    except ValueError:
+        pass
+
+    for style in sms_templates.STYLES:
+        assert sms_templates.check_templates(style=style) == []
+    saved = [row['unicode']['segments'] - row['gsm']['segments'] for row in sms_templates.report(renders=1)]
+    assert all(s > 0 for s in saved)
+
+
+def test_survey_message_segments():
+    """Queued survey texts use the configured style and count their segments"""
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_survey_db(os.path.join(tmp, 'survey.db'), ['+15555550100']).close()
+
+        token, message = app.build_survey_message(1)
+        assert token and token in message
+        info = segment_info(message)
+        print(f"Daily survey SMS: {info}")
+        assert info['encoding'] == 'GSM-7' and info['segments'] <= 2
+        assert 'sms_segments_total{template="survey_daily",encoding="GSM-7"}' in metrics.render_prometheus()
+        assert segment_info(app.build_feedback_message(1))['segments'] <= 2
+
+
+def test_check_every_style():
+    """`sms_templates.py check` passes for every style it offers"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    for style in sms_templates.STYLES:
+        for extra in ([], ['--short-links']):
+            result = subprocess.run([sys.executable, 'sms_templates.py', *extra, 'check', '--style', style],
+                                    cwd=here, capture_output=True, text=True)
+            assert result.returncode == 0, result.stdout
+
+
+if __name__ == "__main__":
+    test_segment_counts()
+    test_gsm_safe()
+    test_render_and_budget()
+    test_survey_message_segments()
+    test_check_every_style()
+    print("🎉 All SMS template tests passed!")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script to verify importing the app has no side effects and initializes lazily
+"""
+
+import sys
+import os
+import sqlite3
+import subprocess
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_python(code, cwd):
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    result = subprocess.run([sys.executable, '-c', f'import sys; sys.path.insert(0, {HERE!r})\n{code}'],
+                            cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def test_import_has_no_side_effects():
+    """import app creates no files, starts no threads and skips the scheduler and requests"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = run_python('import threading, app\n'
+                            'print(threading.active_count(), app.scheduler, '
+                            "'apscheduler' in sys.modules, 'requests' in sys.modules)", tmp)
+        print(f"After import: {output}")
+        assert output == '1 None False False'
+        assert os.listdir(tmp) == []
+
+        # The parser needs neither Flask nor the app
+        assert run_python("import parsing; print('flask' in sys.modules)", tmp) == 'False'
+
+
+def test_lazy_schema_and_factory():
+    """The schema is created on first use; create_app() starts the jobs once"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = run_python('import app\n'
+                            "assert app.app.test_client().get('/').status_code == 200\n"
+                            'first = app.create_app()\n'
+                            'jobs = len(app.scheduler.get_jobs())\n'
+                            'app.create_app()\n'
+                            'assert first is app.app and len(app.scheduler.get_jobs()) == jobs\n'
+                            'app.scheduler.shutdown(wait=False)\n'
+                            'print(jobs)', tmp)
+        print(f"Scheduled jobs: {output}")
+        assert int(output) >= 5
+        conn = sqlite3.connect(os.path.join(tmp, 'survey.db'))
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.close()
+        assert {'users', 'responses', 'survey_tokens', 'sms_outbox'} <= tables
+
+
+if __name__ == "__main__":
+    test_import_has_no_side_effects()
+    test_lazy_schema_and_factory()
+    print("🎉 All startup tests passed!")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script to verify retried webhook deliveries are stored once
+"""
+
+import sys
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+import metrics
+import webhook_dedup
+from conftest import seed_survey_db
+
+DELIVERY = {'textId': 'tb-1001', 'fromNumber': '+15555550100', 'text': '8 7 9 good day'}
+
+
+def response_count(conn):
+    return conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+def test_retries_stored_once():
+    """Retries hit the worker's LRU; another worker's retry hits the table"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), ['+15555550100'])
+        app.webhook_deduplicator.forget()
+        client = app.app.test_client()
+
+        for _ in range(3):
+            assert client.post('/sms_webhook', json=DELIVERY).status_code == 200
+        assert response_count(conn) == 1
+        assert 'webhook_ingest_total{result="duplicate"}' in metrics.render_prometheus()
+
+        # A different worker has an empty LRU; the claim in webhook_deliveries stops it
+        app.webhook_deduplicator.forget()
+        assert client.post('/sms_webhook', json=DELIVERY).status_code == 200
+        assert response_count(conn) == 1
+
+        # A new reply to the same outbound message is not a duplicate
+        client.post('/sms_webhook', json={**DELIVERY, 'text': '3 4 5 actually worse'})
+        assert response_count(conn) == 2
+        conn.close()
+
+
+def test_concurrent_retries():
+    """Simultaneous deliveries of one reply from many threads store one row"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), ['+15555550100'])
+        app.webhook_deduplicator.forget()
+        client = app.app.test_client()
+        delivery = {**DELIVERY, 'textId': 'tb-2002'}
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            statuses = list(executor.map(lambda _: client.post('/sms_webhook', json=delivery).status_code,
+                                         range(16)))
+        assert statuses == [200] * 16
+        assert response_count(conn) == 1
+        conn.close()
+
+
+def test_ttl_and_purge():
+    """Keys expire after the TTL: they can be claimed again and are purged"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed_survey_db(os.path.join(tmp, 'survey.db'), ['+15555550100'])
+        dedup = webhook_dedup.WebhookDeduplicator(size=2, ttl=60)
+        now = time.time()
+        key = webhook_dedup.delivery_key('tb-1', '+15555550100', '8 8 8')
+
+        assert dedup.claim(conn, key, now)
+        assert not dedup.claim(conn, key, now + 30)
+        assert dedup.claim(conn, key, now + 120)
+        conn.commit()
+
+        dedup.remember(key, now)
+        assert dedup.seen(key, now + 30) and not dedup.seen(key, now + 120)
+        for i in range(3):
+            dedup.remember(f'k{i}', now)
+        assert len(dedup.recent) == 2  # Bounded
+
+        assert webhook_dedup.purge_deliveries(conn, ttl=60, now=now + 120) == 0
+        assert webhook_dedup.purge_deliveries(conn, ttl=60, now=now + 200) == 1
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_retries_stored_once()
+    test_concurrent_retries()
+    test_ttl_and_purge()
+    print("🎉 All webhook dedup tests passed!")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script to verify webhook capture and signed offline replay
+"""
+
+import sys
+import os
+import gzip
+import shutil
+import subprocess
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from webhook_replay import WebhookRecorder, load_capture, replay, in_process_sender
+
+
+def capture_traffic(tmp):
+    """Record three webhook deliveries through the app"""
+    app.DB_PATH = os.path.join(tmp, 'survey.db')
+    app.init_db()
+    capture_path = os.path.join(tmp, 'capture.jsonl')
+    app.webhook_recorder = WebhookRecorder(capture_path)
+    try:
+        client = app.app.test_client()
+        for text in ('8 7 9 good day', '3 4 5 rough', 'thanks'):
+            client.post('/sms_webhook', json={'fromNumber': '+15555550100', 'text': text})
+    finally:
+        app.webhook_recorder = None
+    return capture_path
+
+
+def test_capture_and_replay():
+    """Captured deliveries replay in-process with fresh valid signatures"""
+    with tempfile.TemporaryDirectory() as tmp:
+        capture_path = capture_traffic(tmp)
+        entries = load_capture(capture_path)
+        print(f"Captured: {entries[0]}")
+        assert len(entries) == 3 and entries[0]['s'] == 200
+        assert '8 7 9 good day' in entries[0]['b']
+
+        # Rotated, gzipped captures read the same
+        with open(capture_path, 'rb') as src, gzip.open(capture_path + '.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        assert load_capture(capture_path + '.gz') == entries
+
+        previous_key = os.environ.get('TEXTBELT_API_KEY')
+        os.environ['TEXTBELT_API_KEY'] = 'replay-key'
+        try:
+            signed = replay(entries, in_process_sender(), speed=None, api_key='replay-key')
+            forged = replay(entries, in_process_sender(), speed=None, api_key='wrong-key')
+        finally:
+            if previous_key is None:
+                os.environ.pop('TEXTBELT_API_KEY')
+            else:
+                os.environ['TEXTBELT_API_KEY'] = previous_key
+
+        print(f"Replay summary: {signed}")
+        assert signed['statuses'] == {'200': 3} and signed['count'] == 3
+        assert forged['statuses'] == {'401': 3}
+
+
+def test_replay_pacing():
+    """Replays keep the original spacing divided by the speed multiplier"""
+    with tempfile.TemporaryDirectory() as tmp:
+        entries = load_capture(capture_traffic(tmp))
+        for i, entry in enumerate(entries):
+            entry['t'] = 1000.0 + i * 0.5  # One second of original traffic
+        summary = replay(entries, lambda body, headers: 200, speed=4)
+        assert 0.2 <= summary['seconds'] < 0.6, summary['seconds']
+
+
+def test_http_replay_skips_app():
+    """Replaying against a running app over HTTP does not import the app"""
+    check = ("import sys, webhook_replay\n"
+             "webhook_replay.replay([{'t': 0, 'h': {}, 'b': '{}'}], lambda body, headers: 200, speed=None)\n"
+             "sys.exit('app' in sys.modules)")
+    result = subprocess.run([sys.executable, '-c', check], cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0
+
+
+if __name__ == "__main__":
+    test_capture_and_replay()
+    test_replay_pacing()
+    test_http_replay_skips_app()
+    print("🎉 All webhook replay tests passed!")
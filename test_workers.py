@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the app is safe under threaded workers and the gunicorn profiles load
+"""
+
+import sys
+import os
+import runpy
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from conftest import seed_survey_db
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_concurrent_webhooks():
+    """Webhooks from many threads are all stored; the debug log stays bounded"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'survey.db')
+        conn = seed_survey_db(db_path, [f'+1555555{i:04d}' for i in range(20)])
+
+        total_before = app.webhook_log_total
+        client = app.app.test_client()
+
+        def deliver(i):
+            return client.post('/sms_webhook', json={'fromNumber': f'+1555555{i % 20:04d}',
+                                                     'text': f'{i % 10 + 1} 5 6 thread {i}'}).status_code
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            statuses = list(executor.map(deliver, range(app.WEBHOOK_LOG_SIZE + 50)))
+        assert statuses == [200] * len(statuses)
+
+        stored = conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        conn.close()
+        print(f"Stored {stored} responses from {len(statuses)} concurrent webhooks")
+        assert stored == len(statuses)
+        assert len(app.webhook_logs) == app.WEBHOOK_LOG_SIZE
+        assert app.webhook_log_total - total_before == len(statuses)
+        debug = client.get('/debug/webhooks').json
+        assert len(debug['recent_webhooks']) == 10
+
+
+def test_scheduler_lock():
+    """Only one process at a time can hold the scheduler lock"""
+    import fcntl
+    with tempfile.TemporaryDirectory() as tmp:
+        lock_path, held = app.SCHEDULER_LOCK_PATH, app._scheduler_lock_file
+        app.SCHEDULER_LOCK_PATH, app._scheduler_lock_file = os.path.join(tmp, 'scheduler.lock'), None
+        try:
+            assert app.acquire_scheduler_lock()
+            with open(app.SCHEDULER_LOCK_PATH, 'a') as other_worker:
+                try:
+                    fcntl.flock(other_worker, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    assert False, "second worker got the scheduler lock"
+                except BlockingIOError:
+                    pass
+        finally:
+            if app._scheduler_lock_file:
+                app._scheduler_lock_file.close()
+            app.SCHEDULER_LOCK_PATH, app._scheduler_lock_file = lock_path, held
+
+
+def test_gunicorn_profiles():
+    """Each documented profile maps to a worker class; unknown profiles are rejected"""
+    config_path = os.path.join(HERE, 'gunicorn.conf.py')
+    previous = os.environ.get('GUNICORN_PROFILE')
+    try:
+        for profile, worker_class in [('sync', 'sync'), ('gthread', 'gthread'), ('gevent', 'gevent')]:
+            os.environ['GUNICORN_PROFILE'] = profile
+            settings = runpy.run_path(config_path)
+            assert settings['worker_class'] == worker_class
+        assert settings['threads'] == 1
+        os.environ['GUNICORN_PROFILE'] = 'eventlet'
+        try:
+            runpy.run_path(config_path)
+            assert False, "unknown profile accepted"
+        except ValueError:
+            pass
+    finally:
+        if previous is None:
+            os.environ.pop('GUNICORN_PROFILE', None)
+        else:
+            os.environ['GUNICORN_PROFILE'] = previous
+
+
+if __name__ == "__main__":
+    test_concurrent_webhooks()
+    test_scheduler_lock()
+    test_gunicorn_profiles()
+    print("🎉 All worker tests passed!")
@@ -0,0 +1,90 @@
+"""
+Idempotent webhook ingestion.
+
+TextBelt retries a webhook when our response is slow, so the same reply can
+arrive several times. Each delivery gets a key: a hash of its textId, sender
+and text (textId alone is shared by every reply to one outbound message).
+
+    1. A per-worker LRU of recently seen keys answers most retries with no
+       database access at all.
+    2. Otherwise the key is claimed in webhook_deliveries in the same
+       transaction as the response insert. A key that is already there (and
+       younger than WEBHOOK_DEDUP_TTL) means another worker stored it first,
+       and the response insert is skipped.
+
+Rows older than the TTL are purged by a scheduled job. An expired key can
+be claimed again, so an identical reply days later is stored normally.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+WEBHOOK_DEDUP_TTL = float(os.getenv('WEBHOOK_DEDUP_TTL', str(6 * 3600)))  # seconds
+WEBHOOK_DEDUP_CACHE_SIZE = int(os.getenv('WEBHOOK_DEDUP_CACHE_SIZE', '10000'))
+
+
+def init_dedup(cursor):
+    """Create the delivery key table (called from init_db)"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS webhook_deliveries (
+        key TEXT PRIMARY KEY,
+        received_at REAL NOT NULL
+    ) WITHOUT ROWID''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_received
+                      ON webhook_deliveries (received_at)''')
+
+
+def delivery_key(text_id, from_number, text):
+    payload = '\x1f'.join((text_id or '', from_number or '', text or ''))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class WebhookDeduplicator:
+    """Bounded LRU of recent delivery keys in front of the webhook_deliveries table"""
+
+    def __init__(self, size=WEBHOOK_DEDUP_CACHE_SIZE, ttl=WEBHOOK_DEDUP_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.recent = OrderedDict()  # key -> time first seen
+
+    def seen(self, key, now=None):
+        """True if this worker handled the key within the TTL"""
+        now = now or time.time()
+        with self.lock:
+            first_seen = self.recent.get(key)
+            if first_seen is None:
+                return False
+            if now - first_seen > self.ttl:
+                del self.recent[key]
+                return False
+            self.recent.move_to_end(key)
+            return True
+
+    def remember(self, key, now=None):
+        with self.lock:
+            self.recent[key] = now or time.time()
+            self.recent.move_to_end(key)
+            while len(self.recent) > self.size:
+                self.recent.popitem(last=False)
+
+    def claim(self, conn, key, now=None):
+        """Record the key in the open transaction; False if it is a live duplicate"""
+        now = now or time.time()
+        cursor = conn.execute('''INSERT INTO webhook_deliveries (key, received_at) VALUES (?, ?)
+                                 ON CONFLICT(key) DO UPDATE SET received_at = excluded.received_at
+                                 WHERE received_at < ?''', (key, now, now - self.ttl))
+        return cursor.rowcount > 0
+
+    def forget(self):
+        with self.lock:
+            self.recent.clear()
+
+
+def purge_deliveries(conn, ttl=WEBHOOK_DEDUP_TTL, now=None):
+    """Delete delivery keys older than the TTL; returns the number removed"""
+    cursor = conn.execute('DELETE FROM webhook_deliveries WHERE received_at < ?', ((now or time.time()) - ttl,))
+    conn.commit()
+    return cursor.rowcount
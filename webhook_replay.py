@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Capture and replay /sms_webhook traffic.
+
+With WEBHOOK_CAPTURE_PATH set, the app appends every webhook delivery to
+that file as one compact JSON line: arrival time, the headers TextBelt
+sends, the raw body, plus the status and handling time it got. Rotated
+captures may be gzipped; both forms can be replayed.
+
+Replay sends the captured requests to a running app over HTTP, or to the
+app in-process through Flask's test client. Requests are sent at the
+original pace, sped up by --speed, or as fast as possible (--speed max).
+With --api-key each request is re-signed with a fresh X-Textbelt-Timestamp,
+so signature checking and the 15 minute freshness window pass.
+
+    python webhook_replay.py capture.jsonl --speed 10 --target http://127.0.0.1:5001
+    python webhook_replay.py capture.jsonl.gz --speed max --in-process --api-key $TEXTBELT_API_KEY
+
+Captures contain phone numbers and reply texts: store them like the database.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_stats import summarize
+from survey_utils import sign_textbelt_webhook
+
+# Headers worth keeping; everything else is proxy noise
+CAPTURED_HEADERS = ('Content-Type', 'User-Agent', 'X-Textbelt-Signature', 'X-Textbelt-Timestamp')
+
+
+class WebhookRecorder:
+    """Append-only JSON-lines log of webhook deliveries, safe across threads and workers"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, request, status, seconds):
+        entry = {
+            't': round(time.time(), 4),
+            'h': {name: request.headers[name] for name in CAPTURED_HEADERS if name in request.headers},
+            'b': request.get_data(as_text=True),
+            's': status,
+            'ms': round(seconds * 1000, 2),
+        }
+        line = (json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+        try:
+            with self.lock:
+                # One write per line on an O_APPEND descriptor keeps lines from
+                # different gunicorn workers from interleaving
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    os.write(fd, line)
+                finally:
+                    os.close(fd)
+        except OSError:
+            pass  # Capturing must never break ingestion
+
+
+def load_capture(path):
+    """Read captured deliveries (plain or gzipped), oldest first"""
+    opener = gzip.open if path.endswith('.gz') else open
+    entries = []
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # Torn final line from a crashed writer
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+
+def prepare_headers(entry, api_key=None):
+    """Headers to replay with; re-signed with a fresh timestamp when api_key is given"""
+    headers = {name: value for name, value in entry['h'].items()
+               if name not in ('X-Textbelt-Signature', 'X-Textbelt-Timestamp')}
+    headers.setdefault('Content-Type', 'application/json')
+    if api_key:
+        timestamp = str(int(time.time()))
+        headers['X-Textbelt-Timestamp'] = timestamp
+        headers['X-Textbelt-Signature'] = sign_textbelt_webhook(api_key, timestamp, entry['b'])
+    return headers
+
+
+def http_sender(target):
+    import requests
+    session = requests.Session()
+    url = target.rstrip('/') + '/sms_webhook'
+
+    def send(body, headers):
+        return session.post(url, data=body.encode('utf-8'), headers=headers, timeout=30).status_code
+    return send
+
+
+def in_process_sender():
+    import app
+
+    def send(body, headers):
+        return app.app.test_client().post('/sms_webhook', data=body.encode('utf-8'), headers=headers).status_code
+    return send
+
+
+def replay(entries, send, speed=1.0, api_key=None, concurrency=8):
+    """Replay captured entries through send(body, headers) and summarize the run.
+
+    speed multiplies the original pace; None sends back-to-back. Requests are
+    dispatched on schedule from a thread pool, so a slow response does not
+    delay the ones behind it.
+    """
+    latencies, statuses, lag = [], Counter(), []
+    results_lock = threading.Lock()
+
+    def deliver(entry):
+        headers = prepare_headers(entry, api_key)
+        start = time.perf_counter()
+        try:
+            status = send(entry['b'], headers)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with results_lock:
+            latencies.append(elapsed)
+            statuses[str(status)] += 1
+
+    started = time.perf_counter()
+    first = entries[0]['t'] if entries else 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for entry in entries:
+            if speed:
+                due = (entry['t'] - first) / speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    lag.append(-delay)
+            executor.submit(deliver, entry)
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(latencies, elapsed)
+    summary['statuses'] = dict(statuses)
+    summary['original_seconds'] = round(entries[-1]['t'] - first, 3) if entries else 0
+    summary['max_schedule_lag_ms'] = round(max(lag) * 1000, 1) if lag else 0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('capture', help='Capture file written via WEBHOOK_CAPTURE_PATH (.jsonl or .jsonl.gz)')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--target', help='Base URL of a running app, e.g. http://127.0.0.1:5001')
+    target.add_argument('--in-process', action='store_true', help='Replay through the Flask test client')
+    parser.add_argument('--speed', default='1', help="Pace multiplier, or 'max' for no delays")
+    parser.add_argument('--api-key', help='Re-sign requests with this TextBelt API key')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--limit', type=int, help='Only replay the first N requests')
+    parser.add_argument('--output', help='Write the summary as JSON to this file')
+    args = parser.parse_args()
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    entries = load_capture(args.capture)[:args.limit]
+    send = in_process_sender() if args.in_process else http_sender(args.target)
+
+    print(f"🔁 Replaying {len(entries)} webhooks at {'max' if speed is None else f'{speed}x'} speed")
+    summary = replay(entries, send, speed, args.api_key, args.concurrency)
+    print(f"Done in {summary['seconds']}s (originally {summary['original_seconds']}s): "
+          f"{summary['ops_per_second']} req/s, p50={summary['p50_ms']}ms, p99={summary['p99_ms']}ms")
+    print(f"Statuses: {summary['statuses']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"\n📊 Summary written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()